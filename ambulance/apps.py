@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AmbulanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ambulance'
+
+    def ready(self):
+        from ambulance import signals  # noqa: F401
@@ -0,0 +1,239 @@
+"""
+Booking state changes that claim or release an ambulance
+Each transition is a conditional UPDATE inside one transaction: the row is
+only changed if it is still in the state the dispatcher saw, and the number
+of rows updated says whether this request won. Two dispatchers accepting
+bookings onto the same ambulance can therefore never both succeed, without
+holding locks across separate read-then-write round trips.
+
+An ambulance held by an active booking points at it through
+current_booking, and its status ('available', 'busy' or 'offline') is
+changed in the same UPDATE; 'maintenance' is set by the provider and left
+alone, so "is this ambulance free" is a read of one
+indexed column. reconcile_ambulances() repairs rows that drifted anyway.
+
+Rows are always updated ambulance first, then booking, so concurrent
+transitions can't deadlock. queryset.update() skips the post_save signals,
+so the dispatch availability index is updated here once the transaction
+commits.
+"""
+from django.db import transaction
+from django.db.models import Case, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+
+from core.models import Ambulance, Booking
+from ambulance.availability import ambulance_availability
+
+
+# Results
+ACCEPTED = 'accepted'
+REJECTED = 'rejected'
+COMPLETED = 'completed'
+AMBULANCE_UNAVAILABLE = 'ambulance_unavailable'
+AMBULANCE_NOT_FOUND = 'ambulance_not_found'
+BOOKING_CHANGED = 'booking_changed'
+
+
+class _Lost(Exception):
+    """Raised inside the transaction to roll back a half-made change"""
+
+
+def _after_commit(provider_id, claimed=None, released=False):
+    def refresh():
+        if released:
+            # Freed ambulances are re-read with the rest of the provider's fleet
+            ambulance_availability.invalidate(provider_id)
+        elif claimed:
+            ambulance_availability.remove(claimed)
+    transaction.on_commit(refresh)
+
+
+def _released_status():
+    # Evaluated against the row before the UPDATE clears current_booking
+    return Case(
+        When(status='maintenance', then=Value('maintenance')),
+        When(is_available=True, then=Value('available')),
+        default=Value('offline'),
+    )
+
+
+def _release(booking, now):
+    """Free the ambulance held by `booking`; returns whether there was one"""
+    return Ambulance.objects.filter(current_booking=booking.pk).update(
+        current_booking=None, status=_released_status(), updated_at=now
+    )
+
+
+def hold_requested_ambulance(booking):
+    """
+    Reserve the ambulance a user picked for their new pending booking
+
+    The pick is dropped from the booking if the ambulance isn't available
+    or belongs to another provider. Returns whether it was reserved.
+    """
+    if not booking.ambulance_id:
+        return False
+    with transaction.atomic():
+        held = Ambulance.objects.filter(
+            pk=booking.ambulance_id, provider_id=booking.provider_id, status='available'
+        ).update(current_booking=booking.pk, status='busy', updated_at=timezone.now())
+        if held:
+            _after_commit(booking.provider_id, claimed=booking.ambulance_id)
+        else:
+            Booking.objects.filter(pk=booking.pk).update(ambulance=None)
+            booking.ambulance = None
+    return bool(held)
+
+
+def accept_booking(booking, ambulance_id):
+    """
+    Confirm a pending booking and assign it an available ambulance
+
+    The ambulance must belong to the booking's provider and be available,
+    or already be held by this booking. Returns ACCEPTED,
+    AMBULANCE_UNAVAILABLE, AMBULANCE_NOT_FOUND or BOOKING_CHANGED (the
+    booking is no longer pending). On success `booking` is updated in
+    place.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            claimed = Ambulance.objects.filter(
+                pk=ambulance_id, provider_id=booking.provider_id
+            ).filter(
+                Q(status='available') | Q(current_booking=booking.pk)
+            ).update(current_booking=booking.pk, status='busy', updated_at=now)
+            if not claimed:
+                raise _Lost(AMBULANCE_UNAVAILABLE)
+
+            # A different ambulance the user had picked is free again
+            released = Ambulance.objects.filter(current_booking=booking.pk).exclude(
+                pk=ambulance_id
+            ).update(current_booking=None, status=_released_status(), updated_at=now)
+
+            confirmed = Booking.objects.filter(pk=booking.pk, status='pending').update(
+                ambulance_id=ambulance_id, status='confirmed', updated_at=now
+            )
+            if not confirmed:
+                # Undoes the claim and release above
+                raise _Lost(BOOKING_CHANGED)
+
+            _after_commit(booking.provider_id, claimed=ambulance_id, released=bool(released))
+    except _Lost as lost:
+        result = lost.args[0]
+        if result == AMBULANCE_UNAVAILABLE and not Ambulance.objects.filter(
+            pk=ambulance_id, provider_id=booking.provider_id
+        ).exists():
+            return AMBULANCE_NOT_FOUND
+        return result
+
+    booking.ambulance_id = ambulance_id
+    booking.status = 'confirmed'
+    booking.updated_at = now
+    return ACCEPTED
+
+
+def reject_booking(booking):
+    """Cancel a pending booking; returns REJECTED or BOOKING_CHANGED"""
+    now = timezone.now()
+    with transaction.atomic():
+        released = _release(booking, now)
+        rejected = Booking.objects.filter(pk=booking.pk, status='pending').update(
+            status='cancelled', updated_at=now
+        )
+        if not rejected:
+            transaction.set_rollback(True)
+            return BOOKING_CHANGED
+        if released:
+            _after_commit(booking.provider_id, released=True)
+
+    booking.status = 'cancelled'
+    booking.updated_at = now
+    return REJECTED
+
+
+def complete_booking(booking):
+    """
+    Mark a confirmed or in-progress booking completed and free its ambulance
+
+    Returns COMPLETED or BOOKING_CHANGED.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        _release(booking, now)
+        completed = Booking.objects.filter(
+            pk=booking.pk, status__in=('confirmed', 'in_progress')
+        ).update(status='completed', updated_at=now)
+        if not completed:
+            transaction.set_rollback(True)
+            return BOOKING_CHANGED
+
+        _after_commit(booking.provider_id, released=True)
+
+    booking.status = 'completed'
+    booking.updated_at = now
+    return COMPLETED
+
+
+def set_in_service(ambulance, in_service):
+    """
+    Take an ambulance into or out of service (is_available)
+
+    An ambulance on a booking stays busy until the booking ends, and one
+    under maintenance stays there.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        Ambulance.objects.filter(pk=ambulance.pk).update(
+            is_available=in_service,
+            status=Case(
+                When(current_booking__isnull=False, then=Value('busy')),
+                When(status='maintenance', then=Value('maintenance')),
+                default=Value('available' if in_service else 'offline'),
+            ),
+            updated_at=now,
+        )
+        if in_service:
+            _after_commit(ambulance.provider_id, released=True)
+        else:
+            _after_commit(ambulance.provider_id, claimed=ambulance.pk)
+    ambulance.is_available = in_service
+    ambulance.updated_at = now
+
+
+def reconcile_ambulances(provider_id=None, dry_run=False):
+    """
+    Repair current_booking and status wherever they drifted from the bookings
+
+    Each ambulance's current booking is the newest active booking assigned
+    to it. Returns the (ambulance, expected current_booking_id, expected
+    status) of every row that was (or, with dry_run, would be) changed.
+    """
+    newest_active = Booking.objects.filter(
+        ambulance=OuterRef('pk'), status__in=Booking.ACTIVE_STATUSES
+    ).order_by('-created_at', '-id').values('id')[:1]
+    ambulances = Ambulance.objects.annotate(expected_booking=Subquery(newest_active))
+    if provider_id is not None:
+        ambulances = ambulances.filter(provider_id=provider_id)
+
+    drifted = []
+    for ambulance in ambulances.iterator():
+        expected = Ambulance(
+            is_available=ambulance.is_available, current_booking_id=ambulance.expected_booking,
+            status=ambulance.status,
+        )
+        expected_status = expected.derive_status()
+        if ambulance.current_booking_id != ambulance.expected_booking or ambulance.status != expected_status:
+            drifted.append((ambulance, ambulance.expected_booking, expected_status))
+
+    if drifted and not dry_run:
+        now = timezone.now()
+        with transaction.atomic():
+            for ambulance, booking_id, status in drifted:
+                # Leave rows alone that a transition changed in the meantime
+                Ambulance.objects.filter(
+                    pk=ambulance.pk, current_booking=ambulance.current_booking_id, status=ambulance.status
+                ).update(current_booking=booking_id, status=status, updated_at=now)
+            for provider_id in {ambulance.provider_id for ambulance, _, _ in drifted}:
+                _after_commit(provider_id, released=True)
+    return drifted
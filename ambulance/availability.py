@@ -0,0 +1,136 @@
+"""
+In-memory index of bookable ambulances for dispatch
+Each provider's available ambulances (status 'available') are loaded on
+first use with one query on the provider_id index, then kept current
+incrementally: ambulance and booking signals (ambulance/signals.py) and the
+booking transitions in ambulance/assignment.py add or drop single entries.
+A provider's entry is reloaded after INDEX_MAX_AGE_SECONDS so changes made
+by other processes show up.
+
+The index is only a shortlist; the dispatcher still claims an ambulance
+with the conditional update in accept_booking(), and drops any entry that
+turns out to be stale.
+"""
+import math
+import threading
+import time
+
+from core.models import Ambulance
+from userapp.directory import bookable_ambulances
+from userapp.geo import haversine_km
+
+
+INDEX_MAX_AGE_SECONDS = 300
+
+
+class AvailableAmbulanceIndex:
+    """Bookable ambulances per provider and type, with optional last positions"""
+
+    def __init__(self, max_age=INDEX_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        # provider_id -> {type: {ambulance_id: available since (monotonic)}}
+        self._providers = {}
+        self._loaded_at = {}
+        # ambulance_id -> (provider_id, type) for every indexed ambulance
+        self._entries = {}
+        # ambulance_id -> (lat, lng), fed by telemetry
+        self._positions = {}
+
+    def _load(self, provider_id):
+        rows = bookable_ambulances().filter(provider_id=provider_id).values_list('id', 'type')
+        now = time.monotonic()
+        by_type = {}
+        for ambulance_id, ambulance_type in rows:
+            by_type.setdefault(ambulance_type, {})[ambulance_id] = now
+
+        with self._lock:
+            self._drop_provider(provider_id)
+            self._providers[provider_id] = by_type
+            for ambulance_type, ambulances in by_type.items():
+                for ambulance_id in ambulances:
+                    self._entries[ambulance_id] = (provider_id, ambulance_type)
+            self._loaded_at[provider_id] = now
+
+    def _drop_provider(self, provider_id):
+        for ambulances in self._providers.pop(provider_id, {}).values():
+            for ambulance_id in ambulances:
+                self._entries.pop(ambulance_id, None)
+        self._loaded_at.pop(provider_id, None)
+
+    def _ensure_loaded(self, provider_id):
+        loaded_at = self._loaded_at.get(provider_id)
+        if loaded_at is None or time.monotonic() - loaded_at > self.max_age:
+            self._load(provider_id)
+
+    def invalidate(self, provider_id):
+        """Reload a provider's ambulances on its next dispatch"""
+        with self._lock:
+            self._drop_provider(provider_id)
+
+    def remove(self, ambulance_id):
+        """The ambulance is no longer bookable"""
+        with self._lock:
+            entry = self._entries.pop(ambulance_id, None)
+            if entry:
+                provider_id, ambulance_type = entry
+                self._providers.get(provider_id, {}).get(ambulance_type, {}).pop(ambulance_id, None)
+
+    def add(self, ambulance_id, provider_id, ambulance_type):
+        """The ambulance became bookable (ignored until its provider is loaded)"""
+        with self._lock:
+            if provider_id not in self._providers:
+                return
+            self.remove(ambulance_id)
+            self._providers[provider_id].setdefault(ambulance_type, {})[ambulance_id] = time.monotonic()
+            self._entries[ambulance_id] = (provider_id, ambulance_type)
+
+    def update(self, ambulance):
+        """Re-index an Ambulance after it was saved"""
+        if ambulance.status == 'available':
+            self.add(ambulance.id, ambulance.provider_id, ambulance.type)
+        else:
+            self.remove(ambulance.id)
+
+    def set_position(self, ambulance_id, lat, lng):
+        with self._lock:
+            self._positions[ambulance_id] = (lat, lng)
+
+    def forget(self, ambulance_id):
+        """Drop a deleted ambulance entirely"""
+        with self._lock:
+            self.remove(ambulance_id)
+            self._positions.pop(ambulance_id, None)
+
+    def candidates(self, provider_id, types, lat=None, lng=None, limit=5):
+        """
+        Up to `limit` bookable ambulance ids of `provider_id`, best first
+
+        Ambulances of earlier `types` come first. Within a type the nearest
+        to (lat, lng) wins when positions are known; otherwise the one
+        available the longest.
+        """
+        with self._lock:
+            self._ensure_loaded(provider_id)
+            by_type = self._providers.get(provider_id, {})
+            ranked = []
+            for rank, ambulance_type in enumerate(types):
+                for ambulance_id, since in by_type.get(ambulance_type, {}).items():
+                    position = self._positions.get(ambulance_id)
+                    if lat is not None and lng is not None and position:
+                        distance = haversine_km(lat, lng, position[0], position[1])
+                    else:
+                        distance = math.inf
+                    ranked.append((rank, distance, since, ambulance_id))
+        ranked.sort()
+        return [ambulance_id for _, _, _, ambulance_id in ranked[:limit]]
+
+    def ambulance_type(self, ambulance_id):
+        with self._lock:
+            entry = self._entries.get(ambulance_id)
+        if entry:
+            return entry[1]
+        return Ambulance.objects.filter(pk=ambulance_id).values_list('type', flat=True).first()
+
+
+ambulance_availability = AvailableAmbulanceIndex()
@@ -0,0 +1,94 @@
+"""
+Automatic ambulance dispatch
+For providers with auto_dispatch enabled, a new booking whose pickup is due
+within AMBULANCE_DISPATCH_WINDOW_MINUTES is confirmed straight away with the
+best bookable ambulance: the one the user picked if it is still free and
+suited to the emergency, otherwise the closest suitable one from the in-memory availability index.
+Each attempt goes through accept_booking(), so the dispatcher can't
+double-book an ambulance that a provider is assigning by hand.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.activity import log_activity
+from ambulance.assignment import accept_booking, ACCEPTED, BOOKING_CHANGED
+from ambulance.availability import ambulance_availability
+
+
+logger = logging.getLogger(__name__)
+
+# Ambulance types to try for a Booking.emergency_type, most suitable first
+DISPATCH_TYPES = {
+    'critical': ('ALS',),
+    'non-emergency': ('Non-Emergency', 'BLS', 'ALS'),
+}
+DEFAULT_DISPATCH_TYPES = ('ALS', 'BLS')
+
+# Stale index entries skipped before giving up
+MAX_ATTEMPTS = 5
+
+
+def dispatch_types(emergency_type, preferred_type=None):
+    """Ambulance types to consider for a booking, in order of preference"""
+    types = DISPATCH_TYPES.get((emergency_type or '').strip().lower(), DEFAULT_DISPATCH_TYPES)
+    # A preference can only reorder the suitable types, never add one
+    if preferred_type in types:
+        types = (preferred_type,) + tuple(t for t in types if t != preferred_type)
+    return types
+
+
+def is_due(booking):
+    """Whether the booking's pickup is soon enough to tie up an ambulance now"""
+    window = timedelta(minutes=getattr(settings, 'AMBULANCE_DISPATCH_WINDOW_MINUTES', 60))
+    pickup_date, pickup_time = booking.pickup_date, booking.pickup_time
+    if isinstance(pickup_date, str):
+        pickup_date = datetime.strptime(pickup_date, '%Y-%m-%d').date()
+    if isinstance(pickup_time, str):
+        pickup_time = datetime.strptime(pickup_time[:5], '%H:%M').time()
+    pickup = timezone.make_aware(datetime.combine(pickup_date, pickup_time))
+    return pickup <= timezone.now() + window
+
+
+def dispatch_booking(booking, lat=None, lng=None):
+    """
+    Assign the best available ambulance to a pending booking
+
+    (lat, lng) is the pickup point, if known. Returns the assigned
+    ambulance id, or None if nothing suitable was free; the booking then
+    stays pending for the provider to assign by hand.
+    """
+    requested = booking.ambulance_id
+    requested_type = ambulance_availability.ambulance_type(requested) if requested else None
+    types = dispatch_types(booking.emergency_type, requested_type)
+    if requested_type not in types:
+        # e.g. a BLS vehicle picked for a critical booking
+        requested = None
+    candidates = [requested] if requested else []
+    candidates += [
+        ambulance_id
+        for ambulance_id in ambulance_availability.candidates(
+            booking.provider_id, types, lat, lng, limit=MAX_ATTEMPTS
+        )
+        if ambulance_id != requested
+    ]
+
+    for ambulance_id in candidates:
+        result = accept_booking(booking, ambulance_id)
+        if result == ACCEPTED:
+            log_activity(
+                None,
+                'system',
+                'auto_dispatch',
+                f'Assigned ambulance #{ambulance_id} to booking #{booking.id}'
+            )
+            return ambulance_id
+        if result == BOOKING_CHANGED:
+            return None
+        # Taken since it was indexed (or never bookable); skip it from now on
+        ambulance_availability.remove(ambulance_id)
+
+    logger.info('No ambulance free to auto-dispatch booking #%s', booking.id)
+    return None
@@ -0,0 +1,34 @@
+"""
+Per-provider fleet statistics
+The dashboard polls these every few seconds, so they are computed with one
+aggregated query over the provider's ambulances (indexed by provider). They
+are not cached: the default cache is per process, so a cached copy would go
+stale on every other worker whenever an ambulance or booking changed.
+"""
+from django.db.models import Count, Q
+
+from core.models import AmbulanceProvider
+
+
+def fleet_stats(provider_id):
+    """
+    Ambulance counts for a provider
+
+    Returns a dict with total_ambulances, available_ambulances, als_count,
+    bls_count, non_emergency_count and last_updated (the provider's
+    updated_at), or None if the provider doesn't exist.
+    """
+    stats = AmbulanceProvider.objects.filter(pk=provider_id).annotate(
+        total_ambulances=Count('ambulances'),
+        available_ambulances=Count('ambulances', filter=Q(ambulances__status='available')),
+        als_count=Count('ambulances', filter=Q(ambulances__type='ALS')),
+        bls_count=Count('ambulances', filter=Q(ambulances__type='BLS')),
+        non_emergency_count=Count('ambulances', filter=Q(ambulances__type='Non-Emergency')),
+    ).values(
+        'total_ambulances', 'available_ambulances', 'als_count', 'bls_count',
+        'non_emergency_count', 'updated_at',
+    ).first()
+    if stats is None:
+        return None
+    stats['last_updated'] = stats.pop('updated_at')
+    return stats
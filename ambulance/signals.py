@@ -0,0 +1,37 @@
+"""
+Signal handlers keeping the dispatch availability index and the telemetry
+fleet lists in sync with the database
+Bulk queryset.update() calls bypass these; the index's reload interval
+bounds staleness.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.models import AmbulanceProvider, Ambulance, Booking
+from ambulance.availability import ambulance_availability
+from ambulance.telemetry import telemetry
+
+
+@receiver(post_save, sender=Ambulance)
+def reindex_ambulance(sender, instance, **kwargs):
+    ambulance_availability.update(instance)
+    # New or renumbered vehicles may report telemetry straight away
+    telemetry.invalidate_fleet(instance.provider_id)
+
+
+@receiver(post_delete, sender=Ambulance)
+def unindex_ambulance(sender, instance, **kwargs):
+    ambulance_availability.forget(instance.id)
+    telemetry.forget(instance.id)
+    telemetry.invalidate_fleet(instance.provider_id)
+
+
+@receiver(post_save, sender=Booking)
+def hold_booked_ambulance(sender, instance, **kwargs):
+    """An ambulance on an active booking can't be dispatched to another one"""
+    if instance.ambulance_id and instance.status in Booking.ACTIVE_STATUSES:
+        ambulance_availability.remove(instance.ambulance_id)
+
+
+@receiver(post_delete, sender=AmbulanceProvider)
+def unindex_provider(sender, instance, **kwargs):
+    ambulance_availability.invalidate(instance.id)
@@ -0,0 +1,267 @@
+"""
+Ambulance GPS telemetry
+Vehicles report batches of position pings several times a second. Pings go
+into a fixed-size ring buffer per vehicle in memory, so ingesting them and
+reading the latest positions never touches the database. A background
+thread periodically writes a downsampled track, the last ping of every
+TELEMETRY_SAMPLE_SECONDS window, to AmbulancePosition with bulk_create.
+
+Only closed windows are written, so each vehicle gets at most one row per
+window; the open ones are written when the process exits. Buffers are per
+process: with several workers, each knows the vehicles that reported to it.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections
+from django.utils.dateparse import parse_datetime
+
+from core.models import Ambulance, AmbulancePosition
+from ambulance.availability import ambulance_availability
+from userapp.geo import parse_coordinates
+
+
+logger = logging.getLogger(__name__)
+
+# Pings accepted in one request
+MAX_BATCH_PINGS = 1000
+
+# Pings stamped further than this from server time, either way, are rejected:
+# one from the future would hold back the vehicle's later pings until then,
+# and a stale one would land in a window that has already been written
+MAX_CLOCK_SKEW_SECONDS = 60
+
+# How long a provider's fleet (id and vehicle number) is reused for validation
+FLEET_CACHE_SECONDS = 300
+
+Ping = namedtuple('Ping', 'ts lat lng speed heading')
+
+
+def _parse_timestamp(value):
+    """Epoch seconds or an ISO 8601 string -> epoch seconds, or None"""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed.timestamp()
+
+
+def _parse_optional_int(value, upper):
+    try:
+        number = int(round(float(value)))
+    except (TypeError, ValueError):
+        return None
+    return number if 0 <= number <= upper else None
+
+
+def parse_ping(data):
+    """A Ping from one reported JSON object, or None if it is invalid"""
+    lat, lng = parse_coordinates(data.get('lat'), data.get('lng'))
+    ts = _parse_timestamp(data.get('ts'))
+    if lat is None or ts is None or abs(ts - time.time()) > MAX_CLOCK_SKEW_SECONDS:
+        return None
+    return Ping(
+        ts, lat, lng,
+        _parse_optional_int(data.get('speed'), 32767),
+        _parse_optional_int(data.get('heading'), 359),
+    )
+
+
+class TelemetryBuffer:
+    """Per-vehicle ring buffers of recent pings, persisted in the background"""
+
+    def __init__(self, ring_size=None, sample_seconds=None, persist_interval=None):
+        self.ring_size = ring_size or getattr(settings, 'TELEMETRY_RING_SIZE', 256)
+        self.sample_seconds = sample_seconds or getattr(settings, 'TELEMETRY_SAMPLE_SECONDS', 30)
+        self.persist_interval = persist_interval or getattr(settings, 'TELEMETRY_PERSIST_INTERVAL', 15)
+        self._lock = threading.Lock()
+        # ambulance_id -> deque of Pings, oldest first
+        self._tracks = {}
+        # ambulance_id -> end (epoch seconds) of the last window written
+        self._persisted_until = {}
+        # provider_id -> (loaded_at, {vehicle_number: id}, {ids})
+        self._fleets = {}
+        # Serializes persist() between the worker and the exit hook
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # A forked worker process inherits the object but not the thread
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.persist_interval)
+            try:
+                self.persist()
+            except Exception:
+                logger.exception('Persisting ambulance telemetry failed')
+
+    def fleet(self, provider_id):
+        """({vehicle_number: id}, {ids}) of a provider's ambulances (cached)"""
+        with self._lock:
+            cached = self._fleets.get(provider_id)
+        if cached and time.monotonic() - cached[0] < FLEET_CACHE_SECONDS:
+            return cached[1], cached[2]
+        rows = Ambulance.objects.filter(provider_id=provider_id).values_list('vehicle_number', 'id')
+        by_number = {number.upper(): ambulance_id for number, ambulance_id in rows}
+        with self._lock:
+            self._fleets[provider_id] = (time.monotonic(), by_number, set(by_number.values()))
+        return by_number, set(by_number.values())
+
+    def invalidate_fleet(self, provider_id):
+        with self._lock:
+            self._fleets.pop(provider_id, None)
+
+    def ingest(self, provider_id, reports):
+        """
+        Record a batch of reported pings for a provider's vehicles
+
+        Each report is a dict with 'ambulance' (id) or 'vehicle' (number),
+        'lat', 'lng' and optionally 'ts' (epoch seconds or ISO 8601),
+        'speed' (km/h) and 'heading' (degrees). Returns (accepted, rejected).
+        """
+        by_number, ids = self.fleet(provider_id)
+        pings = {}
+        rejected = 0
+        for report in reports[:MAX_BATCH_PINGS]:
+            if not isinstance(report, dict):
+                rejected += 1
+                continue
+            if report.get('ambulance') is not None:
+                ambulance_id = _parse_optional_int(report['ambulance'], 2 ** 63)
+            else:
+                ambulance_id = by_number.get(str(report.get('vehicle', '')).strip().upper())
+            ping = parse_ping(report)
+            if ambulance_id not in ids or ping is None:
+                rejected += 1
+                continue
+            pings.setdefault(ambulance_id, []).append(ping)
+        rejected += max(0, len(reports) - MAX_BATCH_PINGS)
+
+        accepted = 0
+        latest = {}
+        with self._lock:
+            for ambulance_id, vehicle_pings in pings.items():
+                track = self._tracks.get(ambulance_id)
+                if track is None:
+                    track = self._tracks[ambulance_id] = deque(maxlen=self.ring_size)
+                for ping in sorted(vehicle_pings, key=lambda p: p.ts):
+                    # Drop duplicates and pings older than the newest one held
+                    if track and ping.ts <= track[-1].ts:
+                        rejected += 1
+                        continue
+                    track.append(ping)
+                    accepted += 1
+                if track:
+                    latest[ambulance_id] = track[-1]
+
+        for ambulance_id, ping in latest.items():
+            ambulance_availability.set_position(ambulance_id, ping.lat, ping.lng)
+        if accepted:
+            self._ensure_worker()
+        return accepted, rejected
+
+    def latest(self, ambulance_ids=None):
+        """{ambulance_id: newest Ping} from memory, for all or the given vehicles"""
+        with self._lock:
+            if ambulance_ids is None:
+                ambulance_ids = list(self._tracks)
+            return {
+                ambulance_id: self._tracks[ambulance_id][-1]
+                for ambulance_id in ambulance_ids
+                if self._tracks.get(ambulance_id)
+            }
+
+    def recent(self, ambulance_id):
+        """Every buffered Ping of one vehicle, oldest first"""
+        with self._lock:
+            return list(self._tracks.get(ambulance_id, ()))
+
+    def forget(self, ambulance_id):
+        with self._lock:
+            self._tracks.pop(ambulance_id, None)
+            self._persisted_until.pop(ambulance_id, None)
+
+    def _samples(self, final):
+        """One Ping per window not yet persisted, as (ambulance_id, Ping)"""
+        open_window = int(time.time() // self.sample_seconds)
+        samples = []
+        with self._lock:
+            for ambulance_id, track in self._tracks.items():
+                done_until = self._persisted_until.get(ambulance_id, 0)
+                last_in_window = {}
+                for ping in track:
+                    window = int(ping.ts // self.sample_seconds)
+                    if ping.ts < done_until or (window >= open_window and not final):
+                        continue
+                    last_in_window[window] = ping
+                if last_in_window:
+                    samples.extend((ambulance_id, ping) for ping in last_in_window.values())
+                    self._persisted_until[ambulance_id] = (max(last_in_window) + 1) * self.sample_seconds
+        return samples
+
+    def persist(self, final=False):
+        """Write the downsampled track; returns the number of rows written"""
+        with self._write_lock:
+            rows = [
+                AmbulancePosition(
+                    ambulance_id=ambulance_id,
+                    recorded_at=datetime.fromtimestamp(ping.ts, tz=dt_timezone.utc),
+                    latitude_e6=round(ping.lat * 1e6),
+                    longitude_e6=round(ping.lng * 1e6),
+                    speed_kmh=ping.speed,
+                    heading=ping.heading,
+                )
+                for ambulance_id, ping in self._samples(final)
+            ]
+            if not rows:
+                return 0
+            close_old_connections()
+            try:
+                AmbulancePosition.objects.bulk_create(rows)
+                return len(rows)
+            except DatabaseError:
+                # e.g. an ambulance deleted since it reported
+                return self._write_individually(rows)
+            finally:
+                close_old_connections()
+
+    def _write_individually(self, rows):
+        written = 0
+        for row in rows:
+            try:
+                row.save(force_insert=True)
+                written += 1
+            except IntegrityError:
+                pass
+            except DatabaseError:
+                logger.exception('Could not write position of ambulance %s', row.ambulance_id)
+        return written
+
+
+telemetry = TelemetryBuffer()
+
+
+@atexit.register
+def _persist_on_exit():
+    try:
+        telemetry.persist(final=True)
+    except Exception:
+        logger.exception('Persisting ambulance telemetry on shutdown failed')
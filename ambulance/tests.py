@@ -0,0 +1,262 @@
+"""
+Tests for the ambulance app
+"""
+import threading
+import time as clock
+from datetime import date, time
+
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.models import User, Hospital, AmbulanceProvider, Ambulance, Booking
+from ambulance.assignment import (
+    accept_booking, complete_booking, ACCEPTED, AMBULANCE_UNAVAILABLE,
+)
+from ambulance.availability import ambulance_availability
+from ambulance.dispatch import dispatch_booking, dispatch_types
+from ambulance.telemetry import MAX_CLOCK_SKEW_SECONDS, TelemetryBuffer
+
+
+def race(workers):
+    """Run the callables in threads released at the same moment; returns their results"""
+    barrier = threading.Barrier(len(workers))
+    results = [None] * len(workers)
+
+    def run(position, work):
+        try:
+            barrier.wait()
+            results[position] = work()
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run, args=(position, work)) for position, work in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def retrying(transition, *args):
+    """Call a booking transition, retrying while SQLite reports the database locked"""
+    def work():
+        while True:
+            try:
+                return transition(*args)
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+    return work
+
+
+class BookingAssignmentRaceTests(TransactionTestCase):
+    """Dispatchers racing to assign bookings to the same ambulances"""
+
+    THREADS = 8
+
+    def setUp(self):
+        owner = User.objects.create_user(
+            'provider', 'provider@example.com', 'password123', phone='1', role='ambulance'
+        )
+        patient = User.objects.create_user(
+            'patient', 'patient@example.com', 'password123', phone='2', role='user'
+        )
+        hospital = Hospital.objects.create(
+            name='City Hospital', address='Main Road', city='Pune', email='h@example.com',
+            phone='3', owner=owner,
+        )
+        self.provider = AmbulanceProvider.objects.create(
+            name='Rapid Response', address='Station Road', city='Pune', email='p@example.com',
+            phone='4', service_area='Pune', owner=owner,
+        )
+        self.booking_defaults = {
+            'user': patient, 'provider': self.provider, 'hospital': hospital,
+            'patient_name': 'Patient', 'patient_phone': '5',
+            'pickup_location': 'Home', 'drop_location': 'City Hospital',
+            'pickup_date': date(2026, 1, 1), 'pickup_time': time(9, 0),
+        }
+
+    def create_ambulances(self, count):
+        return [
+            Ambulance.objects.create(
+                vehicle_number=f'MH12AB{1000 + number}', type='ALS', driver_name='Driver',
+                driver_phone='6', provider=self.provider,
+            )
+            for number in range(count)
+        ]
+
+    def create_bookings(self, count):
+        return [Booking.objects.create(**self.booking_defaults) for _ in range(count)]
+
+    def test_one_booking_wins_an_ambulance(self):
+        ambulance, = self.create_ambulances(1)
+        bookings = self.create_bookings(self.THREADS)
+
+        results = race([retrying(accept_booking, booking, ambulance.id) for booking in bookings])
+
+        self.assertEqual(results.count(ACCEPTED), 1)
+        self.assertEqual(results.count(AMBULANCE_UNAVAILABLE), self.THREADS - 1)
+        winner = bookings[results.index(ACCEPTED)]
+        ambulance.refresh_from_db()
+        self.assertEqual(ambulance.current_booking_id, winner.id)
+        self.assertEqual(ambulance.status, 'busy')
+        confirmed = Booking.objects.filter(status='confirmed')
+        self.assertEqual(list(confirmed.values_list('id', 'ambulance_id')), [(winner.id, ambulance.id)])
+
+    def test_released_ambulance_is_won_once_per_round(self):
+        ambulance, = self.create_ambulances(1)
+        winner = None
+        for _ in range(5):
+            bookings = self.create_bookings(self.THREADS)
+            workers = [retrying(accept_booking, booking, ambulance.id) for booking in bookings]
+            if winner is not None:
+                # The previous booking completes while the next ones race for its ambulance
+                workers.append(retrying(complete_booking, winner))
+            results = race(workers)[:self.THREADS]
+
+            accepted = [booking for booking, result in zip(bookings, results) if result == ACCEPTED]
+            self.assertLessEqual(len(accepted), 1)
+            ambulance.refresh_from_db()
+            if accepted:
+                winner, = accepted
+                self.assertEqual(ambulance.current_booking_id, winner.id)
+                self.assertEqual(ambulance.status, 'busy')
+            elif winner is not None:
+                # Every accept ran before the completion freed the ambulance
+                self.assertIsNone(ambulance.current_booking_id)
+                self.assertEqual(ambulance.status, 'available')
+                winner = None
+            self.assertLessEqual(
+                Booking.objects.filter(ambulance=ambulance, status__in=Booking.ACTIVE_STATUSES).count(), 1
+            )
+
+    def test_shared_fleet_assigns_each_ambulance_once(self):
+        ambulances = self.create_ambulances(3)
+        bookings = self.create_bookings(self.THREADS)
+
+        def dispatch(booking):
+            def work():
+                # Try every ambulance until one is won, as a dispatcher would
+                for ambulance in ambulances:
+                    if retrying(accept_booking, booking, ambulance.id)() == ACCEPTED:
+                        return ambulance.id
+                return None
+            return work
+
+        results = race([dispatch(booking) for booking in bookings])
+
+        assigned = [ambulance_id for ambulance_id in results if ambulance_id is not None]
+        self.assertCountEqual(assigned, [ambulance.id for ambulance in ambulances])
+        for ambulance in ambulances:
+            ambulance.refresh_from_db()
+            holder = bookings[results.index(ambulance.id)]
+            self.assertEqual(ambulance.current_booking_id, holder.id)
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), len(ambulances))
+        self.assertEqual(Booking.objects.filter(status='pending').count(), self.THREADS - len(ambulances))
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False)
+class DispatchTypeTests(TestCase):
+    """Automatic dispatch only sends ambulances suited to the emergency"""
+
+    def setUp(self):
+        owner = User.objects.create_user(
+            'provider', 'provider@example.com', 'password123', phone='1', role='ambulance'
+        )
+        patient = User.objects.create_user(
+            'patient', 'patient@example.com', 'password123', phone='2', role='user'
+        )
+        hospital = Hospital.objects.create(
+            name='City Hospital', address='Main Road', city='Pune', email='h@example.com',
+            phone='3', owner=owner,
+        )
+        self.provider = AmbulanceProvider.objects.create(
+            name='Rapid Response', address='Station Road', city='Pune', email='p@example.com',
+            phone='4', service_area='Pune', owner=owner, auto_dispatch=True,
+        )
+        self.booking_defaults = {
+            'user': patient, 'provider': self.provider, 'hospital': hospital, 'emergency_type': 'critical',
+            'patient_name': 'Patient', 'patient_phone': '5',
+            'pickup_location': 'Home', 'drop_location': 'City Hospital',
+            'pickup_date': date(2026, 1, 1), 'pickup_time': time(9, 0),
+        }
+        # The index outlives each test's rolled-back rows
+        ambulance_availability.invalidate(self.provider.id)
+        self.addCleanup(ambulance_availability.invalidate, self.provider.id)
+
+    def add_ambulance(self, ambulance_type, number):
+        return Ambulance.objects.create(
+            vehicle_number=f'MH12AB{number}', type=ambulance_type, driver_name='Driver',
+            driver_phone='6', provider=self.provider,
+        )
+
+    def test_preferred_type_only_reorders_allowed_types(self):
+        self.assertEqual(dispatch_types('critical', 'BLS'), ('ALS',))
+        self.assertEqual(dispatch_types('non-emergency', 'ALS'), ('ALS', 'Non-Emergency', 'BLS'))
+        self.assertEqual(dispatch_types('Critical', None), ('ALS',))
+
+    def test_critical_booking_with_requested_bls_gets_an_als(self):
+        bls, als = self.add_ambulance('BLS', 1000), self.add_ambulance('ALS', 1001)
+        booking = Booking.objects.create(ambulance=bls, **self.booking_defaults)
+
+        self.assertEqual(dispatch_booking(booking), als.id)
+
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.ambulance_id), ('confirmed', als.id))
+        bls.refresh_from_db()
+        self.assertEqual((bls.status, bls.current_booking_id), ('available', None))
+
+    def test_critical_booking_stays_pending_without_an_als(self):
+        bls = self.add_ambulance('BLS', 1000)
+        booking = Booking.objects.create(ambulance=bls, **self.booking_defaults)
+
+        self.assertIsNone(dispatch_booking(booking))
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, 'pending')
+        bls.refresh_from_db()
+        self.assertEqual(bls.status, 'available')
+
+
+class TelemetryIngestTests(TestCase):
+    """GPS pings reported by the provider's vehicles"""
+
+    def setUp(self):
+        owner = User.objects.create_user(
+            'provider', 'provider@example.com', 'password123', phone='1', role='ambulance'
+        )
+        self.provider = AmbulanceProvider.objects.create(
+            name='Rapid Response', address='Station Road', city='Pune', email='p@example.com',
+            phone='4', service_area='Pune', owner=owner,
+        )
+        self.ambulance = Ambulance.objects.create(
+            vehicle_number='MH12AB1000', type='ALS', driver_name='Driver',
+            driver_phone='6', provider=self.provider,
+        )
+        # Nothing is persisted while the test runs
+        self.telemetry = TelemetryBuffer(persist_interval=3600)
+
+    def ping(self, ts, **fields):
+        return {'ambulance': self.ambulance.id, 'lat': 18.52, 'lng': 73.85, 'ts': ts, **fields}
+
+    def test_pings_outside_the_clock_skew_window_are_rejected(self):
+        now = clock.time()
+        reports = [
+            self.ping(now - MAX_CLOCK_SKEW_SECONDS - 60),
+            self.ping(now - 10),
+            self.ping(now),
+            self.ping(now + MAX_CLOCK_SKEW_SECONDS + 60),
+            self.ping(None),
+        ]
+
+        self.assertEqual(self.telemetry.ingest(self.provider.id, reports), (3, 2))
+        self.assertEqual([ping.ts for ping in self.telemetry.recent(self.ambulance.id)][:2], [now - 10, now])
+
+    def test_future_ping_does_not_block_later_ones(self):
+        now = clock.time()
+        self.telemetry.ingest(self.provider.id, [self.ping(now + 4 * 60)])
+
+        accepted, _ = self.telemetry.ingest(self.provider.id, [self.ping(now + 1)])
+
+        self.assertEqual(accepted, 1)
+        self.assertEqual(self.telemetry.latest()[self.ambulance.id].ts, now + 1)
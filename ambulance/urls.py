@@ -15,4 +15,6 @@ urlpatterns = [
     path('activity-logs/', views.activity_logs, name='activity_logs'),
     path('help-support/', views.help_support, name='help_support'),
     path('api/dashboard-stats/', views.dashboard_stats_api, name='dashboard_stats_api'),
+    path('api/telemetry/', views.telemetry_api, name='telemetry_api'),
+    path('api/positions/', views.positions_api, name='positions_api'),
 ]
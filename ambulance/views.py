@@ -3,60 +3,48 @@ Ambulance Admin App Views
 Handles all ambulance provider administrator functionality
 Updated to use Django ORM instead of MongoDB
 """
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from django.db.models import Q, Count
 from django.http import JsonResponse
-from core.views import require_role
-from core.models import AmbulanceProvider, Ambulance, ActivityLog, User, Booking
+from django.core import signing
+from django.utils.dateparse import parse_datetime
+from core.views import require_api_login, require_role
+from core.models import Ambulance, ActivityLog, Booking
+from core.activity import log_activity, activity_log_writer
+from core.archive import archived_months, parse_month, read_archived_logs
+from core.tenancy import get_tenant_or_404, tenant_id_for
+from ambulance.fleet import fleet_stats
+from ambulance.telemetry import telemetry
+from userapp.directory import bookable_ambulances
+from ambulance.assignment import (
+    accept_booking, reject_booking, complete_booking, set_in_service,
+    AMBULANCE_NOT_FOUND, AMBULANCE_UNAVAILABLE, BOOKING_CHANGED,
+)
 from datetime import datetime
+import json
 
 
-def log_activity(user_id, user_role, action, details):
-    """Helper function to log user activities"""
-    try:
-        user = User.objects.get(id=user_id)
-        ActivityLog.objects.create(
-            user=user,
-            user_role=user_role,
-            action=action,
-            details=details
-        )
-    except User.DoesNotExist:
-        pass
+# Bookings shown per page of the inbox
+BOOKINGS_PAGE_SIZE = 25
+BOOKINGS_CURSOR_SALT = 'ambulance.bookings.cursor'
+BOOKING_STATUSES = {'all'} | {status for status, _ in Booking.STATUS_CHOICES}
 
 
 @require_role('ambulance')
 def dashboard(request):
     """Ambulance admin dashboard overview"""
-    user = request.user
-    
-    # Get provider for this user
-    try:
-        provider = AmbulanceProvider.objects.get(owner=user)
-    except AmbulanceProvider.DoesNotExist:
+    # Provider managed by this user (resolved by TenantMiddleware)
+    provider = request.tenant
+    if not provider:
         messages.error(request, 'Provider information not found')
         return redirect('core:login')
     
-    # Calculate stats
-    ambulances = provider.ambulances.all()
-    total_ambulances = ambulances.count()
-    available_ambulances = ambulances.filter(is_available=True).count()
-    
-    # Count by type
-    als_count = ambulances.filter(type='ALS').count()
-    bls_count = ambulances.filter(type='BLS').count()
-    non_emergency_count = ambulances.filter(type='Non-Emergency').count()
-    
+    # Calculate stats (one aggregated query, cached per provider)
     context = {
         'provider': provider,
-        'total_ambulances': total_ambulances,
-        'available_ambulances': available_ambulances,
-        'als_count': als_count,
-        'bls_count': bls_count,
-        'non_emergency_count': non_emergency_count,
-        'last_updated': provider.updated_at,
+        **fleet_stats(provider.id),
     }
     
     return render(request, 'ambulance/dashboard.html', context)
@@ -67,7 +55,7 @@ def dashboard(request):
 def manage_ambulances(request):
     """Manage ambulances - add, edit, delete"""
     user = request.user
-    provider = get_object_or_404(AmbulanceProvider, owner=user)
+    provider = get_tenant_or_404(request)
     
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -130,7 +118,8 @@ def manage_ambulances(request):
                 ambulance.driver_name = driver_name or 'Not Assigned'
                 ambulance.driver_phone = driver_phone or 'N/A'
                 ambulance.facilities = ', '.join(facilities)
-                ambulance.save()
+                # Leave current_booking and status to the booking transitions
+                ambulance.save(update_fields=['type', 'driver_name', 'driver_phone', 'facilities', 'updated_at'])
                 
                 log_activity(
                     user.id,
@@ -175,8 +164,7 @@ def manage_ambulances(request):
                     vehicle_number=ambulance_number,
                     provider=provider
                 )
-                ambulance.is_available = is_available
-                ambulance.save()
+                set_in_service(ambulance, is_available)
                 
                 status = 'available' if is_available else 'unavailable'
                 log_activity(
@@ -208,9 +196,7 @@ def manage_ambulances(request):
     all_ambulances = provider.ambulances.all()
     
     # Calculate statistics
-    available_count = all_ambulances.filter(is_available=True).count()
-    als_count = all_ambulances.filter(type='ALS').count()
-    bls_count = all_ambulances.filter(type='BLS').count()
+    stats = fleet_stats(provider.id)
     
     # Get ambulances with their data
     ambulances_list = []
@@ -222,6 +208,7 @@ def manage_ambulances(request):
             'driver_phone': ambulance.driver_phone,
             'facilities': ambulance.facilities.split(', ') if ambulance.facilities else [],
             'is_available': ambulance.is_available,
+            'status': ambulance.status,
             'added_at': ambulance.created_at
         })
     
@@ -229,9 +216,9 @@ def manage_ambulances(request):
         'provider': provider,
         'ambulances': ambulances_list,
         'available_facilities': available_facilities,
-        'available_count': available_count,
-        'als_count': als_count,
-        'bls_count': bls_count,
+        'available_count': stats['available_ambulances'],
+        'als_count': stats['als_count'],
+        'bls_count': stats['bls_count'],
     }
     return render(request, 'ambulance/manage_ambulances.html', context)
 
@@ -241,7 +228,7 @@ def manage_ambulances(request):
 def update_pricing(request):
     """Update ambulance pricing"""
     user = request.user
-    provider = get_object_or_404(AmbulanceProvider, owner=user)
+    provider = get_tenant_or_404(request)
     
     if request.method == 'POST':
         # Get form data
@@ -287,7 +274,7 @@ def update_pricing(request):
 def service_area(request):
     """Manage service area"""
     user = request.user
-    provider = get_object_or_404(AmbulanceProvider, owner=user)
+    provider = get_tenant_or_404(request)
     
     if request.method == 'POST':
         # Get selected cities/zones
@@ -319,7 +306,7 @@ def service_area(request):
     context = {
         'provider': provider,
         'available_cities': available_cities,
-        'current_service_area': provider.get_service_area_list()
+        'current_service_area': list(provider.service_cities.values_list('name', flat=True))
     }
     return render(request, 'ambulance/service_area.html', context)
 
@@ -329,22 +316,53 @@ def activity_logs(request):
     """View activity logs"""
     user = request.user
     
-    # Get logs for this ambulance admin
-    logs = ActivityLog.objects.filter(
-        user=user
-    ).order_by('-timestamp')[:50]
+    # An archived month, if one was picked; otherwise the recent entries
+    selected_month = parse_month(request.GET.get('month'))
+    if selected_month:
+        logs = read_archived_logs(*selected_month, user_id=user.id)
+    else:
+        # Write out queued entries so the user's latest actions show up
+        activity_log_writer.flush()
+        
+        # Get logs for this ambulance admin
+        logs = ActivityLog.objects.filter(
+            user=user
+        ).order_by('-timestamp')[:50]
     
     context = {
+        'archived_months': archived_months(),
+        'selected_month': request.GET.get('month', '') if selected_month else '',
         'logs': logs
     }
     return render(request, 'ambulance/activity_logs.html', context)
 
 
+def _encode_bookings_cursor(status_filter, booking):
+    return signing.dumps(
+        [status_filter, booking.created_at.isoformat(), booking.id], salt=BOOKINGS_CURSOR_SALT
+    )
+
+
+def _decode_bookings_cursor(value, status_filter):
+    """(created_at, id) of the last booking on the previous page, or None"""
+    if not value:
+        return None
+    try:
+        cursor_status, created_at, booking_id = signing.loads(value, salt=BOOKINGS_CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    # A cursor from another status tab would skip bookings on this one
+    created_at = parse_datetime(created_at) if cursor_status == status_filter else None
+    if created_at is None:
+        return None
+    return created_at, booking_id
+
+
 @require_role('ambulance')
 def bookings(request):
     """View and manage booking requests"""
     user = request.user
-    provider = get_object_or_404(AmbulanceProvider, owner=user)
+    provider = get_tenant_or_404(request)
     
     # Handle booking actions
     if request.method == 'POST':
@@ -361,46 +379,33 @@ def bookings(request):
                     messages.error(request, 'Please select an ambulance to assign')
                     return redirect('ambulance:bookings')
                 
-                try:
-                    ambulance = Ambulance.objects.get(id=ambulance_id, provider=provider)
-                    if not ambulance.is_available:
-                        messages.error(request, 'Selected ambulance is not available. Please select another ambulance.')
-                        return redirect('ambulance:bookings')
-                    
-                    # Check if ambulance has any active bookings (excluding current booking)
-                    active_bookings = Booking.objects.filter(
-                        ambulance=ambulance,
-                        status__in=['pending', 'confirmed', 'in_progress']
-                    ).exclude(id=booking.id).exists()
-                    
-                    if active_bookings:
-                        messages.error(request, 'Selected ambulance already has an active booking. Please select another ambulance.')
-                        return redirect('ambulance:bookings')
-                    
-                    # Assign ambulance and update booking status
-                    booking.ambulance = ambulance
-                    booking.status = 'confirmed'
-                    booking.save()
-                    
-                    # Mark ambulance as unavailable
-                    ambulance.is_available = False
-                    ambulance.save()
-                    
-                    log_activity(
-                        user.id,
-                        'ambulance',
-                        'accept_booking',
-                        f'Accepted booking #{booking.id} and assigned ambulance {ambulance.vehicle_number}'
-                    )
-                    
-                    messages.success(request, f'Booking #{booking.id} accepted and ambulance {ambulance.vehicle_number} assigned!')
-                except Ambulance.DoesNotExist:
+                # Claim the ambulance and confirm the booking in one transaction;
+                # fails if another dispatcher got there first
+                result = accept_booking(booking, int(ambulance_id))
+                if result == AMBULANCE_NOT_FOUND:
                     messages.error(request, 'Selected ambulance not found')
                     return redirect('ambulance:bookings')
+                if result == AMBULANCE_UNAVAILABLE:
+                    messages.error(request, 'Selected ambulance is not available or already has an active booking. Please select another ambulance.')
+                    return redirect('ambulance:bookings')
+                if result == BOOKING_CHANGED:
+                    messages.error(request, f'Booking #{booking.id} is no longer pending')
+                    return redirect('ambulance:bookings')
+                
+                ambulance = booking.ambulance
+                log_activity(
+                    user.id,
+                    'ambulance',
+                    'accept_booking',
+                    f'Accepted booking #{booking.id} and assigned ambulance {ambulance.vehicle_number}'
+                )
+                
+                messages.success(request, f'Booking #{booking.id} accepted and ambulance {ambulance.vehicle_number} assigned!')
                     
             elif action == 'reject':
-                booking.status = 'cancelled'
-                booking.save()
+                if reject_booking(booking) == BOOKING_CHANGED:
+                    messages.error(request, f'Booking #{booking.id} is no longer pending')
+                    return redirect('ambulance:bookings')
                 
                 log_activity(
                     user.id,
@@ -412,13 +417,10 @@ def bookings(request):
                 messages.success(request, f'Booking #{booking.id} rejected')
                 
             elif action == 'mark_completed':
-                booking.status = 'completed'
-                booking.save()
-                
-                # Mark ambulance as available again
-                if booking.ambulance:
-                    booking.ambulance.is_available = True
-                    booking.ambulance.save()
+                # Also marks the ambulance as available again
+                if complete_booking(booking) == BOOKING_CHANGED:
+                    messages.error(request, f'Booking #{booking.id} is not in progress')
+                    return redirect('ambulance:bookings')
                 
                 log_activity(
                     user.id,
@@ -442,28 +444,36 @@ def bookings(request):
     
     # Get filter status
     status_filter = request.GET.get('status', 'all')
+    if status_filter not in BOOKING_STATUSES:
+        status_filter = 'all'
     
-    # Get bookings for this provider
+    # Get one page of bookings for this provider, newest first; keyset
+    # pagination on (created_at, id) served by the provider/status indexes
     bookings_query = Booking.objects.filter(provider=provider).select_related('user', 'hospital', 'ambulance')
     
     if status_filter != 'all':
         bookings_query = bookings_query.filter(status=status_filter)
     
-    bookings_list = bookings_query.order_by('-created_at')
+    cursor = _decode_bookings_cursor(request.GET.get('cursor'), status_filter)
+    if cursor:
+        last_created_at, last_id = cursor
+        bookings_query = bookings_query.filter(
+            Q(created_at__lt=last_created_at) | Q(created_at=last_created_at, id__lt=last_id)
+        )
     
-    # Get available ambulances for assignment (exclude those with active bookings)
-    active_booking_ambulance_ids = Booking.objects.filter(
-        status__in=['pending', 'confirmed', 'in_progress']
-    ).exclude(ambulance__isnull=True).values_list('ambulance_id', flat=True)
+    bookings_list = list(bookings_query.order_by('-created_at', '-id')[:BOOKINGS_PAGE_SIZE + 1])
+    has_more = len(bookings_list) > BOOKINGS_PAGE_SIZE
+    bookings_list = bookings_list[:BOOKINGS_PAGE_SIZE]
     
-    available_ambulances = provider.ambulances.filter(
-        is_available=True
-    ).exclude(id__in=active_booking_ambulance_ids)
+    # Get available ambulances for assignment (exclude those with active bookings)
+    available_ambulances = bookable_ambulances().filter(provider=provider)
     
     context = {
         'provider': provider,
         'bookings': bookings_list,
         'status_filter': status_filter,
+        'next_cursor': _encode_bookings_cursor(status_filter, bookings_list[-1]) if has_more else None,
+        'is_first_page': cursor is None,
         'available_ambulances': available_ambulances,
     }
     return render(request, 'ambulance/bookings.html', context)
@@ -472,8 +482,7 @@ def bookings(request):
 @require_role('ambulance')
 def help_support(request):
     """Help and support page"""
-    user = request.user
-    provider = get_object_or_404(AmbulanceProvider, owner=user)
+    provider = get_tenant_or_404(request)
     
     context = {
         'provider': provider
@@ -484,31 +493,68 @@ def help_support(request):
 @require_role('ambulance')
 def dashboard_stats_api(request):
     """API endpoint for dashboard stats real-time update"""
-    user = request.user
-    
-    # Get provider for this user
-    try:
-        provider = AmbulanceProvider.objects.get(owner=user)
-    except AmbulanceProvider.DoesNotExist:
+    # Get provider for this user; both lookups are served from the cache
+    # while nothing in the fleet has changed
+    provider_id = tenant_id_for(request)
+    stats = fleet_stats(provider_id) if provider_id is not None else None
+    if stats is None:
         return JsonResponse({'error': 'Provider information not found'}, status=404)
     
-    # Calculate stats
-    ambulances = provider.ambulances.all()
-    total_ambulances = ambulances.count()
-    available_ambulances = ambulances.filter(is_available=True).count()
-    
-    # Count by type
-    als_count = ambulances.filter(type='ALS').count()
-    bls_count = ambulances.filter(type='BLS').count()
-    non_emergency_count = ambulances.filter(type='Non-Emergency').count()
-    
     data = {
-        'total_ambulances': total_ambulances,
-        'available_ambulances': available_ambulances,
-        'als_count': als_count,
-        'bls_count': bls_count,
-        'non_emergency_count': non_emergency_count,
-        'last_updated': provider.updated_at.strftime("%I:%M %p, %b %d, %Y")
+        **stats,
+        'last_updated': stats['last_updated'].strftime("%I:%M %p, %b %d, %Y")
     }
     
     return JsonResponse(data)
+
+
+@require_api_login
+@require_http_methods(["POST"])
+def telemetry_api(request):
+    """
+    Ingest a batch of GPS pings from the provider's vehicles
+
+    Body: {"pings": [{"ambulance": id or "vehicle": number, "lat", "lng",
+    "ts", "speed", "heading"}, ...]}. Pings are buffered in memory; see
+    ambulance/telemetry.py. Vehicle devices authenticate with HTTP Basic
+    (the provider account's email and password).
+    """
+    if request.user.role != 'ambulance':
+        return JsonResponse({'error': 'You do not have permission to report telemetry'}, status=403)
+    provider_id = tenant_id_for(request)
+    if provider_id is None:
+        return JsonResponse({'error': 'Provider information not found'}, status=404)
+    
+    try:
+        reports = json.loads(request.body).get('pings')
+    except (ValueError, AttributeError):
+        reports = None
+    if not isinstance(reports, list):
+        return JsonResponse({'error': 'Expected {"pings": [...]}'}, status=400)
+    
+    accepted, rejected = telemetry.ingest(provider_id, reports)
+    return JsonResponse({'accepted': accepted, 'rejected': rejected})
+
+
+@require_role('ambulance')
+def positions_api(request):
+    """Latest reported position of each of the provider's vehicles (from memory)"""
+    provider_id = tenant_id_for(request)
+    if provider_id is None:
+        return JsonResponse({'error': 'Provider information not found'}, status=404)
+    
+    by_number, ids = telemetry.fleet(provider_id)
+    numbers = {ambulance_id: number for number, ambulance_id in by_number.items()}
+    positions = [
+        {
+            'ambulance': ambulance_id,
+            'vehicle': numbers[ambulance_id],
+            'lat': ping.lat,
+            'lng': ping.lng,
+            'speed': ping.speed,
+            'heading': ping.heading,
+            'ts': ping.ts,
+        }
+        for ambulance_id, ping in telemetry.latest(ids).items()
+    ]
+    return JsonResponse({'positions': positions})
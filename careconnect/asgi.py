@@ -1,5 +1,9 @@
 """
 ASGI config for careconnect project.
+
+Serve with an ASGI server (e.g. `uvicorn careconnect.asgi:application`) to
+enable the live bed-availability stream at /user/live-availability/stream/.
+Run a single worker process: availability events are fanned out in memory.
 """
 
 import os
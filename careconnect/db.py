@@ -5,7 +5,7 @@ Keeping minimal functions for backward compatibility during migration
 """
 from django.contrib.auth.hashers import make_password, check_password
 from core.models import User, ActivityLog
-from django.utils import timezone
+from core import activity
 
 
 def hash_password(password):
@@ -20,10 +20,7 @@ def verify_password(password, hashed):
 
 def get_user_by_email(email):
     """Get user by email"""
-    try:
-        return User.objects.get(email=email)
-    except User.DoesNotExist:
-        return None
+    return User.objects.get_by_email(email)
 
 
 def get_user_by_id(user_id):
@@ -66,19 +63,8 @@ def create_user(password, **kwargs):
 
 
 def log_activity(user_id, user_role, action, details):
-    """Log user activity"""
-    try:
-        user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
-        user = None
-    
-    ActivityLog.objects.create(
-        user=user,
-        user_role=user_role,
-        action=action,
-        details=details,
-        timestamp=timezone.now()
-    )
+    """Log user activity (queued; see core.activity)"""
+    activity.log_activity(user_id, user_role, action, details)
 
 
 # Backward compatibility - db object
@@ -40,6 +40,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -130,3 +131,78 @@ DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 # If email settings are not configured, use console backend for development
 if not EMAIL_HOST_USER or not EMAIL_HOST_PASSWORD:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Activity logging: entries are queued and written in batches by a background thread
+ACTIVITY_LOG_ASYNC = os.getenv('ACTIVITY_LOG_ASYNC', 'True') == 'True'
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', '100'))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', '2'))
+
+# Activity log retention: older rows are moved to monthly compressed files
+# by `python manage.py archive_activity_logs`
+ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv('ACTIVITY_LOG_RETENTION_DAYS', '90'))
+ACTIVITY_LOG_ARCHIVE_DIR = Path(os.getenv('ACTIVITY_LOG_ARCHIVE_DIR', BASE_DIR / 'archive' / 'activity_logs'))
+
+# Outbound email queue (core/mail_queue.py): worker threads per process and
+# delivery attempts before a message is marked as failed
+EMAIL_QUEUE_ENABLED = os.getenv('EMAIL_QUEUE_ENABLED', 'True') == 'True'
+EMAIL_QUEUE_WORKERS = int(os.getenv('EMAIL_QUEUE_WORKERS', '2'))
+EMAIL_QUEUE_MAX_ATTEMPTS = int(os.getenv('EMAIL_QUEUE_MAX_ATTEMPTS', '5'))
+
+# Caches: 'default' for per-process lookups; 'otp' holds one-time codes and
+# must be shared by every worker process. Guess counters are kept in the
+# database (core/attempts.py), so any shared backend will do.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'otp': {
+        'BACKEND': os.getenv('OTP_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('OTP_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'otp')),
+    },
+}
+
+# HTTP Basic API logins (core/throttle.py): failed attempts allowed per
+# account and per client IP before further attempts are refused for the
+# lockout period. Counters are kept in the database (core/attempts.py).
+API_AUTH_MAX_ACCOUNT_FAILURES = int(os.getenv('API_AUTH_MAX_ACCOUNT_FAILURES', '10'))
+API_AUTH_MAX_IP_FAILURES = int(os.getenv('API_AUTH_MAX_IP_FAILURES', '50'))
+API_AUTH_LOCKOUT_SECONDS = int(os.getenv('API_AUTH_LOCKOUT_SECONDS', '900'))
+
+# One-time passwords (core/otp.py)
+OTP_CACHE_ALIAS = 'otp'
+OTP_MAX_ATTEMPTS = int(os.getenv('OTP_MAX_ATTEMPTS', '5'))
+OTP_AUDIT_ENABLED = os.getenv('OTP_AUDIT_ENABLED', 'False') == 'True'
+
+# Sign-in by email first; username logins (Django admin) fall through to ModelBackend
+AUTHENTICATION_BACKENDS = [
+    'core.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Username availability (core/usernames.py): taken names cached per process
+USERNAME_CACHE_SIZE = int(os.getenv('USERNAME_CACHE_SIZE', '10000'))
+USERNAME_CACHE_MAX_AGE = int(os.getenv('USERNAME_CACHE_MAX_AGE', '300'))
+
+# How long the user -> hospital/ambulance provider mapping behind
+# request.tenant is reused before being looked up again (core/tenancy.py).
+# The row itself is always fetched by primary key.
+TENANT_CACHE_ALIAS = os.getenv('TENANT_CACHE_ALIAS', 'default')
+TENANT_CACHE_SECONDS = int(os.getenv('TENANT_CACHE_SECONDS', '300'))
+
+# Auto-dispatch (ambulance/dispatch.py): bookings whose pickup is due within
+# this many minutes are assigned an ambulance immediately
+AMBULANCE_DISPATCH_WINDOW_MINUTES = int(os.getenv('AMBULANCE_DISPATCH_WINDOW_MINUTES', '60'))
+
+# Ambulance GPS telemetry (ambulance/telemetry.py): pings kept in memory per
+# vehicle, and how often / how sparsely the track is written to the database.
+# Keep TELEMETRY_RING_SIZE above the pings a vehicle sends per persist interval.
+TELEMETRY_RING_SIZE = int(os.getenv('TELEMETRY_RING_SIZE', '256'))
+TELEMETRY_SAMPLE_SECONDS = int(os.getenv('TELEMETRY_SAMPLE_SECONDS', '30'))
+TELEMETRY_PERSIST_INTERVAL = float(os.getenv('TELEMETRY_PERSIST_INTERVAL', '15'))
+
+# Bed availability history (core/bed_history.py): days raw samples, hourly
+# and daily rollups are kept (0 keeps them forever). Run
+# "manage.py roll_up_bed_history" hourly.
+BED_HISTORY_RAW_DAYS = int(os.getenv('BED_HISTORY_RAW_DAYS', '30'))
+BED_HISTORY_HOURLY_DAYS = int(os.getenv('BED_HISTORY_HOURLY_DAYS', '90'))
+BED_HISTORY_DAILY_DAYS = int(os.getenv('BED_HISTORY_DAILY_DAYS', str(5 * 365)))
@@ -0,0 +1,141 @@
+"""
+Activity logging service
+Requests hand ActivityLog entries to an in-memory queue and return; a
+background thread writes them in batches with bulk_create, so audit logging
+never holds the database write lock on a user's request.
+
+Entries are flushed when BATCH_SIZE of them are waiting, after
+FLUSH_INTERVAL seconds, and when the process exits. Set
+ACTIVITY_LOG_ASYNC = False to write each entry immediately (e.g. in
+management commands or tests that read the log straight back).
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections
+from django.utils import timezone
+
+from core.models import ActivityLog
+
+
+logger = logging.getLogger(__name__)
+
+# Entries buffered before the queue is dropped rather than growing without bound
+MAX_PENDING_ENTRIES = 10000
+
+
+class ActivityLogWriter:
+    """Buffers ActivityLog rows and writes them from a background thread"""
+
+    def __init__(self, batch_size=None, flush_interval=None):
+        self.batch_size = batch_size or getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 100)
+        self.flush_interval = flush_interval or getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 2.0)
+        self._pending = []
+        self._condition = threading.Condition()
+        # Serializes writes between the worker and explicit flush() calls
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # A forked worker process inherits the object but not the thread
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, entry):
+        """Queue an unsaved ActivityLog for writing"""
+        with self._condition:
+            if len(self._pending) >= MAX_PENDING_ENTRIES:
+                logger.warning('Activity log queue full; dropping %s entry', entry.action)
+                return
+            self._pending.append(entry)
+            self._ensure_worker()
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def _take_batch(self):
+        with self._condition:
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written"""
+        with self._write_lock:
+            batch = self._take_batch()
+            if not batch:
+                return 0
+            close_old_connections()
+            try:
+                ActivityLog.objects.bulk_create(batch)
+                return len(batch)
+            except DatabaseError:
+                # e.g. a user deleted before the flush: save rows one by one
+                # so a single bad entry doesn't lose the whole batch
+                return self._write_individually(batch)
+            finally:
+                close_old_connections()
+
+    def _write_individually(self, batch):
+        written = 0
+        for entry in batch:
+            try:
+                entry.save(force_insert=True)
+                written += 1
+            except IntegrityError:
+                entry.user_id = None
+                try:
+                    entry.save(force_insert=True)
+                    written += 1
+                except DatabaseError:
+                    logger.exception('Could not write activity log entry %s', entry.action)
+            except DatabaseError:
+                logger.exception('Could not write activity log entry %s', entry.action)
+        return written
+
+
+activity_log_writer = ActivityLogWriter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        activity_log_writer.flush()
+    except Exception:
+        logger.exception('Flushing activity log on shutdown failed')
+
+
+def log_activity(user, user_role, action, details=''):
+    """
+    Record a user action in the activity log
+
+    Args:
+        user: User instance, user id, or None
+        user_role: Role the action was taken as
+        action: Short action name, e.g. 'login'
+        details: Human-readable description
+    """
+    user_id = getattr(user, 'pk', user)
+    entry = ActivityLog(
+        user_id=user_id,
+        user_role=user_role,
+        action=action,
+        details=details,
+        timestamp=timezone.now(),
+    )
+    if getattr(settings, 'ACTIVITY_LOG_ASYNC', True):
+        activity_log_writer.enqueue(entry)
+    else:
+        activity_log_writer._write_individually([entry])
@@ -3,7 +3,14 @@ Django Admin configuration for Core app models
 """
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Hospital, AmbulanceProvider, Ambulance, ActivityLog, OTP
+from django.core.paginator import Paginator
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .models import User, Hospital, City, AmbulanceProvider, Ambulance, ActivityLog, OTP, OutboundEmail
+from .archive import archived_months, parse_month, read_archived_logs
+from .mail_queue import mail_queue
+from .tenancy import forget_tenant
 
 
 @admin.register(User)
@@ -35,8 +42,18 @@ class UserAdmin(BaseUserAdmin):
     readonly_fields = ('created_at', 'date_joined', 'last_login')
 
 
+class TenantOwnerAdminMixin:
+    """Drops cached request.tenant mappings when an owner is reassigned"""
+    
+    def save_model(self, request, obj, form, change):
+        if change and 'owner' in form.changed_data:
+            forget_tenant(form.initial.get('owner'))
+        super().save_model(request, obj, form, change)
+        forget_tenant(obj.owner_id)
+
+
 @admin.register(Hospital)
-class HospitalAdmin(admin.ModelAdmin):
+class HospitalAdmin(TenantOwnerAdminMixin, admin.ModelAdmin):
     """Hospital Admin"""
     list_display = (
         'name', 'city', 'type',
@@ -77,7 +94,7 @@ class HospitalAdmin(admin.ModelAdmin):
 
 
 @admin.register(AmbulanceProvider)
-class AmbulanceProviderAdmin(admin.ModelAdmin):
+class AmbulanceProviderAdmin(TenantOwnerAdminMixin, admin.ModelAdmin):
     """Ambulance Provider Admin"""
     list_display = ('name', 'city', 'phone', 'ambulance_count', 'owner', 'updated_at')
     list_filter = ('city',)
@@ -89,7 +106,7 @@ class AmbulanceProviderAdmin(admin.ModelAdmin):
             'fields': ('name', 'address', 'city', 'email', 'phone')
         }),
         ('Service Details', {
-            'fields': ('service_area', 'pricing_info')
+            'fields': ('service_area', 'pricing_info', 'auto_dispatch')
         }),
         ('Management', {
             'fields': ('owner',)
@@ -112,13 +129,26 @@ class AmbulanceInline(admin.TabularInline):
     """Inline Ambulance for Provider Admin"""
     model = Ambulance
     extra = 1
-    fields = ('vehicle_number', 'type', 'driver_name', 'driver_phone', 'status')
+    fields = ('vehicle_number', 'type', 'driver_name', 'driver_phone', 'is_available', 'status')
 
 
 # Add inline to AmbulanceProviderAdmin
 AmbulanceProviderAdmin.inlines = [AmbulanceInline]
 
 
+@admin.register(City)
+class CityAdmin(admin.ModelAdmin):
+    """City Admin (filled in from provider service areas)"""
+    list_display = ('name', 'key', 'provider_count')
+    search_fields = ('name', 'key')
+    ordering = ('name',)
+    
+    def provider_count(self, obj):
+        """Display number of providers serving the city"""
+        return obj.providers.count()
+    provider_count.short_description = 'Providers'
+
+
 @admin.register(Ambulance)
 class AmbulanceAdmin(admin.ModelAdmin):
     """Ambulance Admin"""
@@ -129,7 +159,13 @@ class AmbulanceAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Vehicle Information', {
-            'fields': ('vehicle_number', 'type', 'status')
+            'fields': ('vehicle_number', 'type')
+        }),
+        ('Availability', {
+            'fields': ('is_available', 'status', 'current_booking'),
+            'description': 'Status and current booking follow the bookings, except that '
+                           'an ambulance can be put under maintenance; run '
+                           '"manage.py reconcile_ambulances" if they look wrong.',
         }),
         ('Driver Information', {
             'fields': ('driver_name', 'driver_phone')
@@ -143,7 +179,7 @@ class AmbulanceAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('current_booking', 'created_at', 'updated_at')
 
 
 @admin.register(OTP)
@@ -169,9 +205,38 @@ class OTPAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    """Outbound Email Admin (delivery queue and dead letters)"""
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at')
+    list_filter = ('status',)
+    search_fields = ('to_email', 'subject')
+    ordering = ('-created_at',)
+    # Bodies carry OTPs and password reset links
+    exclude = ('body',)
+    readonly_fields = (
+        'to_email', 'subject', 'status', 'attempts',
+        'next_attempt_at', 'last_error', 'created_at', 'updated_at', 'sent_at'
+    )
+    actions = ['requeue']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Requeue selected emails')
+    def requeue(self, request, queryset):
+        # Sent and dead emails have had their body cleared
+        count = queryset.exclude(status='sent').exclude(body='').update(
+            status='queued', attempts=0, next_attempt_at=timezone.now()
+        )
+        mail_queue.notify()
+        self.message_user(request, f'{count} email(s) requeued.')
+
+
 @admin.register(ActivityLog)
 class ActivityLogAdmin(admin.ModelAdmin):
     """Activity Log Admin (Read-only)"""
+    change_list_template = 'admin/core/activitylog/change_list.html'
     list_display = ('user', 'user_role', 'action', 'timestamp')
     list_filter = ('user_role', 'action', 'timestamp')
     search_fields = ('user__username', 'action', 'details')
@@ -193,4 +258,34 @@ class ActivityLogAdmin(admin.ModelAdmin):
         return False
 
     def has_delete_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+    def get_urls(self):
+        urls = [
+            path(
+                'archive/',
+                self.admin_site.admin_view(self.archive_view),
+                name='core_activitylog_archive',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def archive_view(self, request):
+        """Browse a month of archived logs (see core/archive.py)"""
+        months = archived_months()
+        selected_month = request.GET.get('month') or (months[0] if months else '')
+        query = request.GET.get('q', '').strip()
+        month = parse_month(selected_month)
+        entries = read_archived_logs(*month, query=query) if month else []
+
+        paginator = Paginator(entries, 100)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Archived activity logs',
+            'archived_months': months,
+            'selected_month': selected_month,
+            'query': query,
+            'page': paginator.get_page(request.GET.get('page')),
+        }
+        return TemplateResponse(request, 'admin/core/activitylog/archive.html', context)
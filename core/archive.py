@@ -0,0 +1,131 @@
+"""
+Activity log retention
+Rows older than the retention window are moved out of `activity_logs` into
+one gzip-compressed JSON Lines file per month under ACTIVITY_LOG_ARCHIVE_DIR,
+then deleted in bounded batches. Archived months are read back on demand by
+the admin and the activity log pages.
+
+Each batch is appended to its month file before the rows are deleted, so an
+interrupted run can leave a few rows in both places; readers drop the
+duplicates by id.
+"""
+import gzip
+import json
+import os
+import re
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.models import ActivityLog
+
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'user_role', 'action', 'details', 'timestamp')
+
+_ARCHIVE_NAME_RE = re.compile(r'^activity_logs-(\d{4})-(\d{2})\.jsonl\.gz$')
+
+
+def archive_dir():
+    return Path(getattr(settings, 'ACTIVITY_LOG_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'archive' / 'activity_logs'))
+
+
+def archive_path(year, month):
+    return archive_dir() / f'activity_logs-{year:04d}-{month:02d}.jsonl.gz'
+
+
+def retention_cutoff(days=None):
+    """Timestamp before which log rows are archived"""
+    if days is None:
+        days = getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_activity_logs(before, batch_size=1000):
+    """
+    Move every log row older than `before` into the monthly archive files
+
+    Returns the number of rows archived. Each batch is written and deleted
+    in its own transaction, so the table is never locked for long.
+    """
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                ActivityLog.objects.filter(timestamp__lt=before)
+                .order_by('id').values(*ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+
+            by_month = {}
+            for row in rows:
+                # Group by month in the site's time zone, as the pages show it
+                local = timezone.localtime(row['timestamp'])
+                by_month.setdefault((local.year, local.month), []).append(row)
+
+            for (year, month), month_rows in by_month.items():
+                # Appending adds a gzip member; gzip.open reads them as one stream
+                with gzip.open(archive_path(year, month), 'at', encoding='utf-8') as archive:
+                    for row in month_rows:
+                        archive.write(json.dumps({**row, 'timestamp': row['timestamp'].isoformat()}) + '\n')
+                    archive.flush()
+                    os.fsync(archive.fileno())
+
+            ActivityLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
+
+    return archived
+
+
+def archived_months():
+    """['2024-05', ...] for every month with an archive file, newest first"""
+    directory = archive_dir()
+    if not directory.is_dir():
+        return []
+    months = []
+    for path in directory.iterdir():
+        match = _ARCHIVE_NAME_RE.match(path.name)
+        if match:
+            months.append(f'{match.group(1)}-{match.group(2)}')
+    return sorted(months, reverse=True)
+
+
+def parse_month(value):
+    """'2024-05' -> (2024, 5), or None"""
+    match = re.fullmatch(r'(\d{4})-(\d{2})', value or '')
+    if not match:
+        return None
+    year, month = int(match.group(1)), int(match.group(2))
+    return (year, month) if 1 <= month <= 12 else None
+
+
+def read_archived_logs(year, month, user_id=None, query=None):
+    """
+    Log entries archived for a month, newest first, as dicts
+
+    Optionally only those of one user, or whose action/details contain
+    `query` (case-insensitive).
+    """
+    path = archive_path(year, month)
+    if not path.exists():
+        return []
+
+    query = query.lower() if query else None
+    entries = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            entry = json.loads(line)
+            if user_id is not None and entry['user_id'] != user_id:
+                continue
+            if query and query not in entry['action'].lower() and query not in entry['details'].lower():
+                continue
+            entry['timestamp'] = parse_datetime(entry['timestamp'])
+            entries[entry['id']] = entry
+    return sorted(entries.values(), key=lambda e: e['timestamp'], reverse=True)
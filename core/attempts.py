@@ -0,0 +1,60 @@
+"""
+Attempt counters shared by every worker process
+Each counter is an AttemptCounter row with a window after which it starts
+again from zero. An attempt is claimed with a conditional
+UPDATE ... SET count = count + 1 WHERE count < limit, so however many
+requests race, at most `limit` of them are let through per window. This
+holds on every database backend, unlike cache.incr() on the file-based
+cache. Used for OTP guesses (core/otp.py) and API logins (core/throttle.py).
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import AttemptCounter
+
+
+def claim_attempt(key, limit, window_seconds):
+    """
+    Count an attempt against `key`; returns its number within the window
+    (1 for the first), or None when `limit` attempts were already made
+    """
+    counters = AttemptCounter.objects.filter(key=key)
+    for _ in range(2):
+        now = timezone.now()
+        with transaction.atomic():
+            if counters.filter(expires_at__gt=now, count__lt=limit).update(count=F('count') + 1):
+                # Read back inside the transaction, while the row is still locked
+                return counters.values_list('count', flat=True).get()
+            # An expired counter: this attempt opens a new window
+            expires_at = now + timedelta(seconds=window_seconds)
+            if counters.filter(expires_at__lte=now).update(count=1, expires_at=expires_at):
+                return 1
+        if counters.exists():
+            return None
+        try:
+            with transaction.atomic():
+                AttemptCounter.objects.create(key=key, count=1, expires_at=expires_at)
+            return 1
+        except IntegrityError:
+            # Created by a concurrent attempt; count against that one
+            continue
+    return None
+
+
+def release_attempt(key):
+    """Give back an attempt claimed with claim_attempt() (e.g. one that succeeded)"""
+    AttemptCounter.objects.filter(key=key, count__gt=0).update(count=F('count') - 1)
+
+
+def reset_attempts(*keys):
+    """Start the given counters again from zero"""
+    AttemptCounter.objects.filter(key__in=keys).delete()
+
+
+def prune_attempt_counters():
+    """Delete counters whose window has passed; returns how many"""
+    deleted, _ = AttemptCounter.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
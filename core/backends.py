@@ -0,0 +1,28 @@
+"""
+Authentication backends
+Users sign in with their email address. EmailBackend resolves the account in
+a single indexed query (see EmailUserManager.with_email) and checks the
+password, instead of looking the user up by email and then again by username.
+"""
+from django.contrib.auth.backends import ModelBackend
+
+from core.models import User
+
+
+class EmailBackend(ModelBackend):
+    """Authenticates with authenticate(request, email=..., password=...)"""
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            # Username logins (e.g. the admin site) are left to ModelBackend
+            return None
+
+        user = User.objects.get_by_email(email)
+        if user is None:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            User().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,351 @@
+"""
+Bed availability history
+Bed updates append a RAW BedHistory sample each (one small INSERT next to
+the hospital UPDATE). roll_up() then rolls closed hours and days up into
+HOURLY and DAILY rows holding a hospital's counts at the end of the
+period, written only when they differ from its previous row at that
+resolution, so storage grows with the number of changes rather than
+hospitals x periods. How far each resolution has been rolled up is kept in
+BedHistoryRollup.
+
+prune() deletes raw samples after BED_HISTORY_RAW_DAYS, hourly rows after
+BED_HISTORY_HOURLY_DAYS and daily rows after BED_HISTORY_DAILY_DAYS, never
+before they have been rolled up, and keeps each hospital's latest row
+before the cutoff as its state at the start of the retained history.
+Periods are UTC hours and days.
+
+bed_series() reads a hospital's or a city's rows with range scans of the
+(hospital|city_key, resolution, recorded_at) indexes, starting from each
+hospital's last row before the series, and carries the counts forward so
+hourly and daily series have a point for every rolled-up period.
+"""
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min, OuterRef, Subquery
+from django.utils import timezone
+
+from core.models import BedHistory, BedHistoryRollup, City, Hospital
+
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# Largest value a count column holds
+MAX_COUNT = 32767
+
+# Rollup resolution -> (its period, the resolution it is rolled up from,
+# span of source rows rolled up per transaction)
+ROLLUPS = {
+    BedHistory.HOURLY: (HOUR, BedHistory.RAW, timedelta(hours=24)),
+    BedHistory.DAILY: (DAY, BedHistory.HOURLY, timedelta(days=31)),
+}
+
+# Longest span served at each resolution, finest first
+SERIES_RESOLUTIONS = (
+    (BedHistory.RAW, timedelta(days=2)),
+    (BedHistory.HOURLY, timedelta(days=31)),
+    (BedHistory.DAILY, None),
+)
+RESOLUTION_NAMES = {'raw': BedHistory.RAW, 'hour': BedHistory.HOURLY, 'day': BedHistory.DAILY}
+RESOLUTION_LABELS = {resolution: name for name, resolution in RESOLUTION_NAMES.items()}
+PERIODS = {BedHistory.HOURLY: HOUR, BedHistory.DAILY: DAY}
+
+# Hospitals whose previous row is looked up per query
+STATE_BATCH_SIZE = 500
+
+
+def _counts(source):
+    return {field: max(0, min(MAX_COUNT, getattr(source, field) or 0)) for field in BedHistory.COUNT_FIELDS}
+
+
+def record_bed_history(hospitals, at=None):
+    """Append a raw sample of each hospital's current bed counts"""
+    at = at or timezone.now()
+    rows = [
+        BedHistory(
+            hospital_id=hospital.id,
+            city_key=City.normalize_key(hospital.city),
+            recorded_at=at,
+            **_counts(hospital),
+        )
+        for hospital in hospitals
+    ]
+    BedHistory.objects.bulk_create(rows)
+    return len(rows)
+
+
+def _floor(moment, period):
+    moment = moment.astimezone(dt_timezone.utc)
+    if period == DAY:
+        return datetime.combine(moment.date(), dt_time.min, tzinfo=dt_timezone.utc)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil(moment, period):
+    floor = _floor(moment, period)
+    return floor if floor == moment else floor + period
+
+
+def rolled_up_to(resolution):
+    """End of the last period rolled up at `resolution`, or None"""
+    return BedHistoryRollup.objects.filter(resolution=resolution).values_list('rolled_up_to', flat=True).first()
+
+
+def _state(row):
+    return (row.city_key, _counts(row))
+
+
+def _last_row_ids(resolution, moment, hospitals):
+    """Subquery of the id of each hospital's last row at `resolution` before `moment`"""
+    latest = BedHistory.objects.filter(
+        hospital=OuterRef('pk'), resolution=resolution, recorded_at__lt=moment,
+    ).order_by('-recorded_at', '-id').values('id')[:1]
+    return hospitals.annotate(last_row=Subquery(latest)).filter(last_row__isnull=False).values('last_row')
+
+
+def _latest_before(resolution, moment, hospital_ids):
+    """
+    {hospital_id: row} of each hospital's last row at `resolution` before
+    `moment`, for the hospitals in `hospital_ids` (a list or a subquery)
+    """
+    row_ids = _last_row_ids(resolution, moment, Hospital.objects.filter(pk__in=hospital_ids))
+    return {row.hospital_id: row for row in BedHistory.objects.filter(id__in=row_ids)}
+
+
+def _previous_states(resolution, moment, hospital_ids):
+    """{hospital_id: state} of the given hospitals' last rollup rows before `moment`"""
+    hospital_ids = sorted(hospital_ids)
+    states = {}
+    for offset in range(0, len(hospital_ids), STATE_BATCH_SIZE):
+        batch = hospital_ids[offset:offset + STATE_BATCH_SIZE]
+        states.update(
+            (hospital_id, _state(row)) for hospital_id, row in _latest_before(resolution, moment, batch).items()
+        )
+    return states
+
+
+def _roll_up(resolution, now):
+    """
+    Write `resolution` rows for every closed period not rolled up yet;
+    returns rows written
+
+    A period's row holds a hospital's last source row in it, and is only
+    written when that differs from the hospital's previous rollup row.
+    """
+    period, source, chunk = ROLLUPS[resolution]
+    end = _floor(now, period)
+    if source != BedHistory.RAW:
+        # A period is complete once every source period in it is rolled up
+        source_end = rolled_up_to(source)
+        if source_end is None:
+            return 0
+        end = min(end, _floor(source_end, period))
+
+    start = rolled_up_to(resolution)
+    if start is None:
+        first = BedHistory.objects.filter(resolution=source).aggregate(first=Min('recorded_at'))['first']
+        if first is None:
+            return 0
+        start = _floor(first, period)
+
+    written = 0
+    while start < end:
+        chunk_end = min(start + chunk, end)
+        sources = BedHistory.objects.filter(resolution=source, recorded_at__gte=start, recorded_at__lt=chunk_end)
+        states = _previous_states(resolution, start, set(sources.values_list('hospital_id', flat=True)))
+
+        rows = []
+        period_start, ends = start, {}
+        for row in sources.order_by('recorded_at', 'id').iterator():
+            row_period = _floor(row.recorded_at, period)
+            if row_period != period_start:
+                rows += _changed_rows(ends, states, resolution, period_start)
+                period_start, ends = row_period, {}
+            # The last row of the period wins
+            ends[row.hospital_id] = _state(row)
+        rows += _changed_rows(ends, states, resolution, period_start)
+
+        with transaction.atomic():
+            BedHistory.objects.bulk_create(rows, batch_size=500)
+            BedHistoryRollup.objects.update_or_create(resolution=resolution, defaults={'rolled_up_to': chunk_end})
+        written += len(rows)
+        start = chunk_end
+    return written
+
+
+def _changed_rows(ends, states, resolution, period_start):
+    """Rollup rows for the hospitals whose state at the end of the period changed"""
+    rows = []
+    for hospital_id, state in ends.items():
+        if states.get(hospital_id) == state:
+            continue
+        states[hospital_id] = state
+        city_key, counts = state
+        rows.append(BedHistory(
+            hospital_id=hospital_id, city_key=city_key, resolution=resolution,
+            recorded_at=period_start, **counts,
+        ))
+    return rows
+
+
+def roll_up_hours(now=None):
+    """Write HOURLY rows for every closed hour not rolled up yet; returns rows written"""
+    return _roll_up(BedHistory.HOURLY, now or timezone.now())
+
+
+def roll_up_days(now=None):
+    """
+    Write DAILY rows for every closed day whose hours are rolled up;
+    returns rows written
+    """
+    return _roll_up(BedHistory.DAILY, now or timezone.now())
+
+
+def roll_up(now=None):
+    """Roll up closed hours, then closed days; returns (hourly, daily) rows written"""
+    return roll_up_hours(now), roll_up_days(now)
+
+
+def _retention(setting, default_days):
+    days = getattr(settings, setting, default_days)
+    return timedelta(days=days) if days else None
+
+
+def prune(now=None):
+    """
+    Delete rows past their retention window that are already rolled up
+
+    Each hospital's last row before the cutoff is kept, since later
+    periods carry its counts forward. Returns {'raw': n, 'hourly': n,
+    'daily': n} of rows deleted.
+    """
+    now = now or timezone.now()
+    deleted = {}
+    coarser_watermarks = {
+        BedHistory.RAW: rolled_up_to(BedHistory.HOURLY),
+        BedHistory.HOURLY: rolled_up_to(BedHistory.DAILY),
+    }
+    policies = (
+        ('raw', BedHistory.RAW, _retention('BED_HISTORY_RAW_DAYS', 30)),
+        ('hourly', BedHistory.HOURLY, _retention('BED_HISTORY_HOURLY_DAYS', 90)),
+        ('daily', BedHistory.DAILY, _retention('BED_HISTORY_DAILY_DAYS', 5 * 365)),
+    )
+    for name, resolution, keep in policies:
+        deleted[name] = 0
+        if keep is None:
+            continue
+        cutoff = now - keep
+        if resolution in coarser_watermarks:
+            watermark = coarser_watermarks[resolution]
+            if watermark is None:
+                continue
+            cutoff = min(cutoff, watermark)
+        deleted[name], _ = BedHistory.objects.filter(
+            resolution=resolution, recorded_at__lt=cutoff,
+        ).exclude(id__in=_last_row_ids(resolution, cutoff, Hospital.objects.all())).delete()
+    return deleted
+
+
+def series_resolution(start, end, name=None):
+    """
+    BedHistory resolution for a series: the named one ('raw', 'hour',
+    'day') or else the finest that serves the span
+
+    Raises ValueError for unknown names and spans too long for the named
+    resolution.
+    """
+    for resolution, longest in SERIES_RESOLUTIONS:
+        if name and RESOLUTION_NAMES.get(name) != resolution:
+            continue
+        if longest is None or end - start <= longest:
+            return resolution
+    raise ValueError(f'Resolution {name!r} does not serve a span of {end - start}')
+
+
+def bed_series(start, end, hospital_id=None, city=None, resolution=None):
+    """
+    Bed counts of a hospital or a whole city between `start` and `end`
+
+    Returns {'t': [timestamps], 'beds_total': [...], ...}, one list per
+    BedHistory.COUNT_FIELDS, aligned with 't'. Hourly and daily series
+    have a point for every period up to the last one rolled up, starting
+    with the first one whose counts are known. Hospital series at RAW
+    resolution have a point at `start` and then where the counts changed;
+    city series are always at least hourly, since raw samples of different
+    hospitals aren't aligned.
+    """
+    if resolution is None:
+        resolution = series_resolution(start, end)
+    if hospital_id is None:
+        resolution = max(resolution, BedHistory.HOURLY)
+
+    series = {'t': [], **{field: [] for field in BedHistory.COUNT_FIELDS}}
+
+    def add_point(moment, counts):
+        series['t'].append(moment.isoformat())
+        for field in BedHistory.COUNT_FIELDS:
+            series[field].append(counts[field])
+
+    if resolution == BedHistory.RAW:
+        seed = _latest_before(resolution, start, [hospital_id]).get(hospital_id)
+        if seed is not None:
+            add_point(start, _counts(seed))
+        rows = BedHistory.objects.filter(
+            hospital_id=hospital_id, resolution=resolution, recorded_at__gte=start, recorded_at__lt=end,
+        )
+        for row in rows.order_by('recorded_at', 'id'):
+            add_point(row.recorded_at, _counts(row))
+        return series
+
+    period = PERIODS[resolution]
+    first = _ceil(start, period)
+    end = min(end, rolled_up_to(resolution) or first)
+    if hospital_id is not None:
+        hospital_ids = [hospital_id]
+        city_key = None
+    else:
+        # Every hospital with a row in the city before the end; its rows
+        # elsewhere are read too so a move out of the city is seen
+        city_key = City.normalize_key(city)
+        hospital_ids = BedHistory.objects.filter(
+            city_key=city_key, resolution=resolution, recorded_at__lt=end,
+        ).values('hospital_id')
+
+    # Running totals over the hospitals counted (in the city, for city series)
+    states = {}
+    totals = dict.fromkeys(BedHistory.COUNT_FIELDS, 0)
+    counted = 0
+
+    def count(state, sign):
+        nonlocal counted
+        key, counts = state
+        if city_key is not None and key != city_key:
+            return
+        counted += sign
+        for field in BedHistory.COUNT_FIELDS:
+            totals[field] += sign * counts[field]
+
+    def set_state(row):
+        if row.hospital_id in states:
+            count(states[row.hospital_id], -1)
+        states[row.hospital_id] = _state(row)
+        count(states[row.hospital_id], 1)
+
+    for seed in _latest_before(resolution, first, hospital_ids).values():
+        set_state(seed)
+    rows = BedHistory.objects.filter(
+        hospital_id__in=hospital_ids, resolution=resolution, recorded_at__gte=first, recorded_at__lt=end,
+    ).order_by('recorded_at', 'id').iterator()
+
+    row = next(rows, None)
+    moment = first
+    while moment < end:
+        while row is not None and row.recorded_at <= moment:
+            set_state(row)
+            row = next(rows, None)
+        if counted:
+            add_point(moment, totals)
+        moment += period
+    return series
@@ -0,0 +1,190 @@
+"""
+Outbound email queue
+Views store the message as an OutboundEmail row and return; worker threads
+deliver queued rows over SMTP. Each worker keeps its own SMTP connection
+open between messages instead of doing a TCP/TLS handshake per email.
+
+Failed sends are retried with exponential backoff. After
+EMAIL_QUEUE_MAX_ATTEMPTS the row is marked 'dead' and left for an admin to
+inspect. Bodies carry OTPs and password reset links, so they are cleared
+once a row is sent or dead; only the recipient, subject and last error
+stay. Rows survive restarts; they are picked up by the next
+worker to start, or by `python manage.py process_email_queue`.
+"""
+import logging
+import os
+import smtplib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import OutboundEmail
+
+
+logger = logging.getLogger(__name__)
+
+# Base delay before the first retry; doubled on every further attempt
+RETRY_BASE_SECONDS = 30
+
+# A 'sending' row untouched for this long belongs to a worker that died
+STALE_SENDING_SECONDS = 10 * 60
+
+# Close a worker's SMTP connection after this long without mail
+IDLE_CONNECTION_SECONDS = 60
+
+# How often idle workers look for retries that have come due
+POLL_SECONDS = 5
+
+
+def enqueue_email(to_email, subject, body):
+    """Queue a plain-text email and wake a worker; returns the OutboundEmail"""
+    message = OutboundEmail.objects.create(to_email=to_email, subject=subject, body=body)
+    mail_queue.notify()
+    return message
+
+
+def _claim_next():
+    """Atomically take the oldest due message, or return None"""
+    now = timezone.now()
+    due = OutboundEmail.objects.filter(
+        Q(status='queued', next_attempt_at__lte=now)
+        | Q(status='sending', updated_at__lt=now - timedelta(seconds=STALE_SENDING_SECONDS))
+    ).order_by('next_attempt_at', 'id')
+    for message in due[:10]:
+        # Only one worker (in any process) wins the conditional update
+        claimed = OutboundEmail.objects.filter(
+            pk=message.pk, status=message.status, updated_at=message.updated_at
+        ).update(status='sending', updated_at=now)
+        if claimed:
+            message.status = 'sending'
+            return message
+    return None
+
+
+def _record_failure(message, error):
+    max_attempts = getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5)
+    message.attempts += 1
+    message.last_error = str(error)[:1000]
+    if message.attempts >= max_attempts:
+        message.status = 'dead'
+        message.body = ''
+        logger.error('Giving up on email #%s to %s: %s', message.pk, message.to_email, error)
+    else:
+        message.status = 'queued'
+        message.next_attempt_at = timezone.now() + timedelta(
+            seconds=RETRY_BASE_SECONDS * 2 ** (message.attempts - 1)
+        )
+    message.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'body', 'updated_at'])
+
+
+class MailWorker:
+    """Delivers queued messages over one reusable SMTP connection"""
+
+    def __init__(self):
+        self.connection = None
+        self.last_used = 0
+
+    def _open(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        self.last_used = time.monotonic()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def close_if_idle(self):
+        if self.connection is not None and time.monotonic() - self.last_used > IDLE_CONNECTION_SECONDS:
+            self.close()
+
+    def _send(self, message):
+        email = EmailMessage(
+            subject=message.subject,
+            body=message.body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[message.to_email],
+            connection=self._open(),
+        )
+        try:
+            email.send()
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped our idle connection; reconnect once
+            self.close()
+            email.connection = self._open()
+            email.send()
+
+    def process_one(self):
+        """Deliver the next due message; returns False when nothing is due"""
+        message = _claim_next()
+        if message is None:
+            return False
+        try:
+            self._send(message)
+        except Exception as e:
+            self.close()
+            _record_failure(message, e)
+        else:
+            message.status = 'sent'
+            message.sent_at = timezone.now()
+            message.attempts += 1
+            message.body = ''
+            message.last_error = ''
+            message.save(update_fields=['status', 'sent_at', 'attempts', 'body', 'last_error', 'updated_at'])
+        return True
+
+
+class MailQueue:
+    """Pool of background MailWorker threads, started on first use"""
+
+    def __init__(self, workers=None):
+        self.worker_count = workers or getattr(settings, 'EMAIL_QUEUE_WORKERS', 2)
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._pid = None
+
+    def _ensure_workers(self):
+        # A forked process inherits the list but not the threads
+        if self._pid == os.getpid() and all(t.is_alive() for t in self._threads):
+            return
+        self._pid = os.getpid()
+        self._threads = [
+            threading.Thread(target=self._run, name=f'mail-worker-{i}', daemon=True)
+            for i in range(self.worker_count)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def notify(self):
+        with self._wakeup:
+            self._ensure_workers()
+            self._wakeup.notify()
+
+    def _run(self):
+        worker = MailWorker()
+        while True:
+            close_old_connections()
+            try:
+                busy = worker.process_one()
+            except Exception:
+                logger.exception('Mail worker error')
+                busy = False
+            if not busy:
+                worker.close_if_idle()
+                close_old_connections()
+                with self._wakeup:
+                    self._wakeup.wait(POLL_SECONDS)
+
+
+mail_queue = MailQueue()
@@ -0,0 +1,36 @@
+"""
+Django management command to archive old activity logs
+Usage: python manage.py archive_activity_logs [--days 90] [--batch-size 1000]
+
+Moves rows older than the retention window into monthly gzip-compressed
+JSONL files (see core/archive.py) and deletes them from the table.
+Schedule it daily, e.g. with cron:
+    15 3 * * * cd /path/to/careconnect && python manage.py archive_activity_logs
+"""
+from django.core.management.base import BaseCommand
+from core.activity import activity_log_writer
+from core.archive import archive_activity_logs, archive_dir, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Archives activity logs older than the retention window to compressed monthly files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Keep this many days in the table (default: ACTIVITY_LOG_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows written and deleted per transaction',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options['days'])
+        self.stdout.write(f"Archiving activity logs older than {cutoff:%Y-%m-%d %H:%M}...")
+
+        archived = archive_activity_logs(cutoff, batch_size=max(1, options['batch_size']))
+        # Entries this process queued while running
+        activity_log_writer.flush()
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Archived {archived} log entries to {archive_dir()}'))
@@ -199,10 +199,12 @@ class Command(BaseCommand):
         # Create Ambulances
         self.stdout.write("\n5. Creating Ambulances...")
         
+        # Busy comes from bookings, so sample ambulances are available,
+        # offline (out of service) or under maintenance
         ambulances_data = [
             ('MH12AB1234', 'basic', 'Rajesh Kumar', '+919876000001', 'available', providers[0]),
             ('MH12AB1235', 'advanced', 'Suresh Patil', '+919876000002', 'available', providers[0]),
-            ('MH12AB1236', 'icu', 'Amit Sharma', '+919876000003', 'busy', providers[0]),
+            ('MH12AB1236', 'icu', 'Amit Sharma', '+919876000003', 'offline', providers[0]),
             ('MH12CD5678', 'basic', 'Prakash Desai', '+919876000004', 'available', providers[1]),
             ('MH12CD5679', 'advanced', 'Vijay Jadhav', '+919876000005', 'available', providers[1]),
             ('MH12CD5680', 'neonatal', 'Santosh More', '+919876000006', 'maintenance', providers[1]),
@@ -215,6 +217,7 @@ class Command(BaseCommand):
                     'type': amb_type,
                     'driver_name': driver_name,
                     'driver_phone': driver_phone,
+                    'is_available': status != 'offline',
                     'status': status,
                     'provider': provider
                 }
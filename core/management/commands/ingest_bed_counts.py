@@ -0,0 +1,56 @@
+"""
+Django management command to import many hospitals' bed counts at once
+Usage: python manage.py ingest_bed_counts <file.json|file.csv|-> [--format csv|json]
+
+Rows use the fields of the update-beds form (id, total_beds, icu_beds,
+oxygen_beds, ventilators, isolation_beds and their *_capacity columns) and
+are applied in one transaction by hospital/ingest.py; omitted counts keep
+their current value. '-' reads the payload from standard input.
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from core.activity import log_activity
+from hospital.ingest import apply_bed_updates, parse_payload, PayloadError, ERROR, UPDATED
+
+
+class Command(BaseCommand):
+    help = "Applies a JSON or CSV file of hospitals' bed counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSON or CSV file, or '-' for standard input")
+        parser.add_argument(
+            '--format', choices=('csv', 'json'), default=None,
+            help='Payload format (default: from the file extension or content)',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            if path == '-':
+                body = sys.stdin.buffer.read()
+            else:
+                with open(path, 'rb') as payload:
+                    body = payload.read()
+        except OSError as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        content_type = options['format'] or ('csv' if path.lower().endswith('.csv') else '')
+        try:
+            rows = parse_payload(body, content_type)
+        except PayloadError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Applying bed counts for {len(rows)} rows...")
+        results = apply_bed_updates(rows)
+
+        updated = sum(1 for result in results if result['status'] == UPDATED)
+        errors = [result for result in results if result['status'] == ERROR]
+        for result in errors:
+            self.stdout.write(self.style.WARNING(f"  row {result['row'] + 1} (hospital {result['id']}): {result['error']}"))
+        if updated:
+            log_activity(None, 'system', 'bulk_update_beds', f'Updated bed availability of {updated} hospitals from {path}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Updated {updated} hospitals, {len(results) - updated - len(errors)} unchanged, {len(errors)} rejected'
+        ))
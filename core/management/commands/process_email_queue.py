@@ -0,0 +1,46 @@
+"""
+Django management command to deliver queued emails
+Usage: python manage.py process_email_queue [--once] [--retry-dead]
+
+Web processes start their own mail workers when they queue a message; run
+this to deliver messages left over from a restart, or as a dedicated
+mail worker process.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.mail_queue import MailWorker, POLL_SECONDS
+from core.models import OutboundEmail
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued outbound emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Deliver everything due and exit')
+        parser.add_argument('--retry-dead', action='store_true', help='Requeue permanently failed emails that still have a body first')
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            # Bodies are cleared on dead-lettering; only older rows still have one
+            requeued = OutboundEmail.objects.filter(status='dead').exclude(body='').update(
+                status='queued', attempts=0, next_attempt_at=timezone.now()
+            )
+            self.stdout.write(f'- Requeued {requeued} failed emails')
+
+        worker = MailWorker()
+        sent = 0
+        try:
+            while True:
+                if worker.process_one():
+                    sent += 1
+                    continue
+                if options['once']:
+                    break
+                worker.close_if_idle()
+                time.sleep(POLL_SECONDS)
+        finally:
+            worker.close()
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Processed {sent} emails'))
@@ -0,0 +1,19 @@
+"""
+Django management command to delete expired attempt counters
+Usage: python manage.py prune_attempt_counters
+
+OTP guess and API login counters (see core/attempts.py) are reused while
+their key keeps being tried; this removes the ones whose window has passed.
+Schedule it daily, e.g. with cron:
+    30 3 * * * cd /path/to/careconnect && python manage.py prune_attempt_counters
+"""
+from django.core.management.base import BaseCommand
+from core.attempts import prune_attempt_counters
+
+
+class Command(BaseCommand):
+    help = 'Deletes OTP guess and API login counters whose window has passed'
+
+    def handle(self, *args, **options):
+        deleted = prune_attempt_counters()
+        self.stdout.write(self.style.SUCCESS(f'✓ Deleted {deleted} expired attempt counters'))
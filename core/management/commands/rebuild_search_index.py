@@ -0,0 +1,25 @@
+"""
+Django management command to rebuild the hospital search index
+Usage: python manage.py rebuild_search_index
+
+Hospital.save() keeps the index current; this repairs rows after bulk
+imports or direct queryset updates that bypass save().
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import Hospital, HospitalSearchIndex
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized hospital search index'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("Rebuilding hospital search index...")
+
+        rows = [HospitalSearchIndex.build_for(hospital) for hospital in Hospital.objects.iterator()]
+
+        with transaction.atomic():
+            HospitalSearchIndex.objects.all().delete()
+            HospitalSearchIndex.objects.bulk_create(rows, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {len(rows)} hospitals'))
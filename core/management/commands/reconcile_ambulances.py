@@ -0,0 +1,40 @@
+"""
+Django management command to repair ambulance availability
+Usage: python manage.py reconcile_ambulances [--provider ID] [--dry-run]
+
+Ambulance.current_booking and Ambulance.status are changed together with
+booking status (see ambulance/assignment.py). This resets them from the
+bookings table wherever they drifted, e.g. after bookings were edited in
+the admin or with direct queryset updates. Safe to run at any time, e.g.
+nightly with cron:
+    30 3 * * * cd /path/to/careconnect && python manage.py reconcile_ambulances
+"""
+from django.core.management.base import BaseCommand
+from ambulance.assignment import reconcile_ambulances
+
+
+class Command(BaseCommand):
+    help = "Resets ambulances' current booking and status from their active bookings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider', type=int, default=None,
+            help='Only reconcile this ambulance provider',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted ambulances without changing them',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling ambulance availability...")
+
+        drifted = reconcile_ambulances(options['provider'], dry_run=options['dry_run'])
+        for ambulance, booking_id, status in drifted:
+            self.stdout.write(
+                f"  {ambulance.vehicle_number}: {ambulance.status} -> {status}, "
+                f"booking #{ambulance.current_booking_id or '-'} -> #{booking_id or '-'}"
+            )
+
+        verb = 'would be repaired' if options['dry_run'] else 'repaired'
+        self.stdout.write(self.style.SUCCESS(f'✓ {len(drifted)} ambulances {verb}'))
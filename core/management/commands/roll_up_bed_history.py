@@ -0,0 +1,36 @@
+"""
+Django management command to roll up and prune bed availability history
+Usage: python manage.py roll_up_bed_history [--snapshot]
+
+Writes hourly and daily BedHistory rows for closed periods and deletes
+rows past their retention window (see core/bed_history.py). Run it hourly,
+e.g. with cron:
+    5 * * * * cd /path/to/careconnect && python manage.py roll_up_bed_history
+"""
+from django.core.management.base import BaseCommand
+from core.bed_history import prune, record_bed_history, roll_up
+from core.models import Hospital
+
+
+class Command(BaseCommand):
+    help = 'Rolls up bed availability history into hourly and daily rows and applies retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--snapshot', action='store_true',
+            help="Record every hospital's current bed counts first (e.g. when history starts)",
+        )
+
+    def handle(self, *args, **options):
+        if options['snapshot']:
+            recorded = record_bed_history(Hospital.objects.iterator())
+            self.stdout.write(f"Recorded current bed counts of {recorded} hospitals")
+
+        self.stdout.write("Rolling up bed availability history...")
+        hourly, daily = roll_up()
+        deleted = prune()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Wrote {hourly} hourly and {daily} daily rows; deleted {deleted["raw"]} raw, '
+            f'{deleted["hourly"]} hourly and {deleted["daily"]} daily rows past retention'
+        ))
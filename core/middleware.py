@@ -0,0 +1,29 @@
+"""
+Core middleware
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from core.tenancy import resolve_tenant
+
+
+class TenantMiddleware:
+    """
+    Sets request.tenant to the Hospital / AmbulanceProvider the user manages
+
+    Resolved on first access (None for other users); must come after
+    AuthenticationMiddleware. Runs as-is in both sync and async stacks, so
+    async views such as the availability stream aren't adapted to sync.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.tenant = SimpleLazyObject(lambda: resolve_tenant(request))
+        # A coroutine in an async stack, which the caller awaits
+        return self.get_response(request)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_add_purpose_to_otp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(fields=['latitude', 'longitude'], name='hospitals_lat_lng_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_hospital_location_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="hospital",
+            name="version",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="hospital",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
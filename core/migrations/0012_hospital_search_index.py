@@ -0,0 +1,160 @@
+# Generated by Django 4.2.7 on 2026-10-17 06:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BED_TYPES = ("icu", "oxygen", "ventilator", "isolation")
+FACILITY_BITS = {"icu": 1, "oxygen": 2, "ventilator": 4, "isolation": 8}
+
+
+def bed_status(available, total):
+    if total == 0:
+        return "none"
+    percentage = (available / total) * 100
+    if percentage >= 50:
+        return "good"
+    elif percentage >= 20:
+        return "limited"
+    elif percentage > 0:
+        return "very_limited"
+    return "full"
+
+
+def populate_search_index(apps, schema_editor):
+    Hospital = apps.get_model("core", "Hospital")
+    HospitalSearchIndex = apps.get_model("core", "HospitalSearchIndex")
+
+    rows = []
+    for hospital in Hospital.objects.iterator():
+        index = HospitalSearchIndex(
+            hospital_id=hospital.id,
+            city_key=hospital.city.strip().lower(),
+            type=hospital.type,
+            search_text=" ".join(
+                part.strip().lower()
+                for part in (hospital.name, hospital.city, hospital.address, hospital.facilities)
+                if part
+            ),
+            hospital_updated_at=hospital.updated_at,
+        )
+        mask = 0
+        for bed_type in BED_TYPES:
+            available = getattr(hospital, f"beds_{bed_type}")
+            total = getattr(hospital, f"beds_{bed_type}_capacity") or available
+            setattr(index, f"{bed_type}_available", available)
+            setattr(index, f"{bed_type}_total", total)
+            setattr(index, f"{bed_type}_status", bed_status(available, total))
+            if available > 0:
+                mask |= FACILITY_BITS[bed_type]
+        index.facility_mask = mask
+        rows.append(index)
+    HospitalSearchIndex.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_hospital_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HospitalSearchIndex",
+            fields=[
+                (
+                    "hospital",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="core.hospital",
+                    ),
+                ),
+                ("city_key", models.CharField(db_index=True, max_length=100)),
+                ("type", models.CharField(db_index=True, max_length=20)),
+                (
+                    "search_text",
+                    models.TextField(
+                        help_text="Lowercased name, city, address and facilities"
+                    ),
+                ),
+                (
+                    "facility_mask",
+                    models.PositiveIntegerField(db_index=True, default=0),
+                ),
+                ("icu_available", models.IntegerField(default=0)),
+                ("icu_total", models.IntegerField(default=0)),
+                (
+                    "icu_status",
+                    models.CharField(
+                        choices=[
+                            ("none", "No Beds"),
+                            ("good", "Good"),
+                            ("limited", "Limited"),
+                            ("very_limited", "Very Limited"),
+                            ("full", "Full"),
+                        ],
+                        default="none",
+                        max_length=12,
+                    ),
+                ),
+                ("oxygen_available", models.IntegerField(default=0)),
+                ("oxygen_total", models.IntegerField(default=0)),
+                (
+                    "oxygen_status",
+                    models.CharField(
+                        choices=[
+                            ("none", "No Beds"),
+                            ("good", "Good"),
+                            ("limited", "Limited"),
+                            ("very_limited", "Very Limited"),
+                            ("full", "Full"),
+                        ],
+                        default="none",
+                        max_length=12,
+                    ),
+                ),
+                ("ventilator_available", models.IntegerField(default=0)),
+                ("ventilator_total", models.IntegerField(default=0)),
+                (
+                    "ventilator_status",
+                    models.CharField(
+                        choices=[
+                            ("none", "No Beds"),
+                            ("good", "Good"),
+                            ("limited", "Limited"),
+                            ("very_limited", "Very Limited"),
+                            ("full", "Full"),
+                        ],
+                        default="none",
+                        max_length=12,
+                    ),
+                ),
+                ("isolation_available", models.IntegerField(default=0)),
+                ("isolation_total", models.IntegerField(default=0)),
+                (
+                    "isolation_status",
+                    models.CharField(
+                        choices=[
+                            ("none", "No Beds"),
+                            ("good", "Good"),
+                            ("limited", "Limited"),
+                            ("very_limited", "Very Limited"),
+                            ("full", "Full"),
+                        ],
+                        default="none",
+                        max_length=12,
+                    ),
+                ),
+                ("hospital_updated_at", models.DateTimeField(null=True)),
+            ],
+            options={
+                "verbose_name": "Hospital Search Index",
+                "verbose_name_plural": "Hospital Search Index",
+                "db_table": "hospital_search_index",
+            },
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
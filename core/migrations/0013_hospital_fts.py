@@ -0,0 +1,80 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:00
+
+from django.db import migrations
+
+
+# SQLite-only: an FTS5 index over hospitals, kept in sync by triggers so
+# every write path (ORM saves, bulk updates, raw SQL) updates it. Other
+# backends, or SQLite builds without FTS5, fall back to LIKE search.
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS hospital_fts USING fts5(
+        name, address, city, facilities,
+        content='hospitals', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hospital_fts_insert AFTER INSERT ON hospitals BEGIN
+        INSERT INTO hospital_fts(rowid, name, address, city, facilities)
+        VALUES (new.id, new.name, new.address, new.city, new.facilities);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hospital_fts_delete AFTER DELETE ON hospitals BEGIN
+        INSERT INTO hospital_fts(hospital_fts, rowid, name, address, city, facilities)
+        VALUES ('delete', old.id, old.name, old.address, old.city, old.facilities);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hospital_fts_update
+    AFTER UPDATE OF name, address, city, facilities ON hospitals BEGIN
+        INSERT INTO hospital_fts(hospital_fts, rowid, name, address, city, facilities)
+        VALUES ('delete', old.id, old.name, old.address, old.city, old.facilities);
+        INSERT INTO hospital_fts(rowid, name, address, city, facilities)
+        VALUES (new.id, new.name, new.address, new.city, new.facilities);
+    END
+    """,
+    "INSERT INTO hospital_fts(hospital_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS hospital_fts_update",
+    "DROP TRIGGER IF EXISTS hospital_fts_delete",
+    "DROP TRIGGER IF EXISTS hospital_fts_insert",
+    "DROP TABLE IF EXISTS hospital_fts",
+]
+
+
+def fts5_supported(connection):
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any("FTS5" in row[0] for row in cursor.fetchall())
+
+
+def create_fts(apps, schema_editor):
+    if not fts5_supported(schema_editor.connection):
+        return
+    for statement in FTS_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_hospital_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:02
+
+from django.db import migrations, models
+
+
+def populate_service_cities(apps, schema_editor):
+    City = apps.get_model("core", "City")
+    AmbulanceProvider = apps.get_model("core", "AmbulanceProvider")
+
+    cities = {}
+    for provider in AmbulanceProvider.objects.iterator():
+        served = []
+        for name in provider.service_area.split(","):
+            name = " ".join(name.split())
+            key = name.lower()
+            if not key:
+                continue
+            if key not in cities:
+                cities[key], _ = City.objects.get_or_create(key=key, defaults={"name": name})
+            served.append(cities[key])
+        provider.service_cities.set(served)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_hospital_fts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="City",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("key", models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                "verbose_name": "City",
+                "verbose_name_plural": "Cities",
+                "db_table": "cities",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="ambulanceprovider",
+            name="service_cities",
+            field=models.ManyToManyField(
+                blank=True, editable=False, related_name="providers", to="core.city"
+            ),
+        ),
+        migrations.RunPython(populate_service_cities, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:20
+
+from django.db import migrations
+
+
+# Facility names/aliases -> bit position in facility_mask, as of this migration
+FACILITY_POSITIONS = {
+    "icu": 0, "icu (intensive care unit)": 0,
+    "nicu": 1, "nicu (neonatal icu)": 1,
+    "emergency": 2, "emergency ward": 2,
+    "operation_theatre": 3, "operation theatre": 3, "ot": 3, "surgery": 3,
+    "diagnostic_lab": 4, "diagnostic lab": 4, "pathology": 4,
+    "radiology": 5, "radiology (x-ray)": 5, "x-ray": 5,
+    "ct_scan": 6, "ct scan": 6,
+    "mri": 7,
+    "pharmacy": 8,
+    "blood_bank": 9, "blood bank": 9,
+    "ambulance": 10, "ambulance service": 10,
+    "cafeteria": 11,
+}
+BED_BITS_MASK = 0xFF
+
+
+def add_declared_facilities(apps, schema_editor):
+    HospitalSearchIndex = apps.get_model("core", "HospitalSearchIndex")
+
+    for index in HospitalSearchIndex.objects.select_related("hospital").iterator():
+        mask = index.facility_mask & BED_BITS_MASK
+        for name in index.hospital.facilities.split(","):
+            position = FACILITY_POSITIONS.get(" ".join(name.split()).lower())
+            if position is not None:
+                mask |= 1 << (8 + position)
+        if mask != index.facility_mask:
+            index.facility_mask = mask
+            index.save(update_fields=["facility_mask"])
+
+
+def remove_declared_facilities(apps, schema_editor):
+    HospitalSearchIndex = apps.get_model("core", "HospitalSearchIndex")
+    for index in HospitalSearchIndex.objects.filter(facility_mask__gt=BED_BITS_MASK).iterator():
+        index.facility_mask &= BED_BITS_MASK
+        index.save(update_fields=["facility_mask"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_service_cities"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_declared_facilities, remove_declared_facilities),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_outbound_email"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="otp",
+            name="purpose",
+            field=models.CharField(
+                choices=[
+                    ("email_verification", "Email Verification"),
+                    ("phone_verification", "Phone Verification"),
+                    ("password_reset", "Password Reset"),
+                ],
+                default="email_verification",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:12
+
+import core.models
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+
+def check_duplicate_emails(apps, schema_editor):
+    """
+    Refuse to add the constraint while emails differing only in case
+    exist (earlier versions allowed them). Which account keeps the address
+    is for an administrator to decide: change or clear the others' email,
+    then run migrate again.
+    """
+    User = apps.get_model("core", "User")
+    users = User.objects.using(schema_editor.connection.alias).exclude(email="").annotate(
+        email_lower=Lower("email")
+    )
+    duplicates = (
+        users.values("email_lower").annotate(accounts=Count("id")).filter(accounts__gt=1).values("email_lower")
+    )
+    clashes = {}
+    for user_id, email in users.filter(email_lower__in=duplicates).order_by("email_lower", "id").values_list(
+        "id", "email_lower"
+    ):
+        clashes.setdefault(email, []).append(str(user_id))
+    if clashes:
+        listing = "; ".join(f"user ids {', '.join(ids)}" for ids in clashes.values())
+        raise RuntimeError(
+            f"{len(clashes)} email addresses are used by several accounts when case is ignored "
+            f"({listing}). Change or clear the email of all but one account of each, then run "
+            f"migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0017_otp_audit"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AlterModelManagers(
+            name="user",
+            managers=[
+                ("objects", core.models.EmailUserManager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="user",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("email"),
+                condition=models.Q(("email", ""), _negated=True),
+                name="users_email_lower_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:13
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("core", "0018_user_email_lower_unique"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                django.db.models.functions.text.Lower("username"),
+                name="users_username_lower_idx",
+            ),
+        ),
+    ]
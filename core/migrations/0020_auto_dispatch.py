@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_user_username_lower_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ambulanceprovider",
+            name="auto_dispatch",
+            field=models.BooleanField(
+                default=False,
+                help_text="Assign the best available ambulance to new bookings due soon, without waiting for a dispatcher",
+            ),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="pickup_latitude",
+            field=models.DecimalField(
+                blank=True, decimal_places=6, max_digits=9, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="pickup_longitude",
+            field=models.DecimalField(
+                blank=True, decimal_places=6, max_digits=9, null=True
+            ),
+        ),
+    ]
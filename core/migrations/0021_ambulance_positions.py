@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_auto_dispatch"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AmbulancePosition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("recorded_at", models.DateTimeField()),
+                ("latitude_e6", models.IntegerField()),
+                ("longitude_e6", models.IntegerField()),
+                ("speed_kmh", models.PositiveSmallIntegerField(blank=True, null=True)),
+                (
+                    "heading",
+                    models.PositiveSmallIntegerField(
+                        blank=True, help_text="Degrees clockwise from north", null=True
+                    ),
+                ),
+                (
+                    "ambulance",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="positions",
+                        to="core.ambulance",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ambulance Position",
+                "verbose_name_plural": "Ambulance Positions",
+                "db_table": "ambulance_positions",
+                "indexes": [
+                    models.Index(
+                        fields=["ambulance", "recorded_at"],
+                        name="ambulance_position_track_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0021_ambulance_positions"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["provider", "status", "created_at", "id"],
+                name="booking_provider_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["provider", "created_at", "id"],
+                name="booking_provider_recent_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_current_bookings(apps, schema_editor):
+    Ambulance = apps.get_model("core", "Ambulance")
+    Booking = apps.get_model("core", "Booking")
+
+    active = Booking.objects.filter(
+        ambulance__isnull=False, status__in=("pending", "confirmed", "in_progress")
+    ).order_by("created_at", "id")
+    # Newest booking wins; accepting used to clear is_available, which now
+    # only means "in service"
+    held = {booking.ambulance_id: booking.id for booking in active.iterator()}
+    for ambulance_id, booking_id in held.items():
+        Ambulance.objects.filter(pk=ambulance_id).update(
+            current_booking_id=booking_id, is_available=True, status="busy"
+        )
+    # Ambulances under maintenance keep that status
+    free = Ambulance.objects.filter(current_booking__isnull=True).exclude(status="maintenance")
+    free.filter(is_available=True).update(status="available")
+    free.filter(is_available=False).update(status="offline")
+
+
+def clear_current_bookings(apps, schema_editor):
+    Ambulance = apps.get_model("core", "Ambulance")
+    Ambulance.objects.filter(status="busy").update(is_available=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0022_booking_inbox_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ambulance",
+            name="current_booking",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="core.booking",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ambulance",
+            index=models.Index(
+                fields=["provider", "status"], name="ambulance_provider_status_idx"
+            ),
+        ),
+        migrations.RunPython(set_current_bookings, clear_current_bookings),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0023_ambulance_current_booking"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BedHistory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("city_key", models.CharField(max_length=100)),
+                (
+                    "resolution",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "Raw"), (1, "Hourly"), (2, "Daily")], default=0
+                    ),
+                ),
+                ("recorded_at", models.DateTimeField()),
+                ("beds_total", models.PositiveSmallIntegerField(default=0)),
+                ("beds_total_capacity", models.PositiveSmallIntegerField(default=0)),
+                ("beds_icu", models.PositiveSmallIntegerField(default=0)),
+                ("beds_icu_capacity", models.PositiveSmallIntegerField(default=0)),
+                ("beds_oxygen", models.PositiveSmallIntegerField(default=0)),
+                ("beds_oxygen_capacity", models.PositiveSmallIntegerField(default=0)),
+                ("beds_ventilator", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "beds_ventilator_capacity",
+                    models.PositiveSmallIntegerField(default=0),
+                ),
+                ("beds_isolation", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "beds_isolation_capacity",
+                    models.PositiveSmallIntegerField(default=0),
+                ),
+                (
+                    "hospital",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bed_history",
+                        to="core.hospital",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Bed History",
+                "verbose_name_plural": "Bed History",
+                "db_table": "bed_history",
+                "indexes": [
+                    models.Index(
+                        fields=["hospital", "resolution", "recorded_at"],
+                        name="bed_history_hospital_idx",
+                    ),
+                    models.Index(
+                        fields=["city_key", "resolution", "recorded_at"],
+                        name="bed_history_city_idx",
+                    ),
+                    models.Index(
+                        fields=["resolution", "recorded_at"],
+                        name="bed_history_period_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
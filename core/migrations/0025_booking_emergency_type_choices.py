@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0024_bed_history"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="booking",
+            name="emergency_type",
+            field=models.CharField(
+                choices=[
+                    ("critical", "Critical (life support needed)"),
+                    ("emergency", "Emergency"),
+                    ("non-emergency", "Non-emergency transfer"),
+                ],
+                default="non-emergency",
+                max_length=50,
+            ),
+        ),
+    ]
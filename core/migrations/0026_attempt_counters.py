@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0025_booking_emergency_type_choices"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AttemptCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255, unique=True)),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Attempt Counter",
+                "verbose_name_plural": "Attempt Counters",
+                "db_table": "attempt_counters",
+            },
+        ),
+    ]
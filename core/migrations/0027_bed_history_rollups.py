@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:10
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+# Rollup resolution -> period (core/bed_history.py)
+PERIODS = {1: timedelta(hours=1), 2: timedelta(days=1)}
+
+
+def record_rolled_up_periods(apps, schema_editor):
+    """
+    Rollups written so far had a row for every period, so each
+    resolution is rolled up to the end of its last row
+    """
+    BedHistory = apps.get_model("core", "BedHistory")
+    BedHistoryRollup = apps.get_model("core", "BedHistoryRollup")
+    for resolution, period in PERIODS.items():
+        last = BedHistory.objects.filter(resolution=resolution).aggregate(last=Max("recorded_at"))["last"]
+        if last is not None:
+            BedHistoryRollup.objects.create(resolution=resolution, rolled_up_to=last + period)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0026_attempt_counters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BedHistoryRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "resolution",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "Raw"), (1, "Hourly"), (2, "Daily")], unique=True
+                    ),
+                ),
+                ("rolled_up_to", models.DateTimeField()),
+            ],
+            options={
+                "verbose_name": "Bed History Rollup",
+                "verbose_name_plural": "Bed History Rollups",
+                "db_table": "bed_history_rollups",
+            },
+        ),
+        migrations.RunPython(record_rolled_up_periods, migrations.RunPython.noop),
+    ]
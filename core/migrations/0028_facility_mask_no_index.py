@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 08:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0027_bed_history_rollups"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="hospitalsearchindex",
+            name="facility_mask",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,11 +1,92 @@
 """
 Core app models - User and authentication related models
 """
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 
+# Bed types tracked with available/capacity counters on Hospital
+BED_TYPES = ('icu', 'oxygen', 'ventilator', 'isolation')
+
+BED_STATUS_CHOICES = [
+    ('none', 'No Beds'),
+    ('good', 'Good'),
+    ('limited', 'Limited'),
+    ('very_limited', 'Very Limited'),
+    ('full', 'Full'),
+]
+
+
+# Canonical hospital facilities. Each one owns a bit in the search index's
+# facility_mask (after the bed-type bits), so only append to this list.
+HOSPITAL_FACILITIES = [
+    {'id': 'icu', 'name': 'ICU (Intensive Care Unit)', 'desc': 'Critical care unit', 'aliases': ('icu',)},
+    {'id': 'nicu', 'name': 'NICU (Neonatal ICU)', 'desc': 'Newborn intensive care', 'aliases': ('nicu',)},
+    {'id': 'emergency', 'name': 'Emergency Ward', 'desc': '24/7 emergency services', 'aliases': ('emergency',)},
+    {'id': 'operation_theatre', 'name': 'Operation Theatre', 'desc': 'Surgical facilities', 'aliases': ('ot', 'surgery')},
+    {'id': 'diagnostic_lab', 'name': 'Diagnostic Lab', 'desc': 'Blood tests, pathology', 'aliases': ('pathology',)},
+    {'id': 'radiology', 'name': 'Radiology (X-Ray)', 'desc': 'X-ray imaging', 'aliases': ('radiology', 'x-ray')},
+    {'id': 'ct_scan', 'name': 'CT Scan', 'desc': 'CT imaging', 'aliases': ()},
+    {'id': 'mri', 'name': 'MRI', 'desc': 'MRI imaging', 'aliases': ()},
+    {'id': 'pharmacy', 'name': 'Pharmacy', 'desc': '24/7 pharmacy', 'aliases': ()},
+    {'id': 'blood_bank', 'name': 'Blood Bank', 'desc': 'Blood storage and transfusion', 'aliases': ()},
+    {'id': 'ambulance', 'name': 'Ambulance Service', 'desc': 'Emergency transport', 'aliases': ('ambulance',)},
+    {'id': 'cafeteria', 'name': 'Cafeteria', 'desc': 'Food services', 'aliases': ()},
+]
+
+# Lowercased id, name and aliases -> facility id, for matching free-text entries
+_FACILITY_IDS_BY_NAME = {}
+for _facility in HOSPITAL_FACILITIES:
+    for _name in (_facility['id'], _facility['name'], *_facility['aliases']):
+        _FACILITY_IDS_BY_NAME[_name.lower()] = _facility['id']
+
+
+def get_facility_id(name):
+    """Canonical facility id for a facility name or alias, or None if it isn't in the registry"""
+    return _FACILITY_IDS_BY_NAME.get(' '.join(name.split()).lower())
+
+
+def get_bed_status(available, total):
+    """Helper function to determine availability status"""
+    if total == 0:
+        return 'none'
+    percentage = (available / total) * 100
+    if percentage >= 50:
+        return 'good'
+    elif percentage >= 20:
+        return 'limited'
+    elif percentage > 0:
+        return 'very_limited'
+    else:
+        return 'full'
+
+
+class EmailUserManager(UserManager):
+    """User manager with the case-insensitive email lookup used for sign-in"""
+
+    def with_email(self, email):
+        """
+        Users whose email matches `email`, ignoring case
+
+        Filters on LOWER(email) so the lookup is served by the
+        users_email_lower_uniq index rather than a table scan.
+        """
+        email = (email or '').strip().lower()
+        if not email:
+            return self.none()
+        return self.alias(email_lower=Lower('email')).filter(email_lower=email).exclude(email='')
+
+    def get_by_email(self, email):
+        """The user with this email, or None"""
+        try:
+            return self.with_email(email).get()
+        except self.model.DoesNotExist:
+            return None
+
+
 class User(AbstractUser):
     """
     Custom User model extending Django's AbstractUser
@@ -37,10 +118,23 @@ class User(AbstractUser):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = EmailUserManager()
+    
     class Meta:
         db_table = 'users'
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        constraints = [
+            # One account per email address, whatever its case; superusers
+            # created without an email are left out
+            models.UniqueConstraint(
+                Lower('email'), condition=~Q(email=''), name='users_email_lower_uniq'
+            ),
+        ]
+        indexes = [
+            # Case-insensitive username availability checks (core/usernames.py)
+            models.Index(Lower('username'), name='users_username_lower_idx'),
+        ]
     
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
@@ -48,13 +142,15 @@ class User(AbstractUser):
 
 class OTP(models.Model):
     """
-    OTP model for email and phone verification during signup and password reset
+    Audit record of OTPs issued for email and phone verification and password reset
+    Codes themselves live in the cache-backed store in core/otp.py; rows are
+    only written when OTP_AUDIT_ENABLED is set.
     """
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     otp_code = models.CharField(max_length=6)
     otp_type = models.CharField(max_length=10, choices=[('email', 'Email'), ('phone', 'Phone')])
-    purpose = models.CharField(max_length=20, choices=[('email_verification', 'Email Verification'), ('password_reset', 'Password Reset')], default='email_verification')
+    purpose = models.CharField(max_length=20, choices=[('email_verification', 'Email Verification'), ('phone_verification', 'Phone Verification'), ('password_reset', 'Password Reset')], default='email_verification')
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
     expires_at = models.DateTimeField()
@@ -77,6 +173,65 @@ class OTP(models.Model):
         return not self.is_expired() and not self.is_verified
 
 
+class AttemptCounter(models.Model):
+    """
+    Attempts made against a limit within a time window (core/attempts.py)
+    Used for OTP guesses and API login failures; expired rows are reused by
+    the next attempt or deleted by `manage.py prune_attempt_counters`.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'attempt_counters'
+        verbose_name = 'Attempt Counter'
+        verbose_name_plural = 'Attempt Counters'
+
+    def __str__(self):
+        return f"{self.key}: {self.count}"
+
+
+class OutboundEmail(models.Model):
+    """
+    Outgoing email waiting to be delivered by the mail queue (core/mail_queue.py)
+    Messages that keep failing end up as 'dead' rows for inspection and requeue.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Failed permanently'),
+    ]
+    
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    # Cleared once sent so OTP codes don't linger in the database
+    body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'outbound_emails'
+        verbose_name = 'Outbound Email'
+        verbose_name_plural = 'Outbound Emails'
+        ordering = ['-created_at']
+        indexes = [
+            # Workers poll for due messages
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.status})"
+
+
 class Hospital(models.Model):
     """
     Hospital model for storing hospital information and bed availability
@@ -124,19 +279,44 @@ class Hospital(models.Model):
     # Relationship to user (hospital admin)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hospitals')
     
+    # Incremented on every save; lets live-availability clients detect changes
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(default=timezone.now)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         db_table = 'hospitals'
         verbose_name = 'Hospital'
         verbose_name_plural = 'Hospitals'
         ordering = ['name']
+        indexes = [
+            # Bounding-box prefilter for proximity search
+            models.Index(fields=['latitude', 'longitude'], name='hospitals_lat_lng_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.city}"
     
+    def save(self, *args, **kwargs):
+        """
+        Save, bump the version counter atomically in the database and
+        refresh the hospital's search index row in the same transaction
+        """
+        with transaction.atomic():
+            if self._state.adding:
+                self.version = 1
+                super().save(*args, **kwargs)
+            else:
+                self.version = F('version') + 1
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None:
+                    kwargs['update_fields'] = set(update_fields) | {'version', 'updated_at'}
+                super().save(*args, **kwargs)
+                self.refresh_from_db(fields=['version'])
+            HospitalSearchIndex.refresh_for(self)
+    
     def get_facilities_list(self):
         """Return facilities as a list"""
         return [f.strip() for f in self.facilities.split(',') if f.strip()]
@@ -146,6 +326,247 @@ class Hospital(models.Model):
         self.facilities = ', '.join(facilities_list)
 
 
+class HospitalSearchIndex(models.Model):
+    """
+    Denormalized read model for hospital search
+    One row per hospital holding the effective bed totals, availability
+    statuses, a facility bitmask and normalized search text, rewritten
+    whenever the hospital is saved
+    """
+    # Bit per bed type that currently has at least one bed available
+    BED_BITS = {
+        'icu': 1 << 0,
+        'oxygen': 1 << 1,
+        'ventilator': 1 << 2,
+        'isolation': 1 << 3,
+    }
+    
+    # Bit per declared facility in the registry (bits 8-30 fit a signed int column)
+    DECLARED_FACILITY_BITS = {
+        facility['id']: 1 << (8 + position) for position, facility in enumerate(HOSPITAL_FACILITIES)
+    }
+    
+    hospital = models.OneToOneField(Hospital, on_delete=models.CASCADE, primary_key=True, related_name='search_index')
+    
+    # Normalized filter columns
+    city_key = models.CharField(max_length=100, db_index=True)
+    type = models.CharField(max_length=20, db_index=True)
+    search_text = models.TextField(help_text='Lowercased name, city, address and facilities')
+    # Filtered with a bitwise AND, which a B-tree index can't serve
+    facility_mask = models.PositiveIntegerField(default=0)
+    
+    # Effective bed counts (total falls back to available when capacity isn't set)
+    icu_available = models.IntegerField(default=0)
+    icu_total = models.IntegerField(default=0)
+    icu_status = models.CharField(max_length=12, choices=BED_STATUS_CHOICES, default='none')
+    oxygen_available = models.IntegerField(default=0)
+    oxygen_total = models.IntegerField(default=0)
+    oxygen_status = models.CharField(max_length=12, choices=BED_STATUS_CHOICES, default='none')
+    ventilator_available = models.IntegerField(default=0)
+    ventilator_total = models.IntegerField(default=0)
+    ventilator_status = models.CharField(max_length=12, choices=BED_STATUS_CHOICES, default='none')
+    isolation_available = models.IntegerField(default=0)
+    isolation_total = models.IntegerField(default=0)
+    isolation_status = models.CharField(max_length=12, choices=BED_STATUS_CHOICES, default='none')
+    
+    # Copied from the hospital so "last updated" needs no extra join
+    hospital_updated_at = models.DateTimeField(null=True)
+    
+    class Meta:
+        db_table = 'hospital_search_index'
+        verbose_name = 'Hospital Search Index'
+        verbose_name_plural = 'Hospital Search Index'
+    
+    def __str__(self):
+        return f"Search index for hospital #{self.hospital_id}"
+    
+    @classmethod
+    def facility_mask_for(cls, facilities):
+        """
+        Bitmask requiring every facility in the list (unknown names are ignored)
+        
+        Bed types mean "has beds of that type available" and take precedence
+        over the declared facility with the same id (e.g. 'icu').
+        """
+        mask = 0
+        for facility in facilities:
+            mask |= cls.BED_BITS.get(facility) or cls.DECLARED_FACILITY_BITS.get(facility, 0)
+        return mask
+    
+    @classmethod
+    def declared_facility_mask(cls, hospital):
+        """Bits for the registry facilities listed in the hospital's facilities text"""
+        mask = 0
+        for name in hospital.get_facilities_list():
+            mask |= cls.DECLARED_FACILITY_BITS.get(get_facility_id(name), 0)
+        return mask
+    
+    @classmethod
+    def build_for(cls, hospital):
+        """Compute (without saving) the index row for a hospital"""
+        index = cls(
+            hospital=hospital,
+            city_key=hospital.city.strip().lower(),
+            type=hospital.type,
+            search_text=' '.join(
+                part.strip().lower()
+                for part in (hospital.name, hospital.city, hospital.address, hospital.facilities)
+                if part
+            ),
+            hospital_updated_at=hospital.updated_at,
+        )
+        mask = cls.declared_facility_mask(hospital)
+        for bed_type in BED_TYPES:
+            available = getattr(hospital, f'beds_{bed_type}')
+            total = getattr(hospital, f'beds_{bed_type}_capacity') or available
+            setattr(index, f'{bed_type}_available', available)
+            setattr(index, f'{bed_type}_total', total)
+            setattr(index, f'{bed_type}_status', get_bed_status(available, total))
+            if available > 0:
+                mask |= cls.BED_BITS[bed_type]
+        index.facility_mask = mask
+        return index
+    
+    @classmethod
+    def refresh_for(cls, hospital):
+        """Rewrite the index row for a saved hospital"""
+        index = cls.build_for(hospital)
+        index.save()
+        hospital.search_index = index
+        return index
+    
+    def declared_facility_ids(self):
+        """Registry ids of the facilities the hospital declares, decoded from the mask"""
+        return [
+            facility_id for facility_id, bit in self.DECLARED_FACILITY_BITS.items()
+            if self.facility_mask & bit
+        ]
+    
+    def bed_availability(self):
+        """Available/total/status for each bed type"""
+        return {
+            bed_type: {
+                'available': getattr(self, f'{bed_type}_available'),
+                'total': getattr(self, f'{bed_type}_total'),
+                'status': getattr(self, f'{bed_type}_status'),
+            }
+            for bed_type in BED_TYPES
+        }
+
+
+class BedHistory(models.Model):
+    """
+    Append-only history of a hospital's bed counts
+    Every bed update adds a RAW sample. core/bed_history.py rolls them up
+    into HOURLY and DAILY rows holding the counts at the end of a period,
+    written only for periods where they changed, and deletes rows past
+    their retention window.
+    """
+    RAW = 0
+    HOURLY = 1
+    DAILY = 2
+    RESOLUTION_CHOICES = [
+        (RAW, 'Raw'),
+        (HOURLY, 'Hourly'),
+        (DAILY, 'Daily'),
+    ]
+    
+    # Hospital fields copied into each row, as (available, capacity) pairs
+    COUNT_FIELDS = (
+        'beds_total', 'beds_total_capacity',
+        'beds_icu', 'beds_icu_capacity',
+        'beds_oxygen', 'beds_oxygen_capacity',
+        'beds_ventilator', 'beds_ventilator_capacity',
+        'beds_isolation', 'beds_isolation_capacity',
+    )
+    
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='bed_history')
+    # City.normalize_key() of the hospital's city when the row was written
+    city_key = models.CharField(max_length=100)
+    resolution = models.PositiveSmallIntegerField(choices=RESOLUTION_CHOICES, default=RAW)
+    # When the sample was taken, or the start of the hour/day rolled up
+    recorded_at = models.DateTimeField()
+    
+    beds_total = models.PositiveSmallIntegerField(default=0)
+    beds_total_capacity = models.PositiveSmallIntegerField(default=0)
+    beds_icu = models.PositiveSmallIntegerField(default=0)
+    beds_icu_capacity = models.PositiveSmallIntegerField(default=0)
+    beds_oxygen = models.PositiveSmallIntegerField(default=0)
+    beds_oxygen_capacity = models.PositiveSmallIntegerField(default=0)
+    beds_ventilator = models.PositiveSmallIntegerField(default=0)
+    beds_ventilator_capacity = models.PositiveSmallIntegerField(default=0)
+    beds_isolation = models.PositiveSmallIntegerField(default=0)
+    beds_isolation_capacity = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'bed_history'
+        verbose_name = 'Bed History'
+        verbose_name_plural = 'Bed History'
+        indexes = [
+            # Series of one hospital
+            models.Index(fields=['hospital', 'resolution', 'recorded_at'], name='bed_history_hospital_idx'),
+            # Series of a city
+            models.Index(fields=['city_key', 'resolution', 'recorded_at'], name='bed_history_city_idx'),
+            # Rollups and retention
+            models.Index(fields=['resolution', 'recorded_at'], name='bed_history_period_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hospital_id} @ {self.recorded_at} ({self.get_resolution_display()})"
+
+
+class BedHistoryRollup(models.Model):
+    """
+    How far bed history has been rolled up at one resolution
+    Rollup rows are only written when counts change, so the end of the
+    last period processed is kept here rather than read off the rows.
+    """
+    resolution = models.PositiveSmallIntegerField(choices=BedHistory.RESOLUTION_CHOICES, unique=True)
+    # End of the last period rolled up (exclusive)
+    rolled_up_to = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'bed_history_rollups'
+        verbose_name = 'Bed History Rollup'
+        verbose_name_plural = 'Bed History Rollups'
+    
+    def __str__(self):
+        return f"{self.get_resolution_display()} up to {self.rolled_up_to}"
+
+
+class City(models.Model):
+    """
+    A city an ambulance provider serves, looked up by its normalized key
+    """
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, unique=True)
+    
+    class Meta:
+        db_table = 'cities'
+        verbose_name = 'City'
+        verbose_name_plural = 'Cities'
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+    
+    @staticmethod
+    def normalize_key(name):
+        """Case- and whitespace-insensitive lookup key, e.g. ' Pimpri  Chinchwad' -> 'pimpri chinchwad'"""
+        return ' '.join(name.split()).lower()
+    
+    @classmethod
+    def for_names(cls, names):
+        """Get or create the cities for a list of names, keeping their order"""
+        cities = {}
+        for name in names:
+            name = ' '.join(name.split())
+            key = cls.normalize_key(name)
+            if key and key not in cities:
+                cities[key], _ = cls.objects.get_or_create(key=key, defaults={'name': name})
+        return list(cities.values())
+
+
 class AmbulanceProvider(models.Model):
     """
     Ambulance Provider model for companies providing ambulance services
@@ -159,10 +580,17 @@ class AmbulanceProvider(models.Model):
     
     # Service area (stored as comma-separated cities)
     service_area = models.TextField(help_text='Comma-separated list of cities served')
+    service_cities = models.ManyToManyField(City, related_name='providers', blank=True, editable=False)
     
     # Pricing information
     pricing_info = models.JSONField(default=dict, blank=True)
     
+    # Confirm imminent bookings automatically (ambulance/dispatch.py)
+    auto_dispatch = models.BooleanField(
+        default=False,
+        help_text='Assign the best available ambulance to new bookings due soon, without waiting for a dispatcher'
+    )
+    
     # Relationship to user (ambulance provider admin)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ambulance_providers')
     
@@ -179,6 +607,14 @@ class AmbulanceProvider(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        """Save and keep the indexed service_cities relation in step with service_area"""
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or 'service_area' in update_fields:
+                self.service_cities.set(City.for_names(self.get_service_area_list()))
+    
     def get_service_area_list(self):
         """Return service area as a list"""
         return [city.strip() for city in self.service_area.split(',') if city.strip()]
@@ -214,11 +650,18 @@ class Ambulance(models.Model):
     
     # Facilities (stored as comma-separated values)
     facilities = models.TextField(blank=True, help_text='Comma-separated list of facilities')
+    # Set by the provider; whether the ambulance is in service at all
     is_available = models.BooleanField(default=True, verbose_name='Currently Available')
     
     # Relationship to provider
     provider = models.ForeignKey(AmbulanceProvider, on_delete=models.CASCADE, related_name='ambulances')
     
+    # The active booking holding this ambulance, maintained together with
+    # `status` by the booking transitions in ambulance/assignment.py
+    current_booking = models.ForeignKey(
+        'Booking', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -228,9 +671,64 @@ class Ambulance(models.Model):
         verbose_name = 'Ambulance'
         verbose_name_plural = 'Ambulances'
         ordering = ['vehicle_number']
+        indexes = [
+            # Bookable ambulances of a provider (status='available')
+            models.Index(fields=['provider', 'status'], name='ambulance_provider_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.vehicle_number} - {self.get_type_display()}"
+    
+    def derive_status(self):
+        """
+        The status implied by current_booking and is_available
+
+        'maintenance' is set by the provider and kept until they change it.
+        """
+        if self.current_booking_id:
+            return 'busy'
+        if self.status == 'maintenance':
+            return 'maintenance'
+        return 'available' if self.is_available else 'offline'
+    
+    def save(self, *args, **kwargs):
+        self.status = self.derive_status()
+        super().save(*args, **kwargs)
+
+
+class AmbulancePosition(models.Model):
+    """
+    Downsampled GPS track of an ambulance
+    Live pings are held in memory (ambulance/telemetry.py); about one per
+    TELEMETRY_SAMPLE_SECONDS per vehicle is written here. Coordinates are
+    stored as integer millionths of a degree to keep rows small.
+    """
+    ambulance = models.ForeignKey(Ambulance, on_delete=models.CASCADE, related_name='positions')
+    recorded_at = models.DateTimeField()
+    latitude_e6 = models.IntegerField()
+    longitude_e6 = models.IntegerField()
+    speed_kmh = models.PositiveSmallIntegerField(null=True, blank=True)
+    heading = models.PositiveSmallIntegerField(null=True, blank=True, help_text='Degrees clockwise from north')
+    
+    class Meta:
+        db_table = 'ambulance_positions'
+        verbose_name = 'Ambulance Position'
+        verbose_name_plural = 'Ambulance Positions'
+        indexes = [
+            # Track of one vehicle over a time range
+            models.Index(fields=['ambulance', 'recorded_at'], name='ambulance_position_track_idx'),
+        ]
+    
+    @property
+    def latitude(self):
+        return self.latitude_e6 / 1e6
+    
+    @property
+    def longitude(self):
+        return self.longitude_e6 / 1e6
+    
+    def __str__(self):
+        return f"{self.ambulance_id} @ {self.latitude:.6f},{self.longitude:.6f} ({self.recorded_at})"
 
 
 class Booking(models.Model):
@@ -245,6 +743,16 @@ class Booking(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Picks the ambulance types auto-dispatch considers (ambulance/dispatch.py)
+    EMERGENCY_TYPE_CHOICES = [
+        ('critical', 'Critical (life support needed)'),
+        ('emergency', 'Emergency'),
+        ('non-emergency', 'Non-emergency transfer'),
+    ]
+    
+    # Bookings that still hold their ambulance
+    ACTIVE_STATUSES = ('pending', 'confirmed', 'in_progress')
+    
     # User and provider information
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings')
     provider = models.ForeignKey(AmbulanceProvider, on_delete=models.CASCADE, related_name='bookings')
@@ -260,11 +768,13 @@ class Booking(models.Model):
     # Location information
     pickup_location = models.TextField()
     drop_location = models.TextField()
+    pickup_latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    pickup_longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     
     # Schedule information
     pickup_date = models.DateField()
     pickup_time = models.TimeField()
-    emergency_type = models.CharField(max_length=50, default='non-emergency')
+    emergency_type = models.CharField(max_length=50, choices=EMERGENCY_TYPE_CHOICES, default='non-emergency')
     notes = models.TextField(blank=True)
     
     # Status
@@ -279,6 +789,12 @@ class Booking(models.Model):
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
         ordering = ['-created_at']
+        indexes = [
+            # Provider bookings inbox: one status tab, newest first
+            models.Index(fields=['provider', 'status', 'created_at', 'id'], name='booking_provider_status_idx'),
+            # ... and the "all" tab
+            models.Index(fields=['provider', 'created_at', 'id'], name='booking_provider_recent_idx'),
+        ]
     
     def __str__(self):
         return f"Booking #{self.id} - {self.patient_name} ({self.status})"
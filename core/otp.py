@@ -0,0 +1,123 @@
+"""
+One-time password store
+Codes live in Django's cache (the OTP_CACHE_ALIAS cache) under a key per
+(channel, destination, purpose), so issuing an OTP is one cache write and
+checking it one cache read. Only a keyed hash of the code is stored; the
+cache timeout expires it. Each guess claims an attempt from a database
+counter (core/attempts.py) before the code is compared, so parallel wrong
+guesses can't get past OTP_MAX_ATTEMPTS whichever cache backend is used;
+after that the code is discarded.
+
+With OTP_AUDIT_ENABLED the OTP model additionally records when codes were
+issued and verified (without the code itself).
+"""
+import hashlib
+import secrets
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from core.attempts import claim_attempt, reset_attempts
+from core.models import OTP
+
+
+# verify() results
+VERIFIED = 'verified'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+
+
+class OTPStore:
+    """Issues and verifies hashed, expiring one-time codes"""
+
+    def __init__(self, cache_alias=None, max_attempts=None, audit=None):
+        self.cache_alias = cache_alias or getattr(settings, 'OTP_CACHE_ALIAS', 'default')
+        self.max_attempts = max_attempts or getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+        self.audit = getattr(settings, 'OTP_AUDIT_ENABLED', False) if audit is None else audit
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _key(self, channel, destination, purpose):
+        # Hash the destination so emails/phone numbers don't appear in cache keys
+        digest = hashlib.sha256(destination.lower().encode()).hexdigest()
+        return f'otp:{channel}:{purpose}:{digest}'
+
+    def _attempts_key(self, key):
+        return f'{key}:attempts'
+
+    def _hash(self, key, code):
+        return salted_hmac('core.otp', f'{key}:{code}').hexdigest()
+
+    def issue(self, channel, destination, purpose, ttl_seconds):
+        """Create a new 6-digit code, replacing any earlier one, and return it"""
+        code = f'{secrets.randbelow(10 ** 6):06d}'
+        key = self._key(channel, destination, purpose)
+        self.cache.set(key, {
+            'hash': self._hash(key, code),
+            'expires': time.time() + ttl_seconds,
+        }, ttl_seconds)
+        reset_attempts(self._attempts_key(key))
+
+        if self.audit:
+            OTP.objects.create(
+                email=destination if channel == 'email' else None,
+                phone=destination if channel == 'phone' else None,
+                otp_code='',
+                otp_type=channel,
+                purpose=purpose,
+                expires_at=timezone.now() + timedelta(seconds=ttl_seconds),
+            )
+        return code
+
+    def verify(self, channel, destination, purpose, code):
+        """
+        Check a code; returns VERIFIED, INVALID, EXPIRED or LOCKED
+
+        A verified code is consumed. EXPIRED also covers codes that were
+        never issued.
+        """
+        key = self._key(channel, destination, purpose)
+        entry = self.cache.get(key)
+        if entry is None:
+            return EXPIRED
+        remaining = entry['expires'] - time.time()
+        if remaining <= 0:
+            return EXPIRED
+
+        # Claim an attempt before comparing. The counter is left to expire
+        # with the code rather than reset here, so guesses racing this one
+        # keep counting against it.
+        attempts = claim_attempt(self._attempts_key(key), self.max_attempts, remaining)
+        if attempts is None:
+            self.cache.delete(key)
+            return LOCKED
+
+        if constant_time_compare(entry['hash'], self._hash(key, code)):
+            self.cache.delete(key)
+            if self.audit:
+                self._audit_verified(channel, destination, purpose)
+            return VERIFIED
+
+        if attempts >= self.max_attempts:
+            self.cache.delete(key)
+            return LOCKED
+        return INVALID
+
+    def _audit_verified(self, channel, destination, purpose):
+        lookup = {'email': destination} if channel == 'email' else {'phone': destination}
+        latest = OTP.objects.filter(
+            otp_type=channel, purpose=purpose, is_verified=False, **lookup
+        ).order_by('-created_at').first()
+        if latest:
+            latest.is_verified = True
+            latest.save(update_fields=['is_verified'])
+
+
+otp_store = OTPStore()
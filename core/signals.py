@@ -0,0 +1,33 @@
+"""
+Signal handlers keeping core's in-process caches in sync with the database
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.models import User, Hospital, AmbulanceProvider
+from core.tenancy import forget_tenant
+from core.usernames import username_availability
+
+
+@receiver(post_save, sender=User)
+def remember_taken_username(sender, instance, **kwargs):
+    """A new (or renamed) account's username is no longer available"""
+    username_availability.mark_taken(instance.username)
+
+
+@receiver(post_delete, sender=User)
+def release_username(sender, instance, **kwargs):
+    username_availability.forget(instance.username)
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_save, sender=AmbulanceProvider)
+def forget_saved_tenant(sender, instance, **kwargs):
+    """The owner may be new; drop their cached request.tenant mapping"""
+    forget_tenant(instance.owner_id)
+
+
+@receiver(post_delete, sender=Hospital)
+@receiver(post_delete, sender=AmbulanceProvider)
+def forget_deleted_tenant(sender, instance, **kwargs):
+    """The owner's cached request.tenant mapping points at a deleted row"""
+    forget_tenant(instance.owner_id)
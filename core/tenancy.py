@@ -0,0 +1,151 @@
+"""
+Tenant resolution
+Hospital and ambulance admins each manage one Hospital / AmbulanceProvider,
+their "tenant". TenantMiddleware exposes it lazily as `request.tenant`, so
+views don't each look it up by owner.
+
+The user -> tenant id mapping is remembered in the session and the
+TENANT_CACHE_ALIAS cache for TENANT_CACHE_SECONDS. Only the mapping is
+cached, never the row: request.tenant is fetched by primary key with the
+owner re-checked, so bed counts and prices are always current and a stale
+mapping (ownership changed in the admin, possibly in another process) is
+noticed and replaced rather than trusted. Callers that only need the id
+use tenant_id_for(request), which costs no query while the mapping is
+cached.
+"""
+import time
+
+from django.conf import settings
+from django.contrib import auth
+from django.core.cache import caches
+from django.http import Http404
+
+from core.models import Hospital, AmbulanceProvider
+
+
+SESSION_KEY = '_tenant'
+
+# Roles whose users administer a tenant
+TENANT_ROLES = ('hospital', 'ambulance')
+
+
+def _querysets():
+    return {
+        'hospital': Hospital.objects.select_related('search_index'),
+        'ambulance': AmbulanceProvider.objects.all(),
+    }
+
+
+def _cache():
+    return caches[getattr(settings, 'TENANT_CACHE_ALIAS', 'default')]
+
+
+def _cache_seconds():
+    return getattr(settings, 'TENANT_CACHE_SECONDS', 5 * 60)
+
+
+def _cache_key(user_id):
+    return f'core:tenant:{user_id}'
+
+
+def _tenant_role(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or user.role not in TENANT_ROLES:
+        return None
+    return user.role
+
+
+def _remember(request, role, tenant):
+    _cache().set(_cache_key(request.user.id), (role, tenant.id), _cache_seconds())
+    if auth.SESSION_KEY not in request.session:
+        # Authenticated per request (HTTP Basic); don't start a session
+        return
+    request.session[SESSION_KEY] = {
+        'user': request.user.id,
+        'role': role,
+        'id': tenant.id,
+        'expires': time.time() + _cache_seconds(),
+    }
+
+
+def forget_tenant(user_id, request=None):
+    """Drop the cached mapping for a user (and from `request`'s session)"""
+    _cache().delete(_cache_key(user_id))
+    if request is not None:
+        request.session.pop(SESSION_KEY, None)
+
+
+def _lookup_by_owner(role, user_id):
+    # An owner may have been given several; the first one created wins
+    return _querysets()[role].filter(owner_id=user_id).order_by('id').first()
+
+
+def tenant_id_for(request):
+    """
+    Id of the request user's Hospital / AmbulanceProvider, or None
+
+    Served from the cache or session when possible; the id is not
+    re-validated, so it may lag an ownership change by up to
+    TENANT_CACHE_SECONDS.
+    """
+    role = _tenant_role(request)
+    if role is None:
+        return None
+    user_id = request.user.id
+
+    cached = _cache().get(_cache_key(user_id))
+    if cached is not None and cached[0] == role:
+        return cached[1]
+
+    stored = request.session.get(SESSION_KEY)
+    if (
+        stored and stored['user'] == user_id and stored['role'] == role
+        and stored['expires'] > time.time()
+    ):
+        _cache().set(_cache_key(user_id), (role, stored['id']), stored['expires'] - time.time())
+        return stored['id']
+
+    tenant = _lookup_by_owner(role, user_id)
+    if tenant is None:
+        return None
+    _remember(request, role, tenant)
+    request._cached_tenant = tenant
+    return tenant.id
+
+
+def resolve_tenant(request):
+    """
+    The request user's Hospital / AmbulanceProvider, or None
+
+    One primary key lookup while the mapping is cached.
+    """
+    role = _tenant_role(request)
+    if role is None:
+        return None
+    if hasattr(request, '_cached_tenant'):
+        return request._cached_tenant
+
+    tenant_id = tenant_id_for(request)
+    if tenant_id is None:
+        return None
+    if hasattr(request, '_cached_tenant'):
+        # tenant_id_for had to look the tenant up itself
+        return request._cached_tenant
+
+    tenant = _querysets()[role].filter(pk=tenant_id, owner_id=request.user.id).first()
+    if tenant is None:
+        # Ownership changed since the mapping was cached
+        forget_tenant(request.user.id, request)
+        tenant = _lookup_by_owner(role, request.user.id)
+        if tenant is not None:
+            _remember(request, role, tenant)
+    request._cached_tenant = tenant
+    return tenant
+
+
+def get_tenant_or_404(request):
+    """request.tenant, raising Http404 for users who don't manage one"""
+    tenant = request.tenant
+    if not tenant:
+        raise Http404('No hospital or ambulance provider is assigned to this account')
+    return tenant
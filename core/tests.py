@@ -0,0 +1,569 @@
+"""
+Tests for the core app
+"""
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth import SESSION_KEY, authenticate
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import caches
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ambulance.tests import race, retrying
+from core.attempts import claim_attempt, release_attempt
+from core.bed_history import bed_series, prune, record_bed_history, roll_up
+from core.mail_queue import MailWorker, RETRY_BASE_SECONDS
+from core.models import AmbulanceProvider, AttemptCounter, BedHistory, Hospital, OutboundEmail, User
+from core.otp import OTPStore, VERIFIED, INVALID, EXPIRED, LOCKED
+from core.tenancy import resolve_tenant, tenant_id_for
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    Minimal local SMTP server standing in for the mail provider
+
+    Counts connections and accepted messages; while `fail` is set every
+    message is refused with a temporary error.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeSMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.fail = False
+        self.lock = threading.Lock()
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 fake.smtp ready')
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            command = line.split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250-fake.smtp')
+                self.reply('250 8BITMIME')
+            elif command == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(line.split(':', 1)[1].strip(' <>'))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while (chunk := self.rfile.readline()) not in (b'.\r\n', b''):
+                    data.append(chunk)
+                if server.fail:
+                    self.reply('451 Temporary failure, try again later')
+                else:
+                    with server.lock:
+                        server.messages.append((recipients, b''.join(data)))
+                    self.reply('250 Queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # RSET, NOOP
+                self.reply('250 OK')
+
+
+class MailQueueTests(TestCase):
+    """Delivery of queued email by a mail worker against a local SMTP server"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.smtp = FakeSMTPServer()
+        threading.Thread(target=cls.smtp.serve_forever, daemon=True).start()
+        cls.mail_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=cls.smtp.server_address[1],
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+            DEFAULT_FROM_EMAIL='noreply@careconnect.test',
+        )
+        cls.mail_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mail_settings.disable()
+        cls.smtp.shutdown()
+        cls.smtp.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.smtp.connections = 0
+        self.smtp.messages = []
+        self.smtp.fail = False
+        self.worker = MailWorker()
+        self.addCleanup(self.worker.close)
+
+    def queue(self, count=1):
+        # Rows are created directly: enqueue_email() would wake the background workers
+        return [
+            OutboundEmail.objects.create(
+                to_email=f'user{number}@example.com', subject='Your OTP', body='Your code is 123456'
+            )
+            for number in range(count)
+        ]
+
+    def make_due(self, message):
+        OutboundEmail.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+
+    def test_batch_is_sent_over_one_connection(self):
+        messages = self.queue(3)
+
+        while self.worker.process_one():
+            pass
+
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(
+            [recipients for recipients, _ in self.smtp.messages],
+            [[message.to_email] for message in messages],
+        )
+        for message in messages:
+            message.refresh_from_db()
+            self.assertEqual(message.status, 'sent')
+            self.assertEqual(message.attempts, 1)
+            self.assertEqual(message.body, '')
+
+    def test_failed_send_is_retried_with_backoff(self):
+        message, = self.queue()
+        self.smtp.fail = True
+
+        for attempt in (1, 2):
+            before = timezone.now()
+            self.assertTrue(self.worker.process_one())
+            message.refresh_from_db()
+            self.assertEqual(message.status, 'queued')
+            self.assertEqual(message.attempts, attempt)
+            self.assertIn('451', message.last_error)
+            delay = timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            self.assertGreaterEqual(message.next_attempt_at, before + delay)
+            self.assertLess(message.next_attempt_at, timezone.now() + delay)
+            # Not retried before the backoff has passed
+            self.assertFalse(self.worker.process_one())
+            self.make_due(message)
+
+        self.smtp.fail = False
+        self.assertTrue(self.worker.process_one())
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'sent')
+        self.assertEqual(message.attempts, 3)
+        self.assertEqual(len(self.smtp.messages), 1)
+
+    @override_settings(EMAIL_QUEUE_MAX_ATTEMPTS=3)
+    def test_message_is_dead_lettered_after_max_attempts(self):
+        message, = self.queue()
+        self.smtp.fail = True
+
+        for _ in range(2):
+            self.make_due(message)
+            self.assertTrue(self.worker.process_one())
+        self.make_due(message)
+        with self.assertLogs('core.mail_queue', 'ERROR'):
+            self.assertTrue(self.worker.process_one())
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'dead')
+        self.assertEqual(message.attempts, 3)
+        self.assertIn('451', message.last_error)
+        self.assertEqual(message.body, '')
+        # Dead messages stay put for an admin to inspect
+        self.make_due(message)
+        self.assertFalse(self.worker.process_one())
+        self.assertEqual(self.smtp.messages, [])
+
+
+class OTPStoreTests(TestCase):
+    """Issuing and checking one-time codes"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.store = OTPStore(cache_alias='default', max_attempts=3, audit=False)
+
+    def issue(self, ttl_seconds=600):
+        return self.store.issue('email', 'patient@example.com', 'email_verification', ttl_seconds)
+
+    def verify(self, code, destination='patient@example.com'):
+        return self.store.verify('email', destination, 'email_verification', code)
+
+    def wrong(self, code):
+        return f'{(int(code) + 1) % 10 ** 6:06d}'
+
+    def test_code_is_verified_once(self):
+        code = self.issue()
+
+        self.assertEqual(self.verify(code), VERIFIED)
+        self.assertEqual(self.verify(code), EXPIRED)
+
+    def test_destination_is_case_insensitive(self):
+        code = self.issue()
+
+        self.assertEqual(self.verify(code, 'Patient@Example.com'), VERIFIED)
+
+    def test_code_is_discarded_after_max_attempts(self):
+        code = self.issue()
+
+        self.assertEqual(self.verify(self.wrong(code)), INVALID)
+        self.assertEqual(self.verify(self.wrong(code)), INVALID)
+        self.assertEqual(self.verify(self.wrong(code)), LOCKED)
+        # Even the right code is refused now
+        self.assertEqual(self.verify(code), EXPIRED)
+
+    def test_new_code_gets_fresh_attempts(self):
+        code = self.issue()
+        for _ in range(3):
+            self.verify(self.wrong(code))
+
+        code = self.issue()
+        self.assertEqual(self.verify(self.wrong(code)), INVALID)
+        self.assertEqual(self.verify(code), VERIFIED)
+
+    def test_code_expires(self):
+        code = self.issue(ttl_seconds=60)
+
+        with mock.patch('core.otp.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.verify(code), EXPIRED)
+
+    def test_unknown_code_is_expired(self):
+        self.assertEqual(self.verify('123456'), EXPIRED)
+
+
+class AttemptCounterTests(TestCase):
+    """Counting attempts against a limit per window"""
+
+    def test_attempts_are_numbered_up_to_the_limit(self):
+        self.assertEqual([claim_attempt('key', 3, 60) for _ in range(5)], [1, 2, 3, None, None])
+
+    def test_released_attempt_can_be_claimed_again(self):
+        for _ in range(3):
+            claim_attempt('key', 3, 60)
+
+        release_attempt('key')
+
+        self.assertEqual(claim_attempt('key', 3, 60), 3)
+        self.assertIsNone(claim_attempt('key', 3, 60))
+
+    def test_expired_window_starts_again(self):
+        for _ in range(3):
+            claim_attempt('key', 3, 60)
+        AttemptCounter.objects.filter(key='key').update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(claim_attempt('key', 3, 60), 1)
+        counter = AttemptCounter.objects.get(key='key')
+        self.assertGreater(counter.expires_at, timezone.now() + timedelta(seconds=50))
+
+
+class ParallelAttemptTests(TransactionTestCase):
+    """Attempts racing from several threads stay within the limit"""
+
+    THREADS = 12
+
+    def test_parallel_claims_stay_within_the_limit(self):
+        results = race([retrying(claim_attempt, 'key', 5, 60) for _ in range(self.THREADS)])
+
+        self.assertCountEqual([result for result in results if result is not None], [1, 2, 3, 4, 5])
+        self.assertEqual(AttemptCounter.objects.get(key='key').count, 5)
+
+    def test_parallel_wrong_guesses_stay_within_max_attempts(self):
+        caches['default'].clear()
+        store = OTPStore(cache_alias='default', max_attempts=5, audit=False)
+        code = store.issue('email', 'patient@example.com', 'email_verification', 600)
+        wrong = f'{(int(code) + 1) % 10 ** 6:06d}'
+
+        results = race([
+            retrying(store.verify, 'email', 'patient@example.com', 'email_verification', wrong)
+            for _ in range(self.THREADS)
+        ])
+
+        # Four guesses were compared and the fifth locked the code; the rest were refused
+        self.assertEqual(results.count(INVALID), 4)
+        self.assertEqual(results.count(VERIFIED), 0)
+        self.assertEqual(store.verify('email', 'patient@example.com', 'email_verification', code), EXPIRED)
+
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False, PASSWORD_HASHERS=FAST_HASHERS)
+class EmailLoginTests(TestCase):
+    """Signing in by email address, whatever its case"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'patient', 'Patient@Example.com', 'password123', phone='1', role='user'
+        )
+
+    def test_login_ignores_email_case(self):
+        response = self.client.post(reverse('core:login'), {
+            'email': ' patient@EXAMPLE.com ', 'password': 'password123',
+        })
+
+        self.assertRedirects(response, reverse('userapp:home'), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.id)
+
+    def test_authenticate(self):
+        self.assertEqual(authenticate(email='PATIENT@example.com', password='password123'), self.user)
+        self.assertIsNone(authenticate(email='patient@example.com', password='wrong'))
+        self.assertIsNone(authenticate(email='nobody@example.com', password='password123'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(authenticate(email='patient@example.com', password='password123'))
+
+    def test_lookup_by_email_is_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(User.objects.get_by_email('PATIENT@EXAMPLE.COM'), self.user)
+
+    def test_emails_are_unique_ignoring_case(self):
+        with self.assertRaises(IntegrityError):
+            User.objects.create_user('other', 'patient@example.COM', 'password123', phone='2')
+
+    def test_accounts_without_email_are_allowed(self):
+        User.objects.create_user('first', '', 'password123', phone='2')
+        User.objects.create_user('second', '', 'password123', phone='3')
+
+        self.assertIsNone(User.objects.get_by_email(''))
+
+    def test_signup_rejects_email_in_other_case(self):
+        response = self.client.post(reverse('core:signup'), {
+            'username': 'other', 'email': 'PATIENT@example.com', 'country_code': '+91',
+            'phone': '9876543210', 'password': 'password123', 'confirm_password': 'password123',
+        })
+
+        self.assertContains(response, 'Email already registered')
+        self.assertFalse(User.objects.filter(username='other').exists())
+
+
+class EmailUniquenessMigrationTests(TransactionTestCase):
+    """Migration 0018 on a database holding emails that differ only in case"""
+
+    before = [('core', '0017_otp_audit')]
+    after = [('core', '0018_user_email_lower_unique')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        User = executor.loader.project_state(self.before).apps.get_model('core', 'User')
+        User.objects.filter(email__iexact='foo@example.com').update(email='')
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicate_emails_stop_the_migration(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        User = executor.loader.project_state(self.before).apps.get_model('core', 'User')
+        first = User.objects.create(username='first', email='Foo@example.com', phone='1')
+        second = User.objects.create(username='second', email='foo@example.com', phone='2')
+        User.objects.create(username='third', email='bar@example.com', phone='3')
+
+        executor.loader.build_graph()
+        with self.assertRaisesMessage(RuntimeError, f'user ids {first.id}, {second.id})'):
+            executor.migrate(self.after)
+
+
+def utc(day, hour=0, minute=0):
+    return datetime(2026, 1, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class BedHistoryTests(TestCase):
+    """Rolling up, pruning and reading bed availability history"""
+
+    def setUp(self):
+        owner = User.objects.create_user('hospital', 'h@example.com', 'password123', phone='1', role='hospital')
+        self.city = Hospital.objects.create(
+            name='City Hospital', address='Main Road', city='Pune', email='h@example.com', phone='2',
+            owner=owner, beds_icu_capacity=10,
+        )
+        self.ruby = Hospital.objects.create(
+            name='Ruby Hall', address='Station Road', city='Pune', email='r@example.com', phone='3',
+            owner=owner, beds_icu_capacity=10,
+        )
+
+    def sample(self, hospital, at, icu, city=None):
+        hospital.beds_icu = icu
+        if city:
+            hospital.city = city
+        record_bed_history([hospital], at=at)
+
+    def rollups(self, resolution):
+        return list(
+            BedHistory.objects.filter(resolution=resolution)
+            .order_by('recorded_at', 'hospital_id').values_list('hospital_id', 'recorded_at', 'beds_icu')
+        )
+
+    def test_rollups_are_written_only_when_counts_change(self):
+        self.sample(self.city, utc(5, 10, 5), 1)
+        self.sample(self.city, utc(5, 10, 40), 2)
+        self.sample(self.ruby, utc(5, 10, 50), 4)
+        self.sample(self.city, utc(5, 13, 10), 2)
+        self.sample(self.city, utc(5, 15, 20), 3)
+
+        self.assertEqual(roll_up(now=utc(5, 18, 30)), (3, 0))
+        self.assertEqual(self.rollups(BedHistory.HOURLY), [
+            (self.city.id, utc(5, 10), 2), (self.ruby.id, utc(5, 10), 4), (self.city.id, utc(5, 15), 3),
+        ])
+        # Nothing left to roll up in the same hour; the open hour waits
+        self.sample(self.city, utc(5, 18, 40), 5)
+        self.assertEqual(roll_up(now=utc(5, 18, 50)), (0, 0))
+
+        self.sample(self.city, utc(6, 9, 0), 5)
+        self.assertEqual(roll_up(now=utc(7, 0, 30)), (1, 2))
+        self.assertEqual(self.rollups(BedHistory.DAILY), [(self.city.id, utc(5), 5), (self.ruby.id, utc(5), 4)])
+        self.assertEqual(roll_up(now=utc(8, 0, 30)), (0, 0))
+
+    def test_hospital_series_carries_counts_forward(self):
+        self.sample(self.city, utc(5, 10, 5), 2)
+        self.sample(self.city, utc(5, 15, 20), 3)
+        roll_up(now=utc(5, 17, 30))
+
+        series = bed_series(utc(5, 9), utc(5, 20), hospital_id=self.city.id, resolution=BedHistory.HOURLY)
+
+        # From the first known hour up to the last one rolled up
+        self.assertEqual(series['t'], [utc(5, hour).isoformat() for hour in range(10, 17)])
+        self.assertEqual(series['beds_icu'], [2, 2, 2, 2, 2, 3, 3])
+        self.assertEqual(series['beds_icu_capacity'], [10] * 7)
+
+        later = bed_series(utc(5, 12, 30), utc(5, 14), hospital_id=self.city.id, resolution=BedHistory.HOURLY)
+        self.assertEqual((later['t'], later['beds_icu']), ([utc(5, 13).isoformat()], [2]))
+
+    def test_city_series_sums_hospitals_in_the_city(self):
+        self.sample(self.city, utc(5, 10, 5), 2)
+        self.sample(self.ruby, utc(5, 11, 5), 4)
+        self.sample(self.ruby, utc(5, 13, 5), 4, city='Mumbai')
+        roll_up(now=utc(5, 15, 30))
+
+        pune = bed_series(utc(5, 10), utc(5, 15), city='pune ', resolution=BedHistory.HOURLY)
+        mumbai = bed_series(utc(5, 10), utc(5, 15), city='Mumbai', resolution=BedHistory.HOURLY)
+
+        self.assertEqual(pune['beds_icu'], [2, 6, 6, 2, 2])
+        self.assertEqual(mumbai['t'], [utc(5, 13).isoformat(), utc(5, 14).isoformat()])
+        self.assertEqual(mumbai['beds_icu'], [4, 4])
+
+    def test_raw_series_starts_from_the_previous_sample(self):
+        self.sample(self.city, utc(5, 10, 5), 2)
+        self.sample(self.city, utc(5, 12, 5), 3)
+
+        series = bed_series(utc(5, 11), utc(5, 13), hospital_id=self.city.id, resolution=BedHistory.RAW)
+
+        self.assertEqual(series['t'], [utc(5, 11).isoformat(), utc(5, 12, 5).isoformat()])
+        self.assertEqual(series['beds_icu'], [2, 3])
+
+    @override_settings(BED_HISTORY_RAW_DAYS=2, BED_HISTORY_HOURLY_DAYS=3, BED_HISTORY_DAILY_DAYS=0)
+    def test_prune_keeps_the_last_row_before_the_cutoff(self):
+        for day, icu in ((1, 1), (2, 2), (3, 3)):
+            self.sample(self.city, utc(day, 10), icu)
+        self.sample(self.ruby, utc(1, 10), 4)
+        roll_up(now=utc(8, 0, 30))
+
+        deleted = prune(now=utc(8, 12))
+
+        self.assertEqual(deleted, {'raw': 2, 'hourly': 2, 'daily': 0})
+        self.assertEqual(self.rollups(BedHistory.HOURLY), [(self.ruby.id, utc(1, 10), 4), (self.city.id, utc(3, 10), 3)])
+        self.assertEqual(BedHistory.objects.filter(resolution=BedHistory.DAILY).count(), 4)
+        # Both hospitals still have counts for the retained hours
+        series = bed_series(utc(6, 0), utc(6, 3), city='Pune', resolution=BedHistory.HOURLY)
+        self.assertEqual(series['beds_icu'], [7, 7, 7])
+
+    def test_prune_waits_for_rollups(self):
+        self.sample(self.city, utc(1, 10), 1)
+        self.sample(self.city, utc(2, 10), 2)
+
+        self.assertEqual(prune(now=utc(8, 12)), {'raw': 0, 'hourly': 0, 'daily': 0})
+        self.assertEqual(BedHistory.objects.count(), 2)
+
+
+class TenantResolutionTests(TestCase):
+    """request.tenant for hospital and ambulance admins"""
+
+    def setUp(self):
+        caches['default'].clear()
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'password123', phone='1', role='hospital')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'password123', phone='2', role='hospital')
+        self.hospital = Hospital.objects.create(
+            name='City Hospital', address='Main Road', city='Pune', email='h@example.com', phone='3',
+            owner=self.alice, beds_icu=2, beds_icu_capacity=10,
+        )
+        self.sessions = {}
+
+    def request(self, user, method='get'):
+        """A new request from `user`, reusing their session between requests"""
+        request = getattr(RequestFactory(), method)('/')
+        request.user = user
+        if user.id not in self.sessions:
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.id)
+            self.sessions[user.id] = session
+        request.session = self.sessions[user.id]
+        return request
+
+    def test_tenant_is_resolved_by_owner(self):
+        self.assertEqual(resolve_tenant(self.request(self.alice)), self.hospital)
+        self.assertIsNone(resolve_tenant(self.request(self.bob)))
+        patient = User.objects.create_user('carol', 'carol@example.com', 'password123', phone='4', role='user')
+        self.assertIsNone(resolve_tenant(self.request(patient)))
+
+    def test_cached_mapping_costs_one_query(self):
+        resolve_tenant(self.request(self.alice))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(tenant_id_for(self.request(self.alice)), self.hospital.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_tenant(self.request(self.alice)), self.hospital)
+
+    def test_row_is_current_after_a_write_elsewhere(self):
+        resolve_tenant(self.request(self.alice))
+
+        # Another process updates the row (no signals reach this one)
+        Hospital.objects.filter(pk=self.hospital.pk).update(beds_icu=7)
+
+        self.assertEqual(resolve_tenant(self.request(self.alice)).beds_icu, 7)
+
+    def test_owner_reassigned_elsewhere(self):
+        self.assertEqual(resolve_tenant(self.request(self.alice)), self.hospital)
+        self.assertIsNone(resolve_tenant(self.request(self.bob)))
+
+        Hospital.objects.filter(pk=self.hospital.pk).update(owner=self.bob)
+
+        self.assertIsNone(resolve_tenant(self.request(self.alice)))
+        self.assertEqual(resolve_tenant(self.request(self.bob)), self.hospital)
+        # The stale mapping was dropped rather than retried
+        self.assertIsNone(tenant_id_for(self.request(self.alice)))
+
+    def test_owner_reassigned_by_save(self):
+        resolve_tenant(self.request(self.alice))
+        provider = AmbulanceProvider.objects.create(
+            name='Rapid Response', address='Station Road', city='Pune', email='p@example.com',
+            phone='5', owner=self.alice,
+        )
+
+        self.hospital.owner = self.bob
+        self.hospital.save()
+
+        self.assertEqual(resolve_tenant(self.request(self.bob)), self.hospital)
+        self.assertIsNone(resolve_tenant(self.request(self.alice)))
+        # A role change points the mapping at the other kind of tenant
+        self.alice.role = 'ambulance'
+        self.assertEqual(resolve_tenant(self.request(self.alice)), provider)
@@ -0,0 +1,53 @@
+"""
+Failed-login throttling for HTTP Basic API credentials
+Every attempt first claims a slot from a database counter for the account
+and one for the client IP (core/attempts.py), before the password is
+checked; once either counter has no slots left the attempt is refused
+until API_AUTH_LOCKOUT_SECONDS after the window opened. Claiming is one
+conditional UPDATE per counter, so concurrent guesses can't get past the
+limit. A successful login clears the account's counter and gives its slot
+back to the IP, so valid devices don't use up the IP's allowance but one
+valid account can't be used to keep guessing others.
+"""
+import hashlib
+
+from django.conf import settings
+
+from core.attempts import claim_attempt, release_attempt, reset_attempts
+
+
+class LoginThrottle:
+    """Counts failed logins per account and per client IP"""
+
+    def __init__(self, max_account_failures=None, max_ip_failures=None, lockout_seconds=None):
+        self.max_account_failures = max_account_failures or getattr(settings, 'API_AUTH_MAX_ACCOUNT_FAILURES', 10)
+        self.max_ip_failures = max_ip_failures or getattr(settings, 'API_AUTH_MAX_IP_FAILURES', 50)
+        self.lockout_seconds = lockout_seconds or getattr(settings, 'API_AUTH_LOCKOUT_SECONDS', 15 * 60)
+
+    def _keys(self, email, ip):
+        # Hash the email so addresses aren't stored in the counters table
+        digest = hashlib.sha256(email.lower().encode()).hexdigest()
+        return f'login-failures:account:{digest}', f'login-failures:ip:{ip}'
+
+    def attempt(self, email, ip):
+        """
+        Claim an attempt for the account and the IP; False when either has
+        used up its failed attempts. Each claimed attempt counts as failed
+        unless succeeded() is called for it.
+        """
+        account_key, ip_key = self._keys(email, ip)
+        if claim_attempt(ip_key, self.max_ip_failures, self.lockout_seconds) is None:
+            return False
+        if claim_attempt(account_key, self.max_account_failures, self.lockout_seconds) is None:
+            release_attempt(ip_key)
+            return False
+        return True
+
+    def succeeded(self, email, ip):
+        """The claimed attempt logged in: clear the account's failures and return the IP's slot"""
+        account_key, ip_key = self._keys(email, ip)
+        reset_attempts(account_key)
+        release_attempt(ip_key)
+
+
+api_login_throttle = LoginThrottle()
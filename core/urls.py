@@ -15,6 +15,7 @@ urlpatterns = [
     path('verify-password-reset-otp/', views.verify_password_reset_otp, name='verify_password_reset_otp'),
     path('reset-password/', views.reset_password, name='reset_password'),
     path('check-username/', views.check_username, name='check_username'),
+    path('check-usernames/', views.check_usernames, name='check_usernames'),
     path('send-email-otp/', views.send_email_otp, name='send_email_otp'),
     path('verify-email-otp/', views.verify_email_otp, name='verify_email_otp'),
     path('send-phone-otp/', views.send_phone_otp, name='send_phone_otp'),
@@ -0,0 +1,150 @@
+"""
+Username availability
+Signup checks availability as the user types. Taken usernames are kept in a
+small in-process LRU cache, so repeated checks for the same name don't reach
+the database, and each request looks up every uncached candidate (including
+suggested alternatives) in one query against the LOWER(username) index.
+
+Only taken names are cached: a cached "available" answer could hide a signup
+made by another process. Entries expire after USERNAME_CACHE_MAX_AGE seconds
+so names freed elsewhere become available again; signals in core/signals.py
+keep this process's cache current.
+"""
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.functions import Lower
+
+from core.models import User
+
+
+MIN_LENGTH = 3
+
+# Most candidates one request may check
+MAX_BATCH = 10
+
+# Alternatives offered for a taken username
+SUGGESTION_COUNT = 3
+
+
+def normalize_username(username):
+    """Key used for case-insensitive comparison"""
+    return (username or '').strip().lower()
+
+
+class UsernameAvailability:
+    """Checks usernames against the users table with an LRU cache of taken names"""
+
+    def __init__(self, max_size=None, max_age=None):
+        self.max_size = max_size or getattr(settings, 'USERNAME_CACHE_SIZE', 10000)
+        self.max_age = max_age or getattr(settings, 'USERNAME_CACHE_MAX_AGE', 300)
+        self._taken = OrderedDict()
+        self._lock = threading.Lock()
+
+    def mark_taken(self, username):
+        key = normalize_username(username)
+        if not key:
+            return
+        with self._lock:
+            self._taken[key] = time.monotonic()
+            self._taken.move_to_end(key)
+            while len(self._taken) > self.max_size:
+                self._taken.popitem(last=False)
+
+    def forget(self, username):
+        with self._lock:
+            self._taken.pop(normalize_username(username), None)
+
+    def clear(self):
+        with self._lock:
+            self._taken.clear()
+
+    def _cached(self, key):
+        with self._lock:
+            stamp = self._taken.get(key)
+            if stamp is None:
+                return False
+            if time.monotonic() - stamp > self.max_age:
+                del self._taken[key]
+                return False
+            self._taken.move_to_end(key)
+            return True
+
+    def taken(self, usernames):
+        """Normalized keys of those `usernames` that belong to an account"""
+        keys = {normalize_username(name) for name in usernames} - {''}
+        result = {key for key in keys if self._cached(key)}
+
+        unknown = keys - result
+        if unknown:
+            found = set(
+                User.objects.annotate(username_lower=Lower('username'))
+                .filter(username_lower__in=unknown)
+                .values_list('username_lower', flat=True)
+            )
+            for key in found:
+                self.mark_taken(key)
+            result |= found
+        return result
+
+    def is_taken(self, username):
+        return bool(self.taken([username]))
+
+    def _candidates(self, username):
+        base = re.sub(r'[^\w.@+-]', '', username.strip())[:140] or 'user'
+        candidates = [f'{base}{n}' for n in range(1, 4)]
+        candidates += [f'{base}_{random.randint(10, 9999)}' for _ in range(3)]
+        return candidates
+
+    def check(self, usernames, suggest=True):
+        """
+        Availability of each username, with suggestions for taken ones
+
+        Returns a list of {'username', 'available', 'message', 'suggestions'}
+        in the given order, using at most two queries.
+        """
+        usernames = [(name or '').strip() for name in usernames][:MAX_BATCH]
+        valid = [name for name in usernames if len(name) >= MIN_LENGTH]
+        taken = self.taken(valid)
+
+        # Check every suggestion candidate at once
+        candidates = {
+            name: self._candidates(name) if suggest else []
+            for name in valid if normalize_username(name) in taken
+        }
+        taken_candidates = self.taken(c for names in candidates.values() for c in names)
+
+        results = []
+        for name in usernames:
+            if len(name) < MIN_LENGTH:
+                results.append({
+                    'username': name,
+                    'available': False,
+                    'message': f'Username must be at least {MIN_LENGTH} characters',
+                    'suggestions': [],
+                })
+            elif name in candidates:
+                suggestions = [
+                    c for c in candidates[name] if normalize_username(c) not in taken_candidates
+                ][:SUGGESTION_COUNT]
+                results.append({
+                    'username': name,
+                    'available': False,
+                    'message': 'Username already taken',
+                    'suggestions': suggestions,
+                })
+            else:
+                results.append({
+                    'username': name,
+                    'available': True,
+                    'message': 'Username is available',
+                    'suggestions': [],
+                })
+        return results
+
+
+username_availability = UsernameAvailability()
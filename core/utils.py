@@ -5,6 +5,7 @@ from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from core.mail_queue import enqueue_email
 
 
 def send_otp_email(email, otp_code, purpose='email_verification'):
@@ -17,7 +18,7 @@ def send_otp_email(email, otp_code, purpose='email_verification'):
         purpose: Purpose of OTP ('email_verification' or 'password_reset')
     
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if email was queued (or sent) successfully, False otherwise
     """
     try:
         if purpose == 'password_reset':
@@ -53,6 +54,12 @@ Best regards,
 CareConnect Team
 """
         
+        # Hand the email to the background queue so the request doesn't
+        # wait on the SMTP server
+        if getattr(settings, 'EMAIL_QUEUE_ENABLED', True):
+            enqueue_email(email, subject, message_plain)
+            return True
+        
         # Send email
         send_mail(
             subject=subject,
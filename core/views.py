@@ -6,17 +6,28 @@ Hospital/Ambulance admins are created through Django admin only
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_http_methods
-from django.utils import timezone
-from core.models import User, Hospital, AmbulanceProvider, ActivityLog, OTP
+from core.models import User
+from core.activity import log_activity
 from core.utils import send_email_with_fallback
+from core.otp import otp_store, VERIFIED, INVALID, EXPIRED, LOCKED
+from core.throttle import api_login_throttle
+from core.usernames import username_availability, MAX_BATCH as MAX_USERNAME_BATCH
 from django.http import JsonResponse
-import random
+import base64
 import re
-from datetime import timedelta
 import json
 
 
+# Messages for failed OTP checks
+OTP_ERROR_MESSAGES = {
+    INVALID: 'Invalid OTP',
+    EXPIRED: 'OTP has expired. Please request a new one.',
+    LOCKED: 'Too many incorrect attempts. Please request a new OTP.',
+}
+
+
 def landing(request):
     """Landing page"""
     if request.user.is_authenticated:
@@ -33,15 +44,23 @@ def landing(request):
 
 def check_username(request):
     """Check if username is available"""
-    username = request.GET.get('username', '').strip()
-    
-    if len(username) < 3:
-        return JsonResponse({'available': False, 'message': 'Username must be at least 3 characters'})
-    
-    if User.objects.filter(username=username).exists():
-        return JsonResponse({'available': False, 'message': 'Username already taken'})
-    
-    return JsonResponse({'available': True, 'message': 'Username is available'})
+    result = username_availability.check([request.GET.get('username', '')], suggest=False)[0]
+    return JsonResponse({'available': result['available'], 'message': result['message']})
+
+
+def check_usernames(request):
+    """
+    Check several usernames in one request (?username=a&username=b)
+
+    Taken names come back with a few available alternatives.
+    """
+    usernames = request.GET.getlist('username')
+    if not usernames or len(usernames) > MAX_USERNAME_BATCH:
+        return JsonResponse(
+            {'success': False, 'message': f'Send between 1 and {MAX_USERNAME_BATCH} usernames'},
+            status=400,
+        )
+    return JsonResponse({'success': True, 'results': username_availability.check(usernames)})
 
 
 def send_email_otp(request):
@@ -56,22 +75,11 @@ def send_email_otp(request):
             return JsonResponse({'success': False, 'message': 'Invalid email format'})
         
         # Check if email already exists
-        if User.objects.filter(email=email).exists():
+        if User.objects.with_email(email).exists():
             return JsonResponse({'success': False, 'message': 'Email already registered'})
         
-        # Generate 6-digit OTP
-        otp_code = str(random.randint(100000, 999999))
-        
-        # Delete old OTPs for this email
-        OTP.objects.filter(email=email, otp_type='email', is_verified=False).delete()
-        
-        # Create new OTP (expires in 10 minutes)
-        otp = OTP.objects.create(
-            email=email,
-            otp_code=otp_code,
-            otp_type='email',
-            expires_at=timezone.now() + timedelta(minutes=10)
-        )
+        # Generate 6-digit OTP, replacing any earlier one (expires in 10 minutes)
+        otp_code = otp_store.issue('email', email, 'email_verification', ttl_seconds=10 * 60)
         
         # Send OTP via email (SMTP or console fallback)
         email_sent = send_email_with_fallback(email, otp_code, purpose='email_verification')
@@ -91,23 +99,9 @@ def verify_email_otp(request):
         email = data.get('email', '').strip().lower()
         otp = data.get('otp', '').strip()
         
-        # Get latest unverified OTP for this email
-        otp_obj = OTP.objects.filter(
-            email=email,
-            otp_type='email',
-            otp_code=otp,
-            is_verified=False
-        ).order_by('-created_at').first()
-        
-        if not otp_obj:
-            return JsonResponse({'success': False, 'message': 'Invalid OTP'})
-        
-        if otp_obj.is_expired():
-            return JsonResponse({'success': False, 'message': 'OTP has expired. Please request a new one.'})
-        
-        # Mark OTP as verified
-        otp_obj.is_verified = True
-        otp_obj.save()
+        result = otp_store.verify('email', email, 'email_verification', otp)
+        if result != VERIFIED:
+            return JsonResponse({'success': False, 'message': OTP_ERROR_MESSAGES[result]})
         
         return JsonResponse({'success': True, 'message': 'Email verified successfully'})
     
@@ -135,19 +129,8 @@ def send_phone_otp(request):
         if User.objects.filter(phone=full_phone).exists():
             return JsonResponse({'success': False, 'message': 'Phone number already registered'})
         
-        # Generate 6-digit OTP
-        otp_code = str(random.randint(100000, 999999))
-        
-        # Delete old OTPs for this phone
-        OTP.objects.filter(phone=full_phone, otp_type='phone', is_verified=False).delete()
-        
-        # Create new OTP (expires in 10 minutes)
-        otp = OTP.objects.create(
-            phone=full_phone,
-            otp_code=otp_code,
-            otp_type='phone',
-            expires_at=timezone.now() + timedelta(minutes=10)
-        )
+        # Generate 6-digit OTP, replacing any earlier one (expires in 10 minutes)
+        otp_code = otp_store.issue('phone', full_phone, 'phone_verification', ttl_seconds=10 * 60)
         
         # In production, send OTP via SMS service (Twilio, AWS SNS, etc.)
         # For now, we'll store it and return it (for testing purposes)
@@ -168,23 +151,9 @@ def verify_phone_otp(request):
         
         full_phone = f"{country_code}{phone}"
         
-        # Get latest unverified OTP for this phone
-        otp_obj = OTP.objects.filter(
-            phone=full_phone,
-            otp_type='phone',
-            otp_code=otp,
-            is_verified=False
-        ).order_by('-created_at').first()
-        
-        if not otp_obj:
-            return JsonResponse({'success': False, 'message': 'Invalid OTP'})
-        
-        if otp_obj.is_expired():
-            return JsonResponse({'success': False, 'message': 'OTP has expired. Please request a new one.'})
-        
-        # Mark OTP as verified
-        otp_obj.is_verified = True
-        otp_obj.save()
+        result = otp_store.verify('phone', full_phone, 'phone_verification', otp)
+        if result != VERIFIED:
+            return JsonResponse({'success': False, 'message': OTP_ERROR_MESSAGES[result]})
         
         return JsonResponse({'success': True, 'message': 'Phone verified successfully'})
     
@@ -216,14 +185,14 @@ def signup(request):
         # Username validation
         if len(username) < 3:
             errors.append('Username must be at least 3 characters')
-        if User.objects.filter(username=username).exists():
+        elif username_availability.is_taken(username):
             errors.append('Username already taken')
         
         # Email validation
         email_regex = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
         if not email_regex.match(email):
             errors.append('Please enter a valid email address')
-        if User.objects.filter(email=email).exists():
+        if User.objects.with_email(email).exists():
             errors.append('Email already registered')
         
         # Phone validation
@@ -269,11 +238,11 @@ def signup(request):
             user.save()
             
             # Log activity
-            ActivityLog.objects.create(
-                user=user,
-                user_role=role,
-                action='signup',
-                details=f'New {role} account created'
+            log_activity(
+                user,
+                role,
+                'signup',
+                f'New {role} account created'
             )
             
             # Different messages based on role
@@ -304,40 +273,30 @@ def login(request):
             messages.error(request, 'Please enter both email and password')
             return render(request, 'core/login.html', {'email': email})
         
-        # Get user by email
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            messages.error(request, 'Invalid email or password')
-            return render(request, 'core/login.html', {'email': email})
-        
-        # Authenticate
-        authenticated_user = authenticate(request, username=user.username, password=password)
+        # Authenticate by email (core.backends.EmailBackend); deactivated
+        # accounts are rejected here too
+        user = authenticate(request, email=email, password=password)
         
-        if not authenticated_user:
+        if not user:
             messages.error(request, 'Invalid email or password')
             return render(request, 'core/login.html', {'email': email})
         
-        # Check if user is active
-        if not user.is_active:
-            messages.error(request, 'Your account has been deactivated')
-            return render(request, 'core/login.html', {'email': email})
-        
         # Log in the user
-        auth_login(request, authenticated_user)
+        auth_login(request, user)
         
         # Log activity
-        ActivityLog.objects.create(
-            user=user,
-            user_role=user.role,
-            action='login',
-            details='User logged in'
+        log_activity(
+            user,
+            user.role,
+            'login',
+            'User logged in'
         )
         
         # Redirect based on role
         if user.role == 'hospital':
-            # Check if user is assigned to a hospital
-            hospital = Hospital.objects.filter(owner=user).first()
+            # Check if user is assigned to a hospital (this also caches the
+            # mapping for request.tenant on later requests)
+            hospital = request.tenant
             if hospital:
                 messages.success(request, f"Welcome back, {hospital.name}!")
                 return redirect('hospital:dashboard')
@@ -348,7 +307,7 @@ def login(request):
                 
         elif user.role == 'ambulance':
             # Check if user is assigned to an ambulance provider
-            provider = AmbulanceProvider.objects.filter(owner=user).first()
+            provider = request.tenant
             if provider:
                 messages.success(request, f"Welcome back, {provider.name}!")
                 return redirect('ambulance:dashboard')
@@ -366,11 +325,11 @@ def login(request):
 def logout(request):
     """User logout"""
     if request.user.is_authenticated:
-        ActivityLog.objects.create(
-            user=request.user,
-            user_role=request.user.role,
-            action='logout',
-            details='User logged out'
+        log_activity(
+            request.user,
+            request.user.role,
+            'logout',
+            'User logged out'
         )
     auth_logout(request)
     messages.success(request, 'You have been logged out successfully')
@@ -390,27 +349,14 @@ def forgot_password(request):
             return render(request, 'core/forgot_password.html', {'email': email})
         
         # Check if user exists
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+        user = User.objects.get_by_email(email)
+        if user is None:
             # Don't reveal if email exists for security
             messages.success(request, 'If an account with that email exists, we have sent a password reset OTP.')
             return render(request, 'core/forgot_password.html')
         
-        # Generate 6-digit OTP
-        otp_code = str(random.randint(100000, 999999))
-        
-        # Delete old password reset OTPs for this email
-        OTP.objects.filter(email=email, otp_type='email', purpose='password_reset', is_verified=False).delete()
-        
-        # Create new OTP (expires in 15 minutes)
-        otp = OTP.objects.create(
-            email=email,
-            otp_code=otp_code,
-            otp_type='email',
-            purpose='password_reset',
-            expires_at=timezone.now() + timedelta(minutes=15)
-        )
+        # Generate 6-digit OTP, replacing any earlier one (expires in 15 minutes)
+        otp_code = otp_store.issue('email', email, 'password_reset', ttl_seconds=15 * 60)
         
         # Send OTP via email (SMTP or console fallback)
         email_sent = send_email_with_fallback(email, otp_code, purpose='password_reset')
@@ -444,30 +390,18 @@ def verify_password_reset_otp(request):
             messages.error(request, 'Please enter the OTP')
             return render(request, 'core/reset_password.html', {'email': email})
         
-        # Get latest unverified password reset OTP for this email
-        otp_obj = OTP.objects.filter(
-            email=email,
-            otp_type='email',
-            purpose='password_reset',
-            otp_code=otp,
-            is_verified=False
-        ).order_by('-created_at').first()
+        result = otp_store.verify('email', email, 'password_reset', otp)
         
-        if not otp_obj:
+        if result == INVALID:
             messages.error(request, 'Invalid OTP. Please check and try again.')
             return render(request, 'core/reset_password.html', {'email': email})
         
-        if otp_obj.is_expired():
-            messages.error(request, 'OTP has expired. Please request a new one.')
+        if result != VERIFIED:
+            messages.error(request, OTP_ERROR_MESSAGES[result])
             del request.session['password_reset_email']
             return redirect('core:forgot_password')
         
-        # Mark OTP as verified
-        otp_obj.is_verified = True
-        otp_obj.save()
-        
-        # Store verified OTP ID in session for password reset
-        request.session['verified_otp_id'] = otp_obj.id
+        # Mark the session as verified for password reset
         request.session['password_reset_verified'] = True
         
         # Show password reset form (reuse the same template but in reset mode)
@@ -513,9 +447,8 @@ def reset_password(request):
         })
     
     # Get user
-    try:
-        user = User.objects.get(email=email)
-    except User.DoesNotExist:
+    user = User.objects.get_by_email(email)
+    if user is None:
         messages.error(request, 'User not found')
         # Clear session
         del request.session['password_reset_email']
@@ -529,11 +462,11 @@ def reset_password(request):
     user.save()
     
     # Log activity
-    ActivityLog.objects.create(
-        user=user,
-        user_role=user.role,
-        action='password_reset',
-        details='Password reset successfully'
+    log_activity(
+        user,
+        user.role,
+        'password_reset',
+        'Password reset successfully'
     )
     
     # Clear session
@@ -556,6 +489,58 @@ def require_login(view_func):
     return wrapper
 
 
+def basic_auth_credentials(request):
+    """(email, password) from an HTTP Basic Authorization header, or None"""
+    _, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    try:
+        email, _, password = base64.b64decode(credentials, validate=True).decode('utf-8').partition(':')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return email, password
+
+
+def basic_auth_user(request):
+    """
+    Authenticate an HTTP Basic request; returns (user or None, error response or None)
+
+    Failed attempts are throttled per account and client IP (core/throttle.py).
+    """
+    credentials = basic_auth_credentials(request)
+    if credentials is None:
+        return None, JsonResponse({'error': 'Invalid credentials'}, status=401)
+    email, password = credentials
+    ip = request.META.get('REMOTE_ADDR', '')
+    if not api_login_throttle.attempt(email, ip):
+        response = JsonResponse({'error': 'Too many failed login attempts, try again later'}, status=429)
+        response['Retry-After'] = str(api_login_throttle.lockout_seconds)
+        return None, response
+    user = authenticate(request, email=email, password=password)
+    if user is None:
+        return None, JsonResponse({'error': 'Invalid credentials'}, status=401)
+    api_login_throttle.succeeded(email, ip)
+    return user, None
+
+
+def require_api_login(view_func):
+    """
+    Decorator for JSON APIs called by devices and other systems as well
+    as browsers: accepts HTTP Basic credentials (account email and
+    password) without CSRF, or a session login with its CSRF token.
+    Repeated failed Basic logins get 429 responses for a while.
+    """
+    def wrapper(request, *args, **kwargs):
+        if request.META.get('HTTP_AUTHORIZATION', '').startswith('Basic '):
+            user, error = basic_auth_user(request)
+            if error is not None:
+                return error
+            request.user = user
+            return view_func(request, *args, **kwargs)
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Please login to continue'}, status=401)
+        return csrf_protect(view_func)(request, *args, **kwargs)
+    return csrf_exempt(wrapper)
+
+
 def require_role(role):
     """Decorator to require specific role"""
     def decorator(view_func):
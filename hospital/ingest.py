@@ -0,0 +1,225 @@
+"""
+Bulk bed availability updates
+Hospital information systems push many hospitals' bed counts at once, as
+JSON or CSV rows using the field names of the update-beds form. Rows are
+validated like the form, then every changed hospital is written with one
+bulk_update() of only the changed columns, its search index row with one
+upsert and its history sample with one bulk_create(), all in a single
+transaction. bulk_update() skips Hospital.save() and the post_save
+signals, so the version counter is bumped in the same UPDATE, and live
+availability events are published here once the transaction commits.
+(The FTS index is maintained by triggers and doesn't cover bed counts.)
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.bed_history import record_bed_history
+from core.models import BED_TYPES, Hospital, HospitalSearchIndex
+from userapp.events import availability_broadcaster
+
+
+# Rows accepted in one payload
+MAX_ROWS = 5000
+
+# Payload / form field -> Hospital field
+BED_FIELDS = {
+    'total_beds': 'beds_total',
+    'icu_beds': 'beds_icu',
+    'oxygen_beds': 'beds_oxygen',
+    'ventilators': 'beds_ventilator',
+    'isolation_beds': 'beds_isolation',
+    'total_beds_capacity': 'beds_total_capacity',
+    'icu_beds_capacity': 'beds_icu_capacity',
+    'oxygen_beds_capacity': 'beds_oxygen_capacity',
+    'ventilators_capacity': 'beds_ventilator_capacity',
+    'isolation_beds_capacity': 'beds_isolation_capacity',
+}
+
+# (available field, capacity field, label) checked by validate_bed_counts
+CAPACITY_CHECKS = (
+    ('beds_total', 'beds_total_capacity', 'Total beds'),
+    ('beds_icu', 'beds_icu_capacity', 'ICU beds'),
+    ('beds_oxygen', 'beds_oxygen_capacity', 'Oxygen beds'),
+    ('beds_ventilator', 'beds_ventilator_capacity', 'Ventilators'),
+    ('beds_isolation', 'beds_isolation_capacity', 'Isolation beds'),
+)
+
+# Search index columns derived from bed counts
+INDEX_FIELDS = tuple(
+    f'{bed_type}_{suffix}' for bed_type in BED_TYPES for suffix in ('available', 'total', 'status')
+) + ('facility_mask', 'hospital_updated_at')
+
+# Row results
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+ERROR = 'error'
+
+
+class PayloadError(ValueError):
+    """The payload as a whole can't be read"""
+
+
+def validate_bed_counts(counts):
+    """
+    Error message for a dict of Hospital bed fields, or None if valid
+
+    Counts can't be negative, and availability can't exceed capacity
+    when a capacity is given.
+    """
+    if any(value < 0 for value in counts.values()):
+        return 'Bed counts cannot be negative'
+    for available, capacity, label in CAPACITY_CHECKS:
+        if counts[capacity] > 0 and counts[available] > counts[capacity]:
+            return f'{label} available cannot be greater than total capacity'
+    return None
+
+
+def parse_payload(body, content_type=''):
+    """
+    Rows (dicts) from a JSON ({"hospitals": [...]} or a list) or CSV body
+
+    Raises PayloadError if the body can't be read or has too many rows.
+    """
+    try:
+        text = body.decode('utf-8-sig') if isinstance(body, bytes) else body
+    except UnicodeDecodeError:
+        raise PayloadError('Payload must be UTF-8')
+
+    if 'csv' in content_type or not text.lstrip().startswith(('{', '[')):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            raise PayloadError('Invalid JSON')
+        rows = data.get('hospitals') if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise PayloadError('Expected {"hospitals": [...]}')
+
+    if len(rows) > MAX_ROWS:
+        raise PayloadError(f'At most {MAX_ROWS} rows per payload')
+    return rows
+
+
+def _parse_row(row):
+    """(hospital_id, {Hospital field: count}) of one row; raises ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object')
+    try:
+        hospital_id = int(str(row.get('id', '')).strip())
+    except ValueError:
+        raise ValueError('Missing or invalid hospital id')
+
+    counts = {}
+    for name, field in BED_FIELDS.items():
+        value = row.get(name)
+        if value is None or str(value).strip() == '':
+            continue
+        try:
+            counts[field] = int(str(value).strip())
+        except ValueError:
+            raise ValueError(f'{name} must be a whole number')
+    if not counts:
+        raise ValueError('No bed counts given')
+    return hospital_id, counts
+
+
+def apply_bed_updates(rows, user=None):
+    """
+    Validate and apply bed count rows; returns one result dict per row
+
+    Each row has the hospital 'id' and any of the BED_FIELDS keys; omitted
+    counts keep their current value. With a `user` who isn't staff, only
+    hospitals they own can be updated. Results have 'row' (0-based), 'id',
+    'status' (UPDATED, UNCHANGED or ERROR) and 'changed' fields or 'error'.
+    """
+    results = []
+    parsed = []
+    for position, row in enumerate(rows):
+        try:
+            hospital_id, counts = _parse_row(row)
+        except ValueError as e:
+            results.append({'row': position, 'id': row.get('id') if isinstance(row, dict) else None,
+                            'status': ERROR, 'error': str(e)})
+            continue
+        parsed.append((position, hospital_id, counts))
+
+    # Rows are locked and re-read so a concurrent form save can't be overwritten
+    with transaction.atomic():
+        hospitals = Hospital.objects.select_for_update()
+        if user is not None and not user.is_staff:
+            hospitals = hospitals.filter(owner=user)
+        hospitals = hospitals.in_bulk([hospital_id for _, hospital_id, _ in parsed])
+        changed_hospitals, changed_fields, now = _apply(parsed, hospitals, results)
+        if changed_hospitals:
+            _write(changed_hospitals, changed_fields, now)
+
+    results.sort(key=lambda result: result['row'])
+    return results
+
+
+def _apply(parsed, hospitals, results):
+    """Validate parsed rows against `hospitals` and set the changed counts"""
+    now = timezone.now()
+    changed_hospitals = []
+    changed_fields = set()
+    seen = set()
+    for position, hospital_id, counts in parsed:
+        result = {'row': position, 'id': hospital_id}
+        results.append(result)
+        hospital = hospitals.get(hospital_id)
+        if hospital is None:
+            result.update(status=ERROR, error='Hospital not found')
+            continue
+        if hospital_id in seen:
+            result.update(status=ERROR, error='Hospital appears more than once')
+            continue
+        seen.add(hospital_id)
+
+        merged = {field: getattr(hospital, field) for field in BED_FIELDS.values()}
+        merged.update(counts)
+        error = validate_bed_counts(merged)
+        if error:
+            result.update(status=ERROR, error=error)
+            continue
+
+        changed = [field for field, value in counts.items() if getattr(hospital, field) != value]
+        if not changed:
+            result['status'] = UNCHANGED
+            continue
+        for field in changed:
+            setattr(hospital, field, counts[field])
+        hospital.updated_at = now
+        changed_hospitals.append(hospital)
+        changed_fields.update(changed)
+        result.update(status=UPDATED, changed=[name for name, field in BED_FIELDS.items() if field in changed])
+    return changed_hospitals, changed_fields, now
+
+
+def _write(hospitals, fields, now):
+    """Write changed hospitals, their search index rows and history samples"""
+    for hospital in hospitals:
+        hospital.version = F('version') + 1
+    indexes = [HospitalSearchIndex.build_for(hospital) for hospital in hospitals]
+
+    Hospital.objects.bulk_update(hospitals, [*sorted(fields), 'version', 'updated_at'], batch_size=500)
+    HospitalSearchIndex.objects.bulk_create(
+        indexes, update_conflicts=True, unique_fields=['hospital'], update_fields=INDEX_FIELDS,
+        batch_size=500,
+    )
+    record_bed_history(hospitals, at=now)
+
+    versions = dict(Hospital.objects.filter(pk__in=[h.pk for h in hospitals]).values_list('id', 'version'))
+    for hospital, index in zip(hospitals, indexes):
+        hospital.version = versions[hospital.pk]
+        hospital.search_index = index
+
+    def publish():
+        for hospital in hospitals:
+            availability_broadcaster.publish(hospital)
+    transaction.on_commit(publish)
@@ -0,0 +1,186 @@
+"""
+Tests for the hospital app
+"""
+import base64
+import json
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import User, Hospital, AttemptCounter, BedHistory
+from core.throttle import LoginThrottle
+from hospital.ingest import MAX_ROWS, parse_payload, PayloadError
+
+
+def basic_auth(email, password):
+    token = base64.b64encode(f'{email}:{password}'.encode()).decode()
+    return {'HTTP_AUTHORIZATION': f'Basic {token}'}
+
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=False, PASSWORD_HASHERS=FAST_HASHERS)
+class BulkBedUpdateTests(TestCase):
+    """Bed counts pushed by hospital information systems"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            'hospital', 'admin@city.example.com', 'password123', phone='1', role='hospital'
+        )
+        self.other_owner = User.objects.create_user(
+            'other', 'admin@other.example.com', 'password123', phone='2', role='hospital'
+        )
+        self.hospital = self.add_hospital(self.owner)
+        self.other_hospital = self.add_hospital(self.other_owner)
+
+    def add_hospital(self, owner):
+        return Hospital.objects.create(
+            name=f'{owner.username} hospital', address='Main Road', city='Pune',
+            email=owner.email, phone='3', owner=owner,
+            beds_icu=2, beds_icu_capacity=10, beds_total=20, beds_total_capacity=50,
+        )
+
+    def post(self, payload, content_type='application/json', **credentials):
+        if not isinstance(payload, str):
+            payload = json.dumps(payload)
+        return self.client.post(
+            reverse('hospital:bulk_update_beds'), payload, content_type=content_type,
+            **(credentials or basic_auth('admin@city.example.com', 'password123')),
+        )
+
+    def test_valid_rows_are_applied(self):
+        response = self.post({'hospitals': [{'id': self.hospital.id, 'icu_beds': 5, 'total_beds': '20'}]})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['updated'], 1)
+        self.assertEqual(data['results'][0]['changed'], ['icu_beds'])
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.beds_icu, 5)
+        self.assertEqual(self.hospital.version, 2)
+        self.assertEqual(self.hospital.search_index.icu_available, 5)
+        self.assertEqual(BedHistory.objects.filter(hospital=self.hospital).latest('recorded_at').beds_icu, 5)
+
+    def test_invalid_rows_are_rejected_individually(self):
+        over_capacity, negative = self.add_hospital(self.owner), self.add_hospital(self.owner)
+
+        response = self.post([
+            {'id': self.hospital.id, 'icu_beds': 3},
+            {'id': over_capacity.id, 'icu_beds': 11},
+            {'id': negative.id, 'oxygen_beds': -1},
+            {'id': 'abc', 'icu_beds': 1},
+            {'id': self.hospital.id, 'icu_beds': 'many'},
+            {'id': self.hospital.id},
+            {'id': self.other_hospital.id, 'icu_beds': 1},
+            {'id': self.hospital.id, 'icu_beds': 4},
+        ])
+
+        data = response.json()
+        self.assertEqual((data['updated'], data['errors']), (1, 7))
+        self.assertEqual([result.get('error') for result in data['results']], [
+            None,
+            'ICU beds available cannot be greater than total capacity',
+            'Bed counts cannot be negative',
+            'Missing or invalid hospital id',
+            'icu_beds must be a whole number',
+            'No bed counts given',
+            'Hospital not found',
+            'Hospital appears more than once',
+        ])
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.beds_icu, 3)
+        for hospital in (over_capacity, negative, self.other_hospital):
+            hospital.refresh_from_db()
+            self.assertEqual((hospital.beds_icu, hospital.beds_oxygen, hospital.version), (2, 0, 1))
+
+    def test_csv_payload(self):
+        response = self.post(f'id,icu_beds,ventilators\n{self.hospital.id},7,\n', content_type='text/csv')
+
+        self.assertEqual(response.json()['updated'], 1)
+        self.hospital.refresh_from_db()
+        self.assertEqual((self.hospital.beds_icu, self.hospital.beds_ventilator), (7, 0))
+
+    def test_payload_row_limit(self):
+        rows = [{'id': self.hospital.id, 'icu_beds': 1}]
+        self.assertEqual(len(parse_payload(json.dumps(rows * MAX_ROWS))), MAX_ROWS)
+        with self.assertRaisesMessage(PayloadError, f'At most {MAX_ROWS} rows'):
+            parse_payload(json.dumps(rows * (MAX_ROWS + 1)))
+
+        response = self.post({'hospitals': rows * (MAX_ROWS + 1)})
+
+        self.assertEqual(response.status_code, 400)
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.beds_icu, 2)
+
+    def test_unreadable_payloads(self):
+        self.assertEqual(self.post('{"hospitals": ').status_code, 400)
+        self.assertEqual(self.post({'rows': []}).status_code, 400)
+
+    def test_other_roles_are_refused(self):
+        User.objects.create_user('patient', 'patient@example.com', 'password123', phone='4', role='user')
+
+        response = self.post([], **basic_auth('patient@example.com', 'password123'))
+
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(
+    API_AUTH_MAX_ACCOUNT_FAILURES=3, API_AUTH_MAX_IP_FAILURES=5, API_AUTH_LOCKOUT_SECONDS=600,
+    PASSWORD_HASHERS=FAST_HASHERS,
+)
+class APILoginThrottleTests(TestCase):
+    """Failed HTTP Basic logins on the API endpoints"""
+
+    def setUp(self):
+        # The module-level throttle read its limits at import time
+        patcher = mock.patch('core.views.api_login_throttle', LoginThrottle())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for number in range(3):
+            User.objects.create_user(
+                f'hospital{number}', f'admin{number}@example.com', 'password123', phone='1', role='hospital'
+            )
+
+    def login(self, email, password='password123', ip='10.0.0.1'):
+        return self.client.post(
+            reverse('hospital:bulk_update_beds'), '[]', content_type='application/json',
+            REMOTE_ADDR=ip, **basic_auth(email, password),
+        )
+
+    def test_account_is_locked_after_max_failures(self):
+        for _ in range(3):
+            self.assertEqual(self.login('admin0@example.com', 'wrong').status_code, 401)
+
+        response = self.login('admin0@example.com')
+
+        # Refused without checking the (right) password
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '600')
+        # From another address too
+        self.assertEqual(self.login('ADMIN0@example.com', ip='10.0.0.2').status_code, 429)
+        self.assertEqual(self.login('admin1@example.com').status_code, 200)
+
+    def test_success_clears_the_account_failures(self):
+        for _ in range(2):
+            self.login('admin0@example.com', 'wrong')
+        self.assertEqual(self.login('admin0@example.com').status_code, 200)
+
+        for _ in range(2):
+            self.assertEqual(self.login('admin0@example.com', 'wrong').status_code, 401)
+        self.assertEqual(self.login('admin0@example.com').status_code, 200)
+
+    def test_ip_is_locked_after_max_failures_across_accounts(self):
+        for email in ['admin0@example.com'] * 2 + ['admin1@example.com'] * 2 + ['nobody@example.com']:
+            self.assertEqual(self.login(email, 'wrong').status_code, 401)
+
+        self.assertEqual(self.login('admin2@example.com').status_code, 429)
+        self.assertEqual(self.login('admin2@example.com', ip='10.0.0.2').status_code, 200)
+
+    def test_successful_logins_do_not_use_up_the_ip(self):
+        for _ in range(10):
+            self.assertEqual(self.login('admin0@example.com').status_code, 200)
+
+        ip_counter = AttemptCounter.objects.get(key='login-failures:ip:10.0.0.1')
+        self.assertEqual(ip_counter.count, 0)
@@ -9,6 +9,7 @@ app_name = 'hospital'
 urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('update-beds/', views.update_beds, name='update_beds'),
+    path('api/beds/', views.bulk_update_beds, name='bulk_update_beds'),
     path('update-facilities/', views.update_facilities, name='update_facilities'),
     path('update-pricing/', views.update_pricing, name='update_pricing'),
     path('update-insurances/', views.update_insurances, name='update_insurances'),
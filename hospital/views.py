@@ -5,19 +5,27 @@ Updated to use Django ORM
 """
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
-from core.views import require_role
-from core.models import Hospital, ActivityLog
+from core.views import require_api_login, require_role
+from core.activity import log_activity, activity_log_writer
+from core.archive import archived_months, parse_month, read_archived_logs
+from core.bed_history import record_bed_history
+from hospital.ingest import (
+    apply_bed_updates, parse_payload, validate_bed_counts, PayloadError, ERROR, UNCHANGED, UPDATED,
+)
+from core.models import ActivityLog, HOSPITAL_FACILITIES
+from userapp.availability import search_index_for
 from django.utils import timezone
+from collections import Counter
 
 
 @require_role('hospital')
 def dashboard(request):
     """Hospital admin dashboard overview"""
-    # Get hospital for this user
-    try:
-        hospital = Hospital.objects.get(owner=request.user)
-    except Hospital.DoesNotExist:
+    # Hospital managed by this user (resolved by TenantMiddleware)
+    hospital = request.tenant
+    if not hospital:
         messages.error(request, 'Hospital information not found. Please contact administrator.')
         return redirect('core:login')
     
@@ -39,9 +47,8 @@ def dashboard(request):
 @require_http_methods(["GET", "POST"])
 def update_beds(request):
     """Update bed availability"""
-    try:
-        hospital = Hospital.objects.get(owner=request.user)
-    except Hospital.DoesNotExist:
+    hospital = request.tenant
+    if not hospital:
         messages.error(request, 'Hospital not found')
         return redirect('core:login')
     
@@ -60,29 +67,22 @@ def update_beds(request):
         ventilators_capacity = int(request.POST.get('ventilators_capacity', 0) or 0)
         isolation_beds_capacity = int(request.POST.get('isolation_beds_capacity', 0) or 0)
         
-        # Validate
-        if (
-            total_beds < 0 or icu_beds < 0 or oxygen_beds < 0 or ventilators < 0 or isolation_beds < 0 or
-            total_beds_capacity < 0 or icu_beds_capacity < 0 or oxygen_beds_capacity < 0 or
-            ventilators_capacity < 0 or isolation_beds_capacity < 0
-        ):
-            messages.error(request, 'Bed counts cannot be negative')
-            return redirect('hospital:update_beds')
-
-        # Validate availability cannot exceed capacity (when capacity is provided)
-        def _validate_capacity(available, capacity, label):
-            if capacity > 0 and available > capacity:
-                messages.error(request, f'{label} available cannot be greater than total capacity')
-                return False
-            return True
-
-        if not (
-            _validate_capacity(total_beds, total_beds_capacity, 'Total beds') and
-            _validate_capacity(icu_beds, icu_beds_capacity, 'ICU beds') and
-            _validate_capacity(oxygen_beds, oxygen_beds_capacity, 'Oxygen beds') and
-            _validate_capacity(ventilators, ventilators_capacity, 'Ventilators') and
-            _validate_capacity(isolation_beds, isolation_beds_capacity, 'Isolation beds')
-        ):
+        # Validate: no negative counts, and availability cannot exceed
+        # capacity (when capacity is provided)
+        error = validate_bed_counts({
+            'beds_total': total_beds,
+            'beds_icu': icu_beds,
+            'beds_oxygen': oxygen_beds,
+            'beds_ventilator': ventilators,
+            'beds_isolation': isolation_beds,
+            'beds_total_capacity': total_beds_capacity,
+            'beds_icu_capacity': icu_beds_capacity,
+            'beds_oxygen_capacity': oxygen_beds_capacity,
+            'beds_ventilator_capacity': ventilators_capacity,
+            'beds_isolation_capacity': isolation_beds_capacity,
+        })
+        if error:
+            messages.error(request, error)
             return redirect('hospital:update_beds')
         
         # Update hospital
@@ -98,13 +98,14 @@ def update_beds(request):
         hospital.beds_ventilator_capacity = ventilators_capacity
         hospital.beds_isolation_capacity = isolation_beds_capacity
         hospital.save()
+        record_bed_history([hospital])
         
         # Log activity
-        ActivityLog.objects.create(
-            user=request.user,
-            user_role='hospital',
-            action='update_beds',
-            details=(
+        log_activity(
+            request.user,
+            'hospital',
+            'update_beds',
+            (
                 f'Updated bed availability - '
                 f'Total: {total_beds}/{total_beds_capacity}, '
                 f'ICU: {icu_beds}/{icu_beds_capacity}, '
@@ -135,31 +136,54 @@ def update_beds(request):
     return render(request, 'hospital/update_beds.html', context)
 
 
+@require_api_login
+@require_http_methods(["POST"])
+def bulk_update_beds(request):
+    """
+    Update many hospitals' bed counts from one JSON or CSV payload
+    
+    Hospital information systems authenticate with HTTP Basic (account
+    email and password); signed-in browsers use their session and CSRF
+    token. Accounts that aren't staff can update only hospitals they own.
+    """
+    user = request.user
+    if user.role != 'hospital' and not user.is_staff:
+        return JsonResponse({'error': 'You do not have permission to update bed counts'}, status=403)
+    
+    try:
+        rows = parse_payload(request.body, request.content_type)
+    except PayloadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    results = apply_bed_updates(rows, user)
+    summary = Counter(result['status'] for result in results)
+    if summary[UPDATED]:
+        log_activity(
+            user,
+            'hospital',
+            'bulk_update_beds',
+            f'Updated bed availability of {summary[UPDATED]} hospitals ({summary[ERROR]} rows rejected)'
+        )
+    
+    return JsonResponse({
+        'updated': summary[UPDATED],
+        'unchanged': summary[UNCHANGED],
+        'errors': summary[ERROR],
+        'results': results,
+    })
+
+
 @require_role('hospital')
 @require_http_methods(["GET", "POST"])
 def update_facilities(request):
     """Update hospital facilities"""
-    try:
-        hospital = Hospital.objects.get(owner=request.user)
-    except Hospital.DoesNotExist:
+    hospital = request.tenant
+    if not hospital:
         messages.error(request, 'Hospital not found')
         return redirect('core:login')
     
-    # Available facilities
-    available_facilities = [
-        {'id': 'icu', 'name': 'ICU (Intensive Care Unit)', 'desc': 'Critical care unit'},
-        {'id': 'nicu', 'name': 'NICU (Neonatal ICU)', 'desc': 'Newborn intensive care'},
-        {'id': 'emergency', 'name': 'Emergency Ward', 'desc': '24/7 emergency services'},
-        {'id': 'operation_theatre', 'name': 'Operation Theatre', 'desc': 'Surgical facilities'},
-        {'id': 'diagnostic_lab', 'name': 'Diagnostic Lab', 'desc': 'Blood tests, pathology'},
-        {'id': 'radiology', 'name': 'Radiology (X-Ray)', 'desc': 'X-ray imaging'},
-        {'id': 'ct_scan', 'name': 'CT Scan', 'desc': 'CT imaging'},
-        {'id': 'mri', 'name': 'MRI', 'desc': 'MRI imaging'},
-        {'id': 'pharmacy', 'name': 'Pharmacy', 'desc': '24/7 pharmacy'},
-        {'id': 'blood_bank', 'name': 'Blood Bank', 'desc': 'Blood storage and transfusion'},
-        {'id': 'ambulance', 'name': 'Ambulance Service', 'desc': 'Emergency transport'},
-        {'id': 'cafeteria', 'name': 'Cafeteria', 'desc': 'Food services'},
-    ]
+    # Available facilities (canonical registry)
+    available_facilities = HOSPITAL_FACILITIES
     
     if request.method == 'POST':
         # Get selected facilities
@@ -173,11 +197,11 @@ def update_facilities(request):
         hospital.save()
         
         # Log activity
-        ActivityLog.objects.create(
-            user=request.user,
-            user_role='hospital',
-            action='update_facilities',
-            details=f'Updated facilities: {", ".join(selected_facilities)}'
+        log_activity(
+            request.user,
+            'hospital',
+            'update_facilities',
+            f'Updated facilities: {", ".join(selected_facilities)}'
         )
         
         messages.success(request, 'Facilities updated successfully!')
@@ -186,7 +210,7 @@ def update_facilities(request):
     context = {
         'hospital': hospital,
         'available_facilities': available_facilities,
-        'current_facilities': hospital.get_facilities_list()
+        'current_facilities': search_index_for(hospital).declared_facility_ids()
     }
     return render(request, 'hospital/update_facilities.html', context)
 
@@ -195,9 +219,8 @@ def update_facilities(request):
 @require_http_methods(["GET", "POST"])
 def update_pricing(request):
     """Update hospital pricing"""
-    try:
-        hospital = Hospital.objects.get(owner=request.user)
-    except Hospital.DoesNotExist:
+    hospital = request.tenant
+    if not hospital:
         messages.error(request, 'Hospital not found')
         return redirect('core:login')
     
@@ -225,11 +248,11 @@ def update_pricing(request):
         hospital.save()
         
         # Log activity
-        ActivityLog.objects.create(
-            user=request.user,
-            user_role='hospital',
-            action='update_pricing',
-            details=f'Updated pricing - General: ₹{general_bed}, ICU: ₹{icu_bed}, Oxygen: ₹{oxygen_bed}, Ventilator: ₹{ventilator}, Isolation: ₹{isolation_bed}'
+        log_activity(
+            request.user,
+            'hospital',
+            'update_pricing',
+            f'Updated pricing - General: ₹{general_bed}, ICU: ₹{icu_bed}, Oxygen: ₹{oxygen_bed}, Ventilator: ₹{ventilator}, Isolation: ₹{isolation_bed}'
         )
         
         messages.success(request, 'Pricing updated successfully!')
@@ -246,9 +269,8 @@ def update_pricing(request):
 @require_http_methods(["GET", "POST"])
 def update_insurances(request):
     """Update accepted insurance providers"""
-    try:
-        hospital = Hospital.objects.get(owner=request.user)
-    except Hospital.DoesNotExist:
+    hospital = request.tenant
+    if not hospital:
         messages.error(request, 'Hospital not found')
         return redirect('core:login')
     
@@ -284,11 +306,11 @@ def update_insurances(request):
         hospital.save()
         
         # Log activity
-        ActivityLog.objects.create(
-            user=request.user,
-            user_role='hospital',
-            action='update_insurances',
-            details=f'Updated insurance providers: {", ".join(selected_insurances) if selected_insurances else "None"}'
+        log_activity(
+            request.user,
+            'hospital',
+            'update_insurances',
+            f'Updated insurance providers: {", ".join(selected_insurances) if selected_insurances else "None"}'
         )
         
         messages.success(request, 'Insurance providers updated successfully!')
@@ -308,10 +330,20 @@ def update_insurances(request):
 @require_role('hospital')
 def activity_logs(request):
     """View activity logs"""
-    # Get logs for this user
-    logs = ActivityLog.objects.filter(user=request.user).order_by('-timestamp')[:50]
+    # An archived month, if one was picked; otherwise the recent entries
+    selected_month = parse_month(request.GET.get('month'))
+    if selected_month:
+        logs = read_archived_logs(*selected_month, user_id=request.user.id)
+    else:
+        # Write out queued entries so the user's latest actions show up
+        activity_log_writer.flush()
+        
+        # Get logs for this user
+        logs = ActivityLog.objects.filter(user=request.user).order_by('-timestamp')[:50]
     
     context = {
+        'archived_months': archived_months(),
+        'selected_month': request.GET.get('month', '') if selected_month else '',
         'logs': logs
     }
     return render(request, 'hospital/activity_logs.html', context)
@@ -320,10 +352,7 @@ def activity_logs(request):
 @require_role('hospital')
 def help_support(request):
     """Help and support page"""
-    try:
-        hospital = Hospital.objects.get(owner=request.user)
-    except Hospital.DoesNotExist:
-        hospital = None
+    hospital = request.tenant or None
     
     context = {
         'hospital': hospital
@@ -146,7 +146,13 @@ function goToComparison() {
         // If 2-4 hospitals selected, go to compare page
         // Build URL with hospital IDs
         const ids = selectedHospitals.map(h => h.id).join(',');
-        window.location.href = `/user/compare/?ids=${ids}`;
+        // Carry the user's location along so distances can be shown
+        const params = new URLSearchParams(window.location.search);
+        let coords = '';
+        if (params.get('lat') && params.get('lng')) {
+            coords = `&lat=${encodeURIComponent(params.get('lat'))}&lng=${encodeURIComponent(params.get('lng'))}`;
+        }
+        window.location.href = `/user/compare/?ids=${ids}${coords}`;
     }
 }
 
@@ -165,6 +171,25 @@ function viewOnMap(hospitalId) {
     console.log(`Viewing hospital ${hospitalId} on map`);
 }
 
+// Fill the hidden lat/lng search inputs from the browser's geolocation
+function fillUserCoordinates(onReady) {
+    const latInput = document.getElementById('lat');
+    const lngInput = document.getElementById('lng');
+    if (!latInput || !lngInput || !navigator.geolocation) return;
+
+    navigator.geolocation.getCurrentPosition(
+        (position) => {
+            latInput.value = position.coords.latitude.toFixed(6);
+            lngInput.value = position.coords.longitude.toFixed(6);
+            if (typeof onReady === 'function') onReady();
+        },
+        () => {
+            // Permission denied or unavailable; search falls back to text location
+        },
+        { maximumAge: 300000, timeout: 10000 }
+    );
+}
+
 // Scroll to search
 function scrollToSearch() {
     window.scrollTo({ top: 0, behavior: 'smooth' });
@@ -187,29 +212,97 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     });
 
-    // Live availability polling (results page)
+    // Live availability updates (results page)
     // Updates visible hospital cards without a full page refresh.
     try {
         const hospitalCards = Array.from(document.querySelectorAll('[data-hospital-id]'));
         const hospitalIds = hospitalCards.map(el => el.getAttribute('data-hospital-id')).filter(Boolean);
         if (hospitalIds.length > 0) {
-            startLiveAvailabilityPolling(hospitalIds);
+            startLiveAvailabilityStream(hospitalIds);
         }
     } catch (e) {
-        console.warn('Live availability polling init failed:', e);
+        console.warn('Live availability init failed:', e);
     }
 });
 
+// Active live-availability connection (EventSource or polling timer)
+const liveAvailability = { source: null, timer: null };
+
+function stopLiveAvailability() {
+    if (liveAvailability.source) {
+        liveAvailability.source.close();
+        liveAvailability.source = null;
+    }
+    if (liveAvailability.timer) {
+        clearInterval(liveAvailability.timer);
+        liveAvailability.timer = null;
+    }
+}
+
+// Re-subscribe after cards were added to the page (e.g. "load more")
+function restartLiveAvailability() {
+    stopLiveAvailability();
+    const hospitalIds = Array.from(document.querySelectorAll('[data-hospital-id]'))
+        .map(el => el.getAttribute('data-hospital-id')).filter(Boolean);
+    if (hospitalIds.length > 0) {
+        startLiveAvailabilityStream(hospitalIds);
+    }
+}
+
+// Subscribe to pushed availability changes; fall back to polling if the
+// server can't stream (e.g. not running under ASGI) or the browser lacks SSE.
+function startLiveAvailabilityStream(hospitalIds) {
+    if (!window.EventSource) {
+        startLiveAvailabilityPolling(hospitalIds);
+        return;
+    }
+
+    const endpoint = `/user/live-availability/stream/?ids=${encodeURIComponent(hospitalIds.join(','))}`;
+    const source = new EventSource(endpoint);
+    liveAvailability.source = source;
+    let opened = false;
+
+    source.addEventListener('open', () => {
+        opened = true;
+    });
+
+    source.addEventListener('availability', (event) => {
+        try {
+            updateHospitalCardAvailability(JSON.parse(event.data));
+        } catch (e) {
+            // ignore malformed events
+        }
+    });
+
+    source.addEventListener('error', () => {
+        // Errors after the stream opened are reconnected by EventSource itself
+        if (!opened) {
+            source.close();
+            liveAvailability.source = null;
+            startLiveAvailabilityPolling(hospitalIds);
+        }
+    });
+}
+
 function startLiveAvailabilityPolling(hospitalIds) {
     const endpoint = `/user/live-availability/?ids=${encodeURIComponent(hospitalIds.join(','))}`;
+    // Delta protocol: only hospitals changed since the watermark are returned,
+    // and a matching ETag gets an empty 304.
+    let etag = null;
+    let watermark = null;
 
     async function tick() {
         try {
-            const res = await fetch(endpoint, { headers: { 'Accept': 'application/json' } });
-            if (!res.ok) return;
+            const url = watermark ? `${endpoint}&since=${encodeURIComponent(watermark)}` : endpoint;
+            const headers = { 'Accept': 'application/json' };
+            if (etag) headers['If-None-Match'] = etag;
+            const res = await fetch(url, { headers, cache: 'no-store' });
+            if (res.status === 304 || !res.ok) return;
             const data = await res.json();
             if (!data || !Array.isArray(data.hospitals)) return;
             data.hospitals.forEach(updateHospitalCardAvailability);
+            etag = res.headers.get('ETag');
+            watermark = data.watermark || watermark;
         } catch (e) {
             // swallow errors; next tick will retry
         }
@@ -217,7 +310,41 @@ function startLiveAvailabilityPolling(hospitalIds) {
 
     // Initial fetch + then poll
     tick();
-    setInterval(tick, 5000);
+    liveAvailability.timer = setInterval(tick, 5000);
+}
+
+// Fetch the next page of search results and append it to the list
+async function loadMoreHospitals() {
+    const button = document.getElementById('loadMoreBtn');
+    const list = document.getElementById('listViewContainer');
+    if (!button || !list) return;
+
+    const params = new URLSearchParams(window.location.search);
+    params.set('cursor', button.dataset.nextCursor);
+    params.delete('stream');
+    button.disabled = true;
+
+    try {
+        const res = await fetch(`/user/search/more/?${params.toString()}`, { headers: { 'Accept': 'application/json' } });
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const data = await res.json();
+
+        list.insertAdjacentHTML('beforeend', data.html);
+        if (typeof onHospitalsLoaded === 'function') {
+            onHospitalsLoaded(data.hospitals);
+        }
+        restartLiveAvailability();
+
+        if (data.next_cursor) {
+            button.dataset.nextCursor = data.next_cursor;
+            button.disabled = false;
+        } else {
+            button.parentElement.remove();
+        }
+    } catch (e) {
+        console.warn('Loading more hospitals failed:', e);
+        button.disabled = false;
+    }
 }
 
 function updateHospitalCardAvailability(hospital) {
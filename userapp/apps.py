@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UserappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userapp'
+
+    def ready(self):
+        from userapp import signals  # noqa: F401
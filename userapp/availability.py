@@ -0,0 +1,49 @@
+"""
+Bed availability helpers shared by the user-facing views and live updates
+"""
+from datetime import datetime, timedelta
+
+from core.models import HospitalSearchIndex
+
+
+def search_index_for(hospital):
+    """
+    The hospital's search index row, computed on the fly if it is missing
+    (e.g. rows created by bulk imports before rebuild_search_index ran)
+    """
+    index = getattr(hospital, 'search_index', None)
+    if index is None:
+        index = HospitalSearchIndex.build_for(hospital)
+    return index
+
+
+def bed_availability(hospital):
+    """Available/total/status for each bed type of a hospital"""
+    return search_index_for(hospital).bed_availability()
+
+
+def availability_payload(hospital):
+    """Payload sent to the results page for live availability updates"""
+    return {
+        'id': str(hospital.id),
+        'beds': bed_availability(hospital),
+        'updated_at': hospital.updated_at.isoformat() if hospital.updated_at else None,
+    }
+
+
+def last_updated_text(updated_at, default='just now'):
+    """Human-readable age of an update, e.g. '5 minutes ago'"""
+    if not updated_at:
+        return default
+    time_diff = datetime.now(updated_at.tzinfo) - updated_at
+    if time_diff < timedelta(minutes=1):
+        return "just now"
+    elif time_diff < timedelta(hours=1):
+        minutes = int(time_diff.total_seconds() / 60)
+        return f"{minutes} minute{'s' if minutes > 1 else ''} ago"
+    elif time_diff < timedelta(days=1):
+        hours = int(time_diff.total_seconds() / 3600)
+        return f"{hours} hour{'s' if hours > 1 else ''} ago"
+    else:
+        days = time_diff.days
+        return f"{days} day{'s' if days > 1 else ''} ago"
@@ -0,0 +1,103 @@
+"""
+Hospital comparison
+The compare page and the comparison API load every requested hospital with
+a single in_bulk() query joined to its search index, so all of them are
+read from one snapshot and bed counts are the same precomputed effective
+totals the results page shows.
+
+comparison_matrix() is column-oriented: one list per metric, aligned with
+`ids`, together with the metric's min, max and each hospital's rank, all
+computed in one sort per column.
+"""
+from core.models import BED_TYPES, Hospital
+from userapp.availability import bed_availability
+from userapp.geo import hospital_distance_km
+
+
+# Hospitals shown side by side on the compare page
+MAX_PAGE_HOSPITALS = 4
+
+# Hospitals compared in one API request
+MAX_API_HOSPITALS = 50
+
+
+def parse_hospital_ids(value):
+    """
+    Ids from a comma-separated string, in order and without duplicates
+
+    Returns (ids, invalid) where `invalid` lists the tokens that aren't ids.
+    """
+    ids, invalid, seen = [], [], set()
+    for token in value.split(','):
+        token = token.strip()
+        if not token:
+            continue
+        try:
+            hospital_id = int(token)
+        except ValueError:
+            invalid.append(token)
+            continue
+        if hospital_id not in seen:
+            seen.add(hospital_id)
+            ids.append(hospital_id)
+    return ids, invalid
+
+
+def load_hospitals(ids):
+    """The hospitals among `ids` that exist, in the same order, from one query"""
+    found = Hospital.objects.select_related('search_index').in_bulk(ids)
+    return [found[hospital_id] for hospital_id in ids if hospital_id in found]
+
+
+def bed_percentage(available, total):
+    return available / total * 100 if total > 0 else 0
+
+
+def _column(values, higher_is_better=True):
+    """Min, max and competition rank (1, 2, 2, 4) of one metric; None is unranked"""
+    known = sorted((value for value in values if value is not None), reverse=higher_is_better)
+    first_position = {}
+    for position, value in enumerate(known, 1):
+        first_position.setdefault(value, position)
+    return {
+        'values': values,
+        'min': known[-1 if higher_is_better else 0] if known else None,
+        'max': known[0 if higher_is_better else -1] if known else None,
+        'rank': [first_position.get(value) for value in values],
+        'higher_is_better': higher_is_better,
+    }
+
+
+def comparison_matrix(hospitals, lat=None, lng=None):
+    """
+    Column-oriented comparison of `hospitals`
+
+    `metrics` maps a metric name ('icu_available', 'icu_total',
+    'icu_percentage', ... and 'distance_km' when (lat, lng) is given) to
+    its column; the hospital at ids[i] has values[i] and rank[i].
+    """
+    beds = [bed_availability(hospital) for hospital in hospitals]
+    metrics = {}
+    for bed_type in BED_TYPES:
+        available = [hospital_beds[bed_type]['available'] for hospital_beds in beds]
+        total = [hospital_beds[bed_type]['total'] for hospital_beds in beds]
+        metrics[f'{bed_type}_available'] = _column(available)
+        metrics[f'{bed_type}_total'] = _column(total)
+        metrics[f'{bed_type}_percentage'] = _column(
+            [round(bed_percentage(a, t), 1) for a, t in zip(available, total)]
+        )
+    if lat is not None and lng is not None:
+        metrics['distance_km'] = _column(
+            [hospital_distance_km(hospital, lat, lng) for hospital in hospitals], higher_is_better=False
+        )
+
+    return {
+        'ids': [hospital.id for hospital in hospitals],
+        'names': [hospital.name for hospital in hospitals],
+        'cities': [hospital.city for hospital in hospitals],
+        'types': [hospital.type for hospital in hospitals],
+        'updated_at': [
+            hospital.updated_at.isoformat() if hospital.updated_at else None for hospital in hospitals
+        ],
+        'metrics': metrics,
+    }
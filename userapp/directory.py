@@ -0,0 +1,56 @@
+"""
+Ambulance directory queries
+Providers and their bookable ambulances are loaded with a fixed number of
+queries however many providers exist; the city filter is an indexed join
+through the providers' service cities and the city dropdown is cached.
+"""
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Prefetch
+from django.db.models.functions import Lower
+
+from core.models import City, AmbulanceProvider, Ambulance
+
+
+SERVICE_CITIES_CACHE_KEY = 'userapp:ambulance-service-cities'
+SERVICE_CITIES_CACHE_SECONDS = 60 * 60
+
+
+def bookable_ambulances(ambulance_type=None):
+    """Ambulances in service and not held by an active booking"""
+    ambulances = Ambulance.objects.filter(status='available')
+    if ambulance_type:
+        ambulances = ambulances.filter(type=ambulance_type)
+    return ambulances
+
+
+def directory_providers(ambulance_type=None, city=None):
+    """
+    Providers with at least one bookable ambulance (of the given type),
+    optionally only those serving `city`
+    
+    Each provider's bookable ambulances are prefetched into
+    `bookable_ambulances`, so the page costs two queries in total.
+    """
+    has_bookable = Exists(bookable_ambulances(ambulance_type).filter(provider=OuterRef('pk')))
+    providers = AmbulanceProvider.objects.filter(has_bookable)
+    if city:
+        providers = providers.filter(service_cities__key=City.normalize_key(city))
+    return providers.prefetch_related(
+        Prefetch('ambulances', queryset=bookable_ambulances(), to_attr='bookable_ambulances')
+    )
+
+
+def service_cities():
+    """Sorted list of every city any provider serves (cached)"""
+    cities = cache.get(SERVICE_CITIES_CACHE_KEY)
+    if cities is None:
+        cities = list(
+            City.objects.filter(providers__isnull=False).distinct()
+            .order_by(Lower('name')).values_list('name', flat=True)
+        )
+        cache.set(SERVICE_CITIES_CACHE_KEY, cities, SERVICE_CITIES_CACHE_SECONDS)
+    return cities
+
+
+def invalidate_service_cities():
+    cache.delete(SERVICE_CITIES_CACHE_KEY)
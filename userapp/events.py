@@ -0,0 +1,104 @@
+"""
+In-process fan-out of hospital bed-availability changes to Server-Sent Events clients
+
+Each open results page holds one long-lived connection subscribed to the
+hospitals it shows. A Hospital save publishes one serialized event which is
+handed to every interested subscriber; nothing touches the database while
+availability is unchanged.
+
+Subscribers live in the memory of the serving process, so the stream must be
+served by an ASGI server (see careconnect/asgi.py) and all hospital updates
+must go through the same process for clients to see them immediately.
+"""
+import asyncio
+import json
+import threading
+
+from userapp.availability import availability_payload
+
+
+# Queue size per client; a client that falls this far behind is dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """A single SSE client waiting for availability events"""
+
+    def __init__(self, hospital_ids, loop):
+        self.hospital_ids = set(hospital_ids) if hospital_ids else None
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False
+
+    def wants(self, hospital_id):
+        return self.hospital_ids is None or hospital_id in self.hospital_ids
+
+    def _put(self, event):
+        # Runs on the subscriber's event loop
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client can't keep up; end its stream so it reconnects with a fresh snapshot
+            self.closed = True
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The client's event loop has already shut down
+            self.closed = True
+
+
+class AvailabilityBroadcaster:
+    """Publishes one event per availability change to all subscribed clients"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        # Last payload sent per hospital, so saves that don't touch beds are skipped
+        self._last_sent = {}
+
+    def subscribe(self, hospital_ids):
+        subscription = Subscription(hospital_ids, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, hospital):
+        """Serialize a hospital's availability once and fan it out"""
+        payload = availability_payload(hospital)
+        fingerprint = json.dumps(payload['beds'], sort_keys=True)
+        with self._lock:
+            if self._last_sent.get(hospital.id) == fingerprint:
+                return
+            self._last_sent[hospital.id] = fingerprint
+            targets = [s for s in self._subscriptions if s.wants(hospital.id)]
+
+        if not targets:
+            return
+        event = format_event('availability', payload, event_id=payload['updated_at'])
+        for subscription in targets:
+            subscription.deliver(event)
+
+    def forget(self, hospital_id):
+        with self._lock:
+            self._last_sent.pop(hospital_id, None)
+
+
+def format_event(event_type, data, event_id=None):
+    """Encode a single SSE message"""
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+availability_broadcaster = AvailabilityBroadcaster()
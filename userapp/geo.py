@@ -0,0 +1,239 @@
+"""
+Geospatial helpers for hospital proximity search
+Keeps an in-memory grid index of hospital coordinates so nearest-hospital
+lookups only visit the few grid cells around the user instead of every row
+"""
+import heapq
+import math
+import threading
+import time
+
+from django.db.models import ExpressionWrapper, FloatField
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+from core.models import Hospital
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Grid cell size in degrees (~11 km of latitude)
+CELL_SIZE_DEG = 0.1
+
+# Rebuild the index periodically so changes made by other processes show up
+INDEX_MAX_AGE_SECONDS = 300
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def hospital_distance_km(hospital, lat, lng):
+    """Great-circle distance (km) from (lat, lng) to a hospital, or None if either location is unknown"""
+    if lat is None or lng is None or hospital.latitude is None or hospital.longitude is None:
+        return None
+    return round(haversine_km(lat, lng, float(hospital.latitude), float(hospital.longitude)), 1)
+
+
+def distance_km_expression(lat, lng):
+    """
+    Haversine distance (km) from (lat, lng) to each hospital as an SQL
+    expression, so results can be ordered and paginated by the database.
+    NULL for hospitals without coordinates.
+    """
+    h_lat = Radians(Cast('latitude', FloatField()))
+    h_lng = Radians(Cast('longitude', FloatField()))
+    a = (
+        Power(Sin((h_lat - math.radians(lat)) / 2), 2)
+        + math.cos(math.radians(lat)) * Cos(h_lat) * Power(Sin((h_lng - math.radians(lng)) / 2), 2)
+    )
+    return ExpressionWrapper(2 * EARTH_RADIUS_KM * ASin(Sqrt(Least(a, 1.0))), output_field=FloatField())
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius_km
+
+    Used as a cheap SQL prefilter before the exact haversine distance is applied.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat = max(-90.0, lat - lat_delta)
+    max_lat = min(90.0, lat + lat_delta)
+
+    # Longitude degrees shrink towards the poles; use the widest latitude in the box
+    widest = max(abs(min_lat), abs(max_lat))
+    cos_lat = math.cos(math.radians(widest))
+    if cos_lat < 1e-6:
+        return min_lat, max_lat, -180.0, 180.0
+    lng_delta = radius_km / (KM_PER_DEGREE * cos_lat)
+    if lng_delta >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, lng - lng_delta, lng + lng_delta
+
+
+def parse_coordinates(lat_value, lng_value):
+    """Parse a latitude/longitude pair from request strings, or return (None, None)"""
+    try:
+        lat = float(lat_value)
+        lng = float(lng_value)
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None, None
+    return lat, lng
+
+
+class HospitalGridIndex:
+    """
+    In-memory spatial index of hospital coordinates
+
+    Hospitals are bucketed into fixed-size lat/lng cells. A k-nearest query
+    scans rings of cells outward from the query point and stops as soon as
+    no unvisited cell can contain anything closer than the current k-th match.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE_DEG, max_age=INDEX_MAX_AGE_SECONDS):
+        self.cell_size = cell_size
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._cells = {}
+        self._points = {}
+        self._extent = None
+        self._built_at = None
+
+    def _cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def _grow_extent(self, cell):
+        if self._extent is None:
+            self._extent = [cell[0], cell[0], cell[1], cell[1]]
+        else:
+            ext = self._extent
+            ext[0], ext[1] = min(ext[0], cell[0]), max(ext[1], cell[0])
+            ext[2], ext[3] = min(ext[2], cell[1]), max(ext[3], cell[1])
+
+    def _ensure_built(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.max_age:
+            self.build()
+
+    def build(self):
+        """(Re)load every hospital with coordinates from the database"""
+        rows = Hospital.objects.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).values_list('id', 'latitude', 'longitude')
+
+        cells = {}
+        points = {}
+        for hospital_id, lat, lng in rows:
+            lat, lng = float(lat), float(lng)
+            cell = self._cell(lat, lng)
+            points[hospital_id] = (lat, lng, cell)
+            cells.setdefault(cell, set()).add(hospital_id)
+
+        with self._lock:
+            self._cells = cells
+            self._points = points
+            self._extent = None
+            for cell in cells:
+                self._grow_extent(cell)
+            self._built_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a full rebuild on the next query"""
+        with self._lock:
+            self._built_at = None
+
+    def update(self, hospital_id, lat, lng):
+        """Insert, move or remove (when coordinates are None) a single hospital"""
+        with self._lock:
+            if self._built_at is None:
+                return
+            old = self._points.pop(hospital_id, None)
+            if old:
+                bucket = self._cells.get(old[2])
+                if bucket:
+                    bucket.discard(hospital_id)
+                    if not bucket:
+                        del self._cells[old[2]]
+            if lat is None or lng is None:
+                return
+            lat, lng = float(lat), float(lng)
+            cell = self._cell(lat, lng)
+            self._points[hospital_id] = (lat, lng, cell)
+            self._cells.setdefault(cell, set()).add(hospital_id)
+            # The extent only grows; removals leave it conservatively large
+            self._grow_extent(cell)
+
+    def remove(self, hospital_id):
+        self.update(hospital_id, None, None)
+
+    def _ring(self, center, radius):
+        """Yield the cells at Chebyshev distance `radius` from `center`"""
+        cy, cx = center
+        if radius == 0:
+            yield center
+            return
+        for dx in range(-radius, radius + 1):
+            yield (cy - radius, cx + dx)
+            yield (cy + radius, cx + dx)
+        for dy in range(-radius + 1, radius):
+            yield (cy + dy, cx - radius)
+            yield (cy + dy, cx + radius)
+
+    def nearest(self, lat, lng, k=None, radius_km=None):
+        """
+        Return [(hospital_id, distance_km), ...] sorted by distance
+
+        Args:
+            lat, lng: Query point
+            k: Maximum number of results (None for no limit)
+            radius_km: Only return hospitals within this distance (None for no limit)
+        """
+        if k is None and radius_km is None:
+            raise ValueError('nearest() needs k or radius_km')
+
+        with self._lock:
+            self._ensure_built()
+            if not self._points:
+                return []
+
+            center = self._cell(lat, lng)
+
+            # Largest ring that still overlaps the indexed area
+            min_y, max_y, min_x, max_x = self._extent
+            max_ring = max(
+                abs(center[0] - min_y), abs(center[0] - max_y),
+                abs(center[1] - min_x), abs(center[1] - max_x),
+            )
+
+            # Max-heap (negated distances) of the best matches found so far
+            best = []
+            for ring in range(max_ring + 1):
+                # Everything in this ring is at least (ring - 1) cells away; a
+                # longitude cell is narrowest at the ring's most poleward edge
+                edge_lat = min(89.0, abs(lat) + (ring + 1) * self.cell_size)
+                min_ring_km = (ring - 1) * self.cell_size * KM_PER_DEGREE * math.cos(math.radians(edge_lat))
+                if radius_km is not None and min_ring_km > radius_km:
+                    break
+                if k is not None and len(best) >= k and min_ring_km > -best[0][0]:
+                    break
+                for cell in self._ring(center, ring):
+                    for hospital_id in self._cells.get(cell, ()):
+                        h_lat, h_lng, _ = self._points[hospital_id]
+                        distance = haversine_km(lat, lng, h_lat, h_lng)
+                        if radius_km is not None and distance > radius_km:
+                            continue
+                        if k is None or len(best) < k:
+                            heapq.heappush(best, (-distance, hospital_id))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, hospital_id))
+
+        return sorted(((hospital_id, -neg) for neg, hospital_id in best), key=lambda r: r[1])
+
+
+hospital_index = HospitalGridIndex()
@@ -0,0 +1,77 @@
+"""
+Full-text hospital search
+Uses the SQLite FTS5 table created in core migration 0013 (prefix matching,
+BM25 ranking); other databases fall back to the search index's LIKE filter.
+Matches are filtered with a subquery on the FTS table and ranked in SQL,
+so a page of results is sorted and cut by the database however many
+hospitals match.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+
+# BM25 column weights: name, address, city, facilities
+FTS_COLUMN_WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_fts_available = None
+
+
+def fts_available():
+    """True if the hospital_fts table exists on the default database"""
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and 'hospital_fts' in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def build_match_query(text, column=None):
+    """
+    Turn free text into an FTS5 MATCH expression where every word must
+    match as a prefix, e.g. 'apollo pun' -> '"apollo"* AND "pun"*'
+
+    Returns None if the text contains no searchable words.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return None
+    expression = ' AND '.join(f'"{token}"*' for token in tokens)
+    if column:
+        expression = f'{column} : ({expression})'
+    return expression
+
+
+def matching_hospital_ids(text, column=None):
+    """
+    Subquery of the ids of hospitals matching the text, for id__in filters
+
+    Returns None when full-text search isn't available so callers can fall
+    back to a LIKE filter, and [] when the text has no searchable words.
+    """
+    if not fts_available():
+        return None
+    match = build_match_query(text, column)
+    if match is None:
+        return []
+    return RawSQL('SELECT rowid FROM hospital_fts WHERE hospital_fts MATCH %s', [match])
+
+
+def hospital_rank(text, column=None):
+    """
+    BM25 score of each hospital against the text (lower is better), for
+    annotating a queryset already filtered by matching_hospital_ids()
+    """
+    weights = ', '.join(str(w) for w in FTS_COLUMN_WEIGHTS)
+    return RawSQL(
+        f'SELECT bm25(hospital_fts, {weights}) FROM hospital_fts '
+        f'WHERE hospital_fts MATCH %s AND hospital_fts.rowid = hospitals.id',
+        [build_match_query(text, column)],
+        output_field=FloatField(),
+    )
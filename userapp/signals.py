@@ -0,0 +1,40 @@
+"""
+Signal handlers keeping user-facing search structures and caches in sync with the database
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from core.models import Hospital, AmbulanceProvider
+from userapp.geo import hospital_index
+from userapp.events import availability_broadcaster
+from userapp.directory import invalidate_service_cities
+
+
+@receiver(post_save, sender=Hospital)
+def update_hospital_location(sender, instance, **kwargs):
+    """Move the hospital to its current cell in the proximity index"""
+    hospital_index.update(instance.id, instance.latitude, instance.longitude)
+
+
+@receiver(post_delete, sender=Hospital)
+def remove_hospital_location(sender, instance, **kwargs):
+    """Drop a deleted hospital from the proximity index"""
+    hospital_index.remove(instance.id)
+
+
+@receiver(post_save, sender=Hospital)
+def broadcast_hospital_availability(sender, instance, **kwargs):
+    """Push the new bed availability to live results pages once the save commits"""
+    transaction.on_commit(lambda: availability_broadcaster.publish(instance))
+
+
+@receiver(post_delete, sender=Hospital)
+def forget_hospital_availability(sender, instance, **kwargs):
+    availability_broadcaster.forget(instance.id)
+
+
+@receiver(m2m_changed, sender=AmbulanceProvider.service_cities.through)
+@receiver(post_delete, sender=AmbulanceProvider)
+def invalidate_ambulance_cities(sender, **kwargs):
+    """Service areas changed; rebuild the directory's city list on next view"""
+    invalidate_service_cities()
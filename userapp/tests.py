@@ -0,0 +1,275 @@
+"""
+Tests for the user app
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.bed_history import record_bed_history, roll_up
+from core.models import User, Hospital, AmbulanceProvider, Ambulance
+from userapp.geo import hospital_index
+from userapp.search import fts_available
+
+
+class AmbulanceDirectoryQueryTests(TestCase):
+    """The ambulance directory costs the same queries however many providers exist"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'patient', 'patient@example.com', 'password123', phone='1', role='user'
+        )
+        self.owner = User.objects.create_user(
+            'provider', 'provider@example.com', 'password123', phone='2', role='ambulance'
+        )
+        self.client.force_login(self.user)
+        self.providers = 0
+
+    def add_provider(self, ambulances=2):
+        self.providers += 1
+        provider = AmbulanceProvider(
+            name=f'Provider {self.providers}', address='Station Road', city='Pune',
+            email=f'provider{self.providers}@example.com', phone='3', owner=self.owner,
+        )
+        provider.set_service_area_list(['Pune', f'Town {self.providers}'])
+        provider.save()
+        for number in range(ambulances):
+            Ambulance.objects.create(
+                vehicle_number=f'MH{self.providers:02d}AB{number:04d}', type='ALS',
+                driver_name='Driver', driver_phone='4', provider=provider,
+            )
+        return provider
+
+    def render_directory(self, **params):
+        """Render the directory with the city list not cached; returns the providers listed"""
+        cache.clear()
+        response = self.client.get(reverse('userapp:ambulances'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['total_results']
+
+    def assert_constant_queries(self, **params):
+        self.add_provider()
+        with CaptureQueriesContext(connection) as baseline:
+            self.assertEqual(self.render_directory(**params), 1)
+
+        for _ in range(9):
+            self.add_provider()
+        with self.assertNumQueries(len(baseline)):
+            self.assertEqual(self.render_directory(**params), 10)
+
+    def test_query_count_is_independent_of_provider_count(self):
+        self.assert_constant_queries()
+
+    def test_city_filter_query_count_is_independent_of_provider_count(self):
+        self.assert_constant_queries(city='pune', type='ALS')
+
+
+class SearchPaginationTests(TestCase):
+    """Paging through search results with the load-more cursor"""
+
+    PAGE_SIZE = 7
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            'patient', 'patient@example.com', 'password123', phone='1', role='user'
+        )
+        self.owner = User.objects.create_user(
+            'admin', 'admin@example.com', 'password123', phone='2', role='hospital'
+        )
+        self.client.force_login(self.user)
+        hospital_index.invalidate()
+        self.addCleanup(hospital_index.invalidate)
+        self.hospitals = 0
+
+    def add_hospital(self, name, offset=None, city='Pune'):
+        """A hospital `offset` hundredths of a degree north of (18.5, 73.8), or without coordinates"""
+        self.hospitals += 1
+        return Hospital.objects.create(
+            name=name, address='Main Road', city=city, email=f'h{self.hospitals}@example.com',
+            phone='3', owner=self.owner,
+            latitude=None if offset is None else 18.5 + offset / 100,
+            longitude=None if offset is None else 73.8,
+        )
+
+    def pages(self, **params):
+        """Follow next_cursor to the end; returns the hospital ids of each page"""
+        params = {'page_size': self.PAGE_SIZE, **params}
+        pages = []
+        while True:
+            response = self.client.get(reverse('userapp:search_more'), params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append([int(hospital['id']) for hospital in data['hospitals']])
+            if not data['next_cursor']:
+                return pages
+            params['cursor'] = data['next_cursor']
+
+    def assert_pages(self, pages, expected_ids):
+        flat = [hid for page in pages for hid in page]
+        self.assertEqual(flat, expected_ids)
+        self.assertTrue(all(len(page) == self.PAGE_SIZE for page in pages[:-1]))
+
+    def test_name_order_covers_every_hospital_once(self):
+        # Duplicate names: the id breaks ties across page boundaries
+        hospitals = [self.add_hospital(f'Hospital {number % 4}') for number in range(30)]
+
+        pages = self.pages()
+
+        expected = sorted(hospitals, key=lambda hospital: (hospital.name, hospital.id))
+        self.assert_pages(pages, [hospital.id for hospital in expected])
+
+    def test_distance_order_pages_nearest_first(self):
+        # Two hospitals at each distance, plus some without coordinates
+        hospitals = [self.add_hospital(f'Hospital {number}', offset=number // 2) for number in range(20)]
+        unplaced = [self.add_hospital(f'Unplaced {number}') for number in range(3)]
+
+        pages = self.pages(lat='18.5', lng='73.8', location='pune', radius='200')
+
+        self.assert_pages(pages, [hospital.id for hospital in hospitals + unplaced])
+
+    def test_relevance_order_pages_every_match(self):
+        if not fts_available():
+            self.skipTest('SQLite FTS5 is not available')
+        strong = [self.add_hospital(f'Apollo Apollo {number}') for number in range(10)]
+        weak = [self.add_hospital(f'Apollo {number}') for number in range(15)]
+        self.add_hospital('Ruby Hall')
+
+        pages = self.pages(search_type='name', hospital_name='apollo')
+
+        flat = [hid for page in pages for hid in page]
+        self.assert_pages(pages, flat)
+        self.assertCountEqual(flat[:len(strong)], [hospital.id for hospital in strong])
+        self.assertCountEqual(flat[len(strong):], [hospital.id for hospital in weak])
+
+    def test_cursor_is_stable_when_hospitals_are_added(self):
+        hospitals = [self.add_hospital(f'Hospital {number:02d}') for number in range(20)]
+        params = {'page_size': self.PAGE_SIZE}
+        first = self.client.get(reverse('userapp:search_more'), params).json()
+
+        # Sorts before the cursor: must not push rows already seen onto the next page
+        self.add_hospital('Hospital 00a')
+        params['cursor'] = first['next_cursor']
+        second = self.client.get(reverse('userapp:search_more'), params).json()
+
+        self.assertEqual(
+            [int(hospital['id']) for hospital in first['hospitals'] + second['hospitals']],
+            [hospital.id for hospital in hospitals[:2 * self.PAGE_SIZE]],
+        )
+
+    def test_cursor_from_another_ordering_restarts(self):
+        for number in range(10):
+            self.add_hospital(f'Hospital {number}', offset=number)
+        by_name = self.client.get(reverse('userapp:search_more'), {'page_size': 3}).json()
+
+        response = self.client.get(reverse('userapp:search_more'), {
+            'page_size': 3, 'lat': '18.5', 'lng': '73.8', 'cursor': by_name['next_cursor'],
+        })
+
+        self.assertEqual(
+            [int(hospital['id']) for hospital in response.json()['hospitals']],
+            list(Hospital.objects.order_by('id').values_list('id', flat=True)[:3]),
+        )
+
+
+class BedHistoryAPITests(TestCase):
+    """Parameters of the bed history API"""
+
+    def setUp(self):
+        user = User.objects.create_user('patient', 'patient@example.com', 'password123', phone='1', role='user')
+        owner = User.objects.create_user('hospital', 'h@example.com', 'password123', phone='2', role='hospital')
+        self.hospital = Hospital.objects.create(
+            name='City Hospital', address='Main Road', city='Pune', email='h@example.com', phone='3',
+            owner=owner, beds_icu=4, beds_icu_capacity=10,
+        )
+        self.client.force_login(user)
+
+    def get(self, **params):
+        return self.client.get(reverse('userapp:bed_history'), {'hospital': self.hospital.id, **params})
+
+    def test_series(self):
+        record_bed_history([self.hospital], at=timezone.now() - timedelta(hours=5))
+        roll_up()
+
+        response = self.get(start=(timezone.now() - timedelta(days=3)).isoformat())
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['resolution'], 'hour')
+        self.assertEqual(len(data['series']['t']), 5)
+        self.assertEqual(set(data['series']['beds_icu']), {4})
+
+    def test_invalid_timestamps_are_rejected(self):
+        for params in ({'start': 'yesterday'}, {'end': '2026-13-01T00:00:00'}, {'start': '2026-01-01T25:00'}):
+            with self.subTest(params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], 'start and end must be ISO 8601 timestamps')
+
+    def test_empty_or_reversed_range_is_rejected(self):
+        for start, end in (('2026-01-02T00:00:00Z', '2026-01-02T00:00:00Z'), ('2026-01-03', '2026-01-02')):
+            with self.subTest(start=start, end=end):
+                self.assertEqual(self.get(start=start, end=end).status_code, 400)
+
+    def test_span_is_capped(self):
+        self.assertEqual(self.get(start='2020-01-01T00:00:00Z', end='2026-01-01T00:00:00Z').status_code, 400)
+        self.assertEqual(self.get(start='2022-01-01T00:00:00Z', end='2026-01-01T00:00:00Z').status_code, 200)
+
+    def test_hospital_or_city_is_required(self):
+        self.assertEqual(self.client.get(reverse('userapp:bed_history')).status_code, 400)
+        self.assertEqual(self.get(city='Pune').status_code, 400)
+
+
+class LiveAvailabilityETagTests(TestCase):
+    """Conditional polling of the live availability endpoint"""
+
+    def setUp(self):
+        user = User.objects.create_user('patient', 'patient@example.com', 'password123', phone='1', role='user')
+        self.owner = User.objects.create_user('hospital', 'h@example.com', 'password123', phone='2', role='hospital')
+        self.hospitals = [self.add_hospital(number) for number in range(3)]
+        self.client.force_login(user)
+
+    def add_hospital(self, number):
+        return Hospital.objects.create(
+            name=f'Hospital {number}', address='Main Road', city='Pune', email='h@example.com', phone='3',
+            owner=self.owner, beds_icu=4, beds_icu_capacity=10,
+        )
+
+    def poll(self, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('userapp:live_availability'), params, **headers)
+
+    def test_unchanged_hospitals_get_not_modified(self):
+        for params in ({}, {'ids': f'{self.hospitals[0].id},{self.hospitals[1].id}'}):
+            with self.subTest(params):
+                etag = self.poll(**params)['ETag']
+                self.assertEqual(self.poll(etag, **params).status_code, 304)
+
+    def test_etag_without_ids_is_one_aggregate_query(self):
+        etag = self.poll()['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.poll(etag).status_code, 304)
+        hospital_queries = [q['sql'] for q in queries.captured_queries if 'hospitals' in q['sql']]
+        self.assertEqual(len(hospital_queries), 1)
+        self.assertIn('SUM', hospital_queries[0].upper())
+
+    def test_etag_without_ids_changes_with_any_hospital(self):
+        etag = self.poll()['ETag']
+
+        self.hospitals[1].beds_icu = 3
+        self.hospitals[1].save()
+        response = self.poll(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([h['id'] for h in response.json()['hospitals']], [str(h.id) for h in self.hospitals])
+        etag = response['ETag']
+
+        self.hospitals[0].delete()
+        self.assertEqual(self.poll(etag).status_code, 200)
+        etag = self.poll()['ETag']
+
+        self.add_hospital(3)
+        self.assertEqual(self.poll(etag).status_code, 200)
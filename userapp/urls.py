@@ -9,9 +9,13 @@ app_name = 'userapp'
 urlpatterns = [
     path('home/', views.home, name='home'),
     path('search/', views.search_hospitals, name='search'),
+    path('search/more/', views.search_more, name='search_more'),
     path('results/', views.results, name='results'),
     path('compare/', views.compare_hospitals, name='compare'),
+    path('compare/api/', views.compare_api, name='compare_api'),
+    path('bed-history/', views.bed_history_api, name='bed_history'),
     path('ambulances/', views.ambulances, name='ambulances'),
     path('book-ambulance/', views.book_ambulance, name='book_ambulance'),
     path('live-availability/', views.live_hospital_availability, name='live_availability'),
+    path('live-availability/stream/', views.live_availability_stream, name='live_availability_stream'),
 ]
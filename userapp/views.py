@@ -4,14 +4,71 @@ Handles general user functionality - hospital search, comparison, ambulance dire
 Updated to use Django ORM instead of MongoDB
 """
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string, get_template
+from django.core import signing
 from django.contrib import messages
 from django.db.models import Q
 from django.urls import reverse
 from core.views import require_login
-from core.models import Hospital, AmbulanceProvider, Ambulance, Booking
-from django.db.models import Q
-from datetime import datetime, timedelta
-from django.http import JsonResponse
+from core.activity import log_activity
+from core.models import Hospital, HospitalSearchIndex, AmbulanceProvider, Ambulance, Booking, BedHistory
+from core.bed_history import RESOLUTION_LABELS, bed_series, series_resolution
+from django.db.models import Q, F, Value, Count, Max, Sum
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
+from asgiref.sync import sync_to_async
+import asyncio
+from datetime import timedelta
+import base64
+import hashlib
+import json
+import zlib
+from userapp.geo import (
+    hospital_index, hospital_distance_km, bounding_box, distance_km_expression, parse_coordinates,
+)
+from userapp.availability import bed_availability, availability_payload, last_updated_text
+from userapp.events import availability_broadcaster, format_event
+from userapp.search import fts_available, hospital_rank, matching_hospital_ids
+from userapp.directory import directory_providers, service_cities
+from userapp.compare import (
+    MAX_API_HOSPITALS, MAX_PAGE_HOSPITALS, bed_percentage, comparison_matrix, load_hospitals,
+    parse_hospital_ids,
+)
+from ambulance.dispatch import dispatch_booking, is_due
+from ambulance.assignment import hold_requested_ambulance
+
+
+# Default and maximum radius (km) for "near me" searches
+DEFAULT_SEARCH_RADIUS_KM = 25
+MAX_SEARCH_RADIUS_KM = 200
+
+# Upper bound on hospitals returned by a nearest-hospital query
+MAX_NEAREST_RESULTS = 100
+
+# Seconds between keep-alive comments on the availability stream
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Search results page size (the client may ask for up to the maximum)
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+SEARCH_CURSOR_SALT = 'userapp.search.cursor'
+
+# Longest bed history series served in one request
+MAX_BED_HISTORY_SPAN = timedelta(days=5 * 366)
+
+# Sort key for hospitals without coordinates so they come last
+UNKNOWN_DISTANCE_KM = 1e9
+
+# Placeholders in results.html filled in when the page is streamed
+STREAM_CARDS_MARKER = '<!-- stream:hospital-cards -->'
+STREAM_DATA_MARKER = '/* stream:hospital-data */'
+
+# Escapes for JSON written into a <script> block, as json_script does
+SCRIPT_JSON_ESCAPES = {ord('<'): '\\u003C', ord('>'): '\\u003E', ord('&'): '\\u0026'}
 
 
 @require_login
@@ -32,167 +89,276 @@ def home(request):
     return render(request, 'userapp/home.html', context)
 
 
-def _get_status(available, total):
-    """Helper function to determine availability status"""
-    if total == 0:
-        return 'none'
-    percentage = (available / total) * 100
-    if percentage >= 50:
-        return 'good'
-    elif percentage >= 20:
-        return 'limited'
-    elif percentage > 0:
-        return 'very_limited'
+def _hospital_result(hospital, distance):
+    """Template-ready dict for one hospital in the search results"""
+    # Effective totals and statuses come precomputed from the search index
+    hospital_dict = {
+        'id': hospital.id,
+        'id_str': str(hospital.id),
+        'name': hospital.name,
+        'address': hospital.address,
+        'city': hospital.city,
+        'type': hospital.type,
+        'email': hospital.email,
+        'phone': hospital.phone,
+        'facilities_detail': bed_availability(hospital),
+        'last_updated': last_updated_text(hospital.updated_at),
+        # Distance from the user's location (None when the location is unknown)
+        'distance': round(distance, 1) if distance is not None else None,
+    }
+    
+    # Add coordinates if available, otherwise use city-based defaults
+    if hospital.latitude and hospital.longitude:
+        hospital_dict['latitude'] = float(hospital.latitude)
+        hospital_dict['longitude'] = float(hospital.longitude)
     else:
-        return 'full'
+        # Generate approximate coordinates based on city (fallback)
+        # This is a simple checksum-based approach for demo - in production, use proper geocoding
+        city_hash = zlib.crc32(hospital.city.encode()) % 1000
+        # Default to Mumbai area coordinates if no city match
+        hospital_dict['latitude'] = 19.0760 + (city_hash / 10000.0)
+        hospital_dict['longitude'] = 72.8777 + (city_hash / 10000.0)
+    
+    return hospital_dict
 
 
-@require_login
-def search_hospitals(request):
-    """Search hospitals with advanced filters"""
+def _map_entry(result):
+    """Marker data for the results map, matching the inline `hospitals` array in results.html"""
+    beds = result['facilities_detail']
+    return {
+        'id': result['id_str'],
+        'name': result['name'],
+        'address': result['address'],
+        'city': result['city'],
+        'phone': result['phone'],
+        'distance': result['distance'],
+        'latitude': result['latitude'],
+        'longitude': result['longitude'],
+        'type': result['type'],
+        'icu_available': beds['icu']['available'],
+        'icu_total': beds['icu']['total'],
+        'icu_status': beds['icu']['status'],
+        'oxygen_available': beds['oxygen']['available'],
+        'oxygen_total': beds['oxygen']['total'],
+        'ventilator_available': beds['ventilator']['available'],
+        'ventilator_total': beds['ventilator']['total'],
+        'isolation_available': beds['isolation']['available'],
+        'isolation_total': beds['isolation']['total'],
+    }
+
+
+def _encode_cursor(order, key):
+    return signing.dumps([order, *key], salt=SEARCH_CURSOR_SALT, compress=True)
+
+
+def _decode_cursor(value, order):
+    """Sort key of the last hospital on the previous page, or None"""
+    if not value:
+        return None
+    try:
+        cursor_order, *key = signing.loads(value, salt=SEARCH_CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    # A cursor from a different ordering can't be compared with this one's keys
+    if cursor_order != order or len(key) != 2:
+        return None
+    return tuple(key)
+
+
+def _search(params):
+    """
+    Run a hospital search and return one keyset-paginated page.
+    
+    Results are ordered by distance (when the user's location is known),
+    full-text relevance or name. The page after `cursor` is returned along
+    with the cursor for the next one, so no request loads more than
+    page_size full rows however many hospitals match.
+    """
     # Get search parameters
-    search_type = request.GET.get('search_type', 'location')
-    hospital_name = request.GET.get('hospital_name', '').strip()
-    location = request.GET.get('location', '').strip()
-    hospital_type = request.GET.get('hospital_type', 'all')
-    facilities = request.GET.getlist('facility')  # Multiple facilities
+    search_type = params.get('search_type', 'location')
+    hospital_name = params.get('hospital_name', '').strip()
+    location = params.get('location', '').strip()
+    hospital_type = params.get('hospital_type', 'all')
+    facilities = params.getlist('facility')  # Multiple facilities
+    
+    # User's coordinates (filled in by the browser's geolocation API)
+    user_lat, user_lng = parse_coordinates(params.get('lat'), params.get('lng'))
+    try:
+        search_radius = float(params.get('radius', DEFAULT_SEARCH_RADIUS_KM))
+    except ValueError:
+        search_radius = DEFAULT_SEARCH_RADIUS_KM
+    search_radius = min(max(search_radius, 1), MAX_SEARCH_RADIUS_KM)
+    
+    try:
+        page_size = int(params.get('page_size', SEARCH_PAGE_SIZE))
+    except ValueError:
+        page_size = SEARCH_PAGE_SIZE
+    page_size = min(max(page_size, 1), MAX_SEARCH_PAGE_SIZE)
     
     # Build query
     query = Q()
     
+    # The (text, column) hospitals must match, and whether full-text search
+    # filters and ranks them (False when falling back to LIKE filters)
+    text_match = None
+    text_ranked = False
+    
     # Search by hospital name OR location/filters
     if search_type == 'name' and hospital_name:
         # Search by hospital name only
-        query &= Q(name__icontains=hospital_name)
+        text_match = (hospital_name, 'name')
+        if not fts_available():
+            query &= Q(name__icontains=hospital_name)
     else:
-        # Search by location and filters
+        # Search by location and filters: ranked full-text match over
+        # name/address/city/facilities, falling back to the search index's
+        # single lowercased text column on databases without FTS5
         if location:
-            query &= (
-                Q(city__icontains=location) |
-                Q(address__icontains=location) |
-                Q(name__icontains=location)
-            )
+            text_match = (location, None)
+            if not fts_available():
+                query &= Q(search_index__search_text__contains=location.lower())
         
         # Hospital type filter
         if hospital_type and hospital_type != 'all':
-            query &= Q(type=hospital_type)
-    
-    # Get hospitals from database
-    hospitals = Hospital.objects.filter(query).select_related('owner')
-    
-    # Filter by facilities if specified (only for location-based search)
-    if facilities and search_type != 'name':
-        for facility in facilities:
-            if facility == 'icu':
-                hospitals = hospitals.filter(beds_icu__gt=0)
-            elif facility == 'oxygen':
-                hospitals = hospitals.filter(beds_oxygen__gt=0)
-            elif facility == 'ventilator':
-                hospitals = hospitals.filter(beds_ventilator__gt=0)
-            elif facility == 'isolation':
-                hospitals = hospitals.filter(beds_isolation__gt=0)
-    
-    # Convert to list and add computed fields
-    hospitals_list = []
-    for hospital in hospitals:
-        # Use the exact values stored in the Hospital model for both
-        # "available" and "total" counts so the user dashboard always
-        # reflects real-time data entered by hospital admins / Django admin.
-        # Denominators come from stored capacity fields (right column in hospital dashboard)
-        # Fallback to available if capacity isn't set yet.
-        icu_total = hospital.beds_icu_capacity or hospital.beds_icu
-        oxygen_total = hospital.beds_oxygen_capacity or hospital.beds_oxygen
-        ventilator_total = hospital.beds_ventilator_capacity or hospital.beds_ventilator
-        isolation_total = hospital.beds_isolation_capacity or hospital.beds_isolation
-        
-        # Add facility availability details with capacity
-        hospital_dict = {
-            'id': hospital.id,
-            'id_str': str(hospital.id),
-            'name': hospital.name,
-            'address': hospital.address,
-            'city': hospital.city,
-            'type': hospital.type,
-            'email': hospital.email,
-            'phone': hospital.phone,
-            'facilities_detail': {
-                'icu': {
-                    'available': hospital.beds_icu,
-                    'total': icu_total,
-                    'status': _get_status(hospital.beds_icu, icu_total)
-                },
-                'oxygen': {
-                    'available': hospital.beds_oxygen,
-                    'total': oxygen_total,
-                    'status': _get_status(hospital.beds_oxygen, oxygen_total)
-                },
-                'ventilator': {
-                    'available': hospital.beds_ventilator,
-                    'total': ventilator_total,
-                    'status': _get_status(hospital.beds_ventilator, ventilator_total)
-                },
-                'isolation': {
-                    'available': hospital.beds_isolation,
-                    'total': isolation_total,
-                    'status': _get_status(hospital.beds_isolation, isolation_total)
-                }
-            }
-        }
-        
-        # Calculate last updated time
-        updated_at = hospital.updated_at
-        if updated_at:
-            time_diff = datetime.now(updated_at.tzinfo) - updated_at
-            if time_diff < timedelta(minutes=1):
-                hospital_dict['last_updated'] = "just now"
-            elif time_diff < timedelta(hours=1):
-                minutes = int(time_diff.total_seconds() / 60)
-                hospital_dict['last_updated'] = f"{minutes} minutes ago" if minutes > 1 else "1 minute ago"
-            elif time_diff < timedelta(days=1):
-                hours = int(time_diff.total_seconds() / 3600)
-                hospital_dict['last_updated'] = f"{hours} hour{'s' if hours > 1 else ''} ago"
-            else:
-                days = time_diff.days
-                hospital_dict['last_updated'] = f"{days} day{'s' if days > 1 else ''} ago"
-        else:
-            hospital_dict['last_updated'] = "just now"
+            query &= Q(search_index__type=hospital_type)
         
-        # Mock distance (in real app, would calculate based on user location)
-        hospital_dict['distance'] = round(2.0 + (hash(str(hospital.id)) % 50) / 10, 1)
-        
-        # Add coordinates if available, otherwise use city-based defaults
-        if hospital.latitude and hospital.longitude:
-            hospital_dict['latitude'] = float(hospital.latitude)
-            hospital_dict['longitude'] = float(hospital.longitude)
-        else:
-            # Generate approximate coordinates based on city (fallback)
-            # This is a simple hash-based approach for demo - in production, use proper geocoding
-            city_hash = hash(hospital.city) % 1000
-            # Default to Mumbai area coordinates if no city match
-            hospital_dict['latitude'] = 19.0760 + (city_hash / 10000.0)
-            hospital_dict['longitude'] = 72.8777 + (city_hash / 10000.0)
-        
-        hospitals_list.append(hospital_dict)
+        # Facility filter: every selected bed type must have beds available
+        required_mask = HospitalSearchIndex.facility_mask_for(facilities)
+        if required_mask:
+            query &= Q(facility_match=required_mask)
+    
+    if text_match is not None:
+        matching_ids = matching_hospital_ids(*text_match)
+        if matching_ids == []:
+            # No searchable words: nothing matches
+            query &= Q(pk__in=[])
+        elif matching_ids is not None:
+            query &= Q(id__in=matching_ids)
+            text_ranked = True
     
-    # Sort by distance (closest first) or name (for name search)
-    if search_type == 'name':
-        hospitals_list.sort(key=lambda h: h.get('name', ''))
+    # "Near me" search: restrict to the nearest hospitals within the radius.
+    # The grid index picks the candidates; the bounding box keeps the SQL
+    # filter on the indexed lat/lng columns so only those rows are loaded.
+    nearby = False
+    if user_lat is not None and search_type != 'name' and not location:
+        nearby = True
+        nearby_ids = [hid for hid, _ in hospital_index.nearest(
+            user_lat, user_lng, k=MAX_NEAREST_RESULTS, radius_km=search_radius
+        )]
+        min_lat, max_lat, min_lng, max_lng = bounding_box(user_lat, user_lng, search_radius)
+        query &= Q(
+            id__in=nearby_ids,
+            latitude__range=(min_lat, max_lat),
+            longitude__range=(min_lng, max_lng),
+        )
+    
+    hospitals = Hospital.objects.select_related('search_index').annotate(
+        facility_match=F('search_index__facility_mask').bitand(
+            HospitalSearchIndex.facility_mask_for(facilities)
+        )
+    ).filter(query)
+    total_results = hospitals.count()
+    
+    # Sort by distance (closest first) when the user's location is known,
+    # otherwise by full-text relevance or name. Hospitals without
+    # coordinates go last. Every ordering is keyset-paginated on
+    # (sort key, id) by the database, so only one page of rows is loaded.
+    if user_lat is not None and search_type != 'name':
+        order = 'distance'
+        hospitals = hospitals.annotate(
+            sort_key=Coalesce(distance_km_expression(user_lat, user_lng), Value(UNKNOWN_DISTANCE_KM))
+        )
+    elif text_ranked:
+        order = 'relevance'
+        hospitals = hospitals.annotate(sort_key=hospital_rank(*text_match))
     else:
-        hospitals_list.sort(key=lambda h: h.get('distance', 999))
+        order = 'name'
+        hospitals = hospitals.annotate(sort_key=F('name'))
     
-    context = {
-        'hospitals': hospitals_list,
+    page_qs = hospitals.order_by('sort_key', 'id')
+    cursor = _decode_cursor(params.get('cursor'), order)
+    if cursor:
+        last_key, last_id = cursor
+        page_qs = page_qs.filter(Q(sort_key__gt=last_key) | Q(sort_key=last_key, id__gt=last_id))
+    rows = list(page_qs[:page_size + 1])
+    
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    
+    results = []
+    for hospital in rows:
+        if order == 'distance' and hospital.sort_key != UNKNOWN_DISTANCE_KM:
+            distance = hospital.sort_key
+        else:
+            distance = hospital_distance_km(hospital, user_lat, user_lng)
+        results.append(_hospital_result(hospital, distance))
+    
+    return {
+        'hospitals': results,
+        'next_cursor': _encode_cursor(order, (rows[-1].sort_key, rows[-1].id)) if has_more else None,
         'search_type': search_type,
         'search_hospital_name': hospital_name,
         'search_location': location,
         'search_hospital_type': hospital_type,
         'search_facilities': facilities,
-        'total_results': len(hospitals_list),
-        'username': request.user.email or request.user.username
+        'search_lat': user_lat,
+        'search_lng': user_lng,
+        'search_radius': search_radius if nearby else None,
+        'total_results': total_results,
     }
+
+
+def _stream_results(request, context):
+    """
+    Stream the results page: the page shell goes out before the hospital
+    rows are rendered, then one card at a time, then the map data.
+    """
+    shell = render_to_string('userapp/results.html', {**context, 'stream_cards': True}, request=request)
+    head, rest = shell.split(STREAM_CARDS_MARKER, 1)
+    middle, tail = rest.split(STREAM_DATA_MARKER, 1)
+    card_template = get_template('userapp/hospital_card.html')
+    
+    def chunks():
+        yield head
+        map_entries = []
+        for hospital in context['hospitals']:
+            map_entries.append(_map_entry(hospital))
+            yield card_template.render({'hospital': hospital}, request)
+        yield middle
+        yield json.dumps(map_entries).translate(SCRIPT_JSON_ESCAPES)
+        yield tail
+    
+    return StreamingHttpResponse(chunks(), content_type='text/html; charset=utf-8')
+
+
+@require_login
+def search_hospitals(request):
+    """Search hospitals with advanced filters (first page of results)"""
+    context = _search(request.GET)
+    context['username'] = request.user.email or request.user.username
+    
+    # An empty page has nothing to stream and shows the no-results block
+    if request.GET.get('stream') == '1' and context['hospitals']:
+        return _stream_results(request, context)
     return render(request, 'userapp/results.html', context)
 
 
+@require_login
+def search_more(request):
+    """JSON "load more" endpoint: the next page of results after `cursor`"""
+    page = _search(request.GET)
+    html = ''.join(
+        render_to_string('userapp/hospital_card.html', {'hospital': hospital}, request=request)
+        for hospital in page['hospitals']
+    )
+    return JsonResponse({
+        'html': html,
+        'hospitals': [_map_entry(hospital) for hospital in page['hospitals']],
+        'next_cursor': page['next_cursor'],
+        'total_results': page['total_results'],
+    })
+
+
 @require_login
 def results(request):
     """Results page - shows all hospitals or uses search parameters"""
@@ -226,114 +392,59 @@ def results(request):
 def compare_hospitals(request):
     """Compare multiple hospitals"""
     # Get hospital IDs from query string
-    ids_param = request.GET.get('ids', '')
+    hospital_ids, invalid_ids = parse_hospital_ids(request.GET.get('ids', ''))
     
-    if not ids_param:
+    if not hospital_ids:
         messages.info(request, 'Please select hospitals to compare')
         return redirect('userapp:home')
     
-    # Split comma-separated IDs
-    hospital_ids = [hid.strip() for hid in ids_param.split(',') if hid.strip()]
+    # Limit to what fits side by side
+    hospital_ids = hospital_ids[:MAX_PAGE_HOSPITALS]
     
-    # Limit to 4 hospitals
-    hospital_ids = hospital_ids[:4]
+    user_lat, user_lng = parse_coordinates(request.GET.get('lat'), request.GET.get('lng'))
     
     # If only 1 hospital, redirect to ambulance booking
     if len(hospital_ids) == 1:
         return redirect(f'{reverse("userapp:ambulances")}?hospital_id={hospital_ids[0]}')
     
-    # Get hospitals from database
+    # Get all hospitals with one query
+    hospitals = load_hospitals(hospital_ids)
+    if invalid_ids or len(hospitals) < len(hospital_ids):
+        messages.warning(request, 'Some of the selected hospitals could not be found')
+    
     hospitals_list = []
-    for hid in hospital_ids:
-        try:
-            hospital = Hospital.objects.get(id=int(hid.strip()))
-            
-            # Use exact values stored in the Hospital model so comparison
-            # view matches hospital admin dashboard and Django admin.
-            icu_total = hospital.beds_icu_capacity or hospital.beds_icu
-            oxygen_total = hospital.beds_oxygen_capacity or hospital.beds_oxygen
-            ventilator_total = hospital.beds_ventilator_capacity or hospital.beds_ventilator
-            isolation_total = hospital.beds_isolation_capacity or hospital.beds_isolation
-            
-            # Calculate last updated time
-            updated_at = hospital.updated_at
-            if updated_at:
-                time_diff = datetime.now(updated_at.tzinfo) - updated_at
-                if time_diff < timedelta(minutes=1):
-                    last_updated = "just now"
-                elif time_diff < timedelta(hours=1):
-                    minutes = int(time_diff.total_seconds() / 60)
-                    last_updated = f"{minutes} minute{'s' if minutes > 1 else ''} ago"
-                elif time_diff < timedelta(days=1):
-                    hours = int(time_diff.total_seconds() / 3600)
-                    last_updated = f"{hours} hour{'s' if hours > 1 else ''} ago"
-                else:
-                    days = time_diff.days
-                    last_updated = f"{days} day{'s' if days > 1 else ''} ago"
-            else:
-                last_updated = "recently"
-            
-            # Mock distance (in real app, would calculate based on user location)
-            distance = round(2.0 + (hash(str(hospital.id)) % 50) / 10, 1)
-            
-            # Calculate availability percentages for status determination
-            icu_percentage = (hospital.beds_icu / icu_total * 100) if icu_total > 0 else 0
-            oxygen_percentage = (hospital.beds_oxygen / oxygen_total * 100) if oxygen_total > 0 else 0
-            ventilator_percentage = (hospital.beds_ventilator / ventilator_total * 100) if ventilator_total > 0 else 0
-            isolation_percentage = (hospital.beds_isolation / isolation_total * 100) if isolation_total > 0 else 0
-            
-            # Add facility details with real-time bed data
-            hospital_dict = {
-                'id': hospital.id,
-                'name': hospital.name,
-                'address': hospital.address,
-                'city': hospital.city,
-                'type': hospital.type,
-                'email': hospital.email,
-                'phone': hospital.phone,
-                'distance': distance,
-                'updated_at': last_updated,
-                'beds': {
-                    'icu': hospital.beds_icu,
-                    'icu_total': icu_total,
-                    'icu_percentage': icu_percentage,
-                    'oxygen': hospital.beds_oxygen,
-                    'oxygen_total': oxygen_total,
-                    'oxygen_percentage': oxygen_percentage,
-                    'ventilator': hospital.beds_ventilator,
-                    'ventilator_total': ventilator_total,
-                    'ventilator_percentage': ventilator_percentage,
-                    'isolation': hospital.beds_isolation,
-                    'isolation_total': isolation_total,
-                    'isolation_percentage': isolation_percentage,
-                },
-                'facilities_detail': {
-                    'icu': {
-                        'available': hospital.beds_icu > 0,
-                        'count': hospital.beds_icu
-                    },
-                    'oxygen': {
-                        'available': hospital.beds_oxygen > 0,
-                        'count': hospital.beds_oxygen
-                    },
-                    'ventilator': {
-                        'available': hospital.beds_ventilator > 0,
-                        'count': hospital.beds_ventilator
-                    },
-                    'isolation': {
-                        'available': hospital.beds_isolation > 0,
-                        'count': hospital.beds_isolation
-                    }
-                },
-                'pricing': hospital.pricing_info if hospital.pricing_info else {},
-                'insurance_providers': {
-                    'accepted': hospital.insurance_providers.get('accepted', []) if hospital.insurance_providers else []
-                }
+    for hospital in hospitals:
+        # Effective totals come precomputed from the search index so the
+        # comparison matches the results page and hospital dashboard.
+        beds = bed_availability(hospital)
+        
+        # Add facility details with real-time bed data
+        hospital_dict = {
+            'id': hospital.id,
+            'name': hospital.name,
+            'address': hospital.address,
+            'city': hospital.city,
+            'type': hospital.type,
+            'email': hospital.email,
+            'phone': hospital.phone,
+            'distance': hospital_distance_km(hospital, user_lat, user_lng),
+            'updated_at': last_updated_text(hospital.updated_at, default='recently'),
+            'beds': {},
+            'facilities_detail': {},
+            'pricing': hospital.pricing_info if hospital.pricing_info else {},
+            'insurance_providers': {
+                'accepted': hospital.insurance_providers.get('accepted', []) if hospital.insurance_providers else []
             }
-            hospitals_list.append(hospital_dict)
-        except (Hospital.DoesNotExist, ValueError) as e:
-            print(f"Error fetching hospital {hid}: {e}")
-            continue
+        }
+        for bed_type, bed in beds.items():
+            hospital_dict['beds'][bed_type] = bed['available']
+            hospital_dict['beds'][f'{bed_type}_total'] = bed['total']
+            hospital_dict['beds'][f'{bed_type}_percentage'] = bed_percentage(bed['available'], bed['total'])
+            hospital_dict['facilities_detail'][bed_type] = {
+                'available': bed['available'] > 0,
+                'count': bed['available'],
+            }
+        hospitals_list.append(hospital_dict)
     
     if not hospitals_list:
         messages.error(request, 'No hospitals found for comparison')
@@ -346,6 +457,94 @@ def compare_hospitals(request):
     return render(request, 'userapp/compare.html', context)
 
 
+@require_login
+def compare_api(request):
+    """
+    Comparison matrix for up to MAX_API_HOSPITALS hospitals as JSON
+    
+    ?ids=1,2,3 (and optionally lat/lng for distances). Hospitals come back
+    in the requested order; ids that don't exist are listed in `missing`.
+    """
+    hospital_ids, invalid_ids = parse_hospital_ids(request.GET.get('ids', ''))
+    if invalid_ids:
+        return JsonResponse({'error': f'Invalid hospital ids: {", ".join(invalid_ids[:10])}'}, status=400)
+    if not hospital_ids or len(hospital_ids) > MAX_API_HOSPITALS:
+        return JsonResponse({'error': f'Send between 1 and {MAX_API_HOSPITALS} hospital ids'}, status=400)
+    
+    user_lat, user_lng = parse_coordinates(request.GET.get('lat'), request.GET.get('lng'))
+    hospitals = load_hospitals(hospital_ids)
+    found = {hospital.id for hospital in hospitals}
+    
+    payload = comparison_matrix(hospitals, user_lat, user_lng)
+    payload['missing'] = [hospital_id for hospital_id in hospital_ids if hospital_id not in found]
+    response = JsonResponse(payload)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _parse_timestamp(value):
+    """Aware datetime from an ISO 8601 string, None if blank; raises ValueError"""
+    value = value.strip()
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(value)
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+@require_login
+def bed_history_api(request):
+    """
+    Downsampled bed availability history as JSON
+    
+    ?hospital=ID or ?city=Name, with optional ISO 8601 `start`/`end`
+    (default: the last 7 days, at most MAX_BED_HISTORY_SPAN) and
+    `resolution` (raw, hour or day; default: the finest that serves the
+    span).
+    """
+    hospital_id = request.GET.get('hospital', '').strip()
+    city = request.GET.get('city', '').strip()
+    if bool(hospital_id) == bool(city):
+        return JsonResponse({'error': 'Pass either hospital or city'}, status=400)
+    if hospital_id and not hospital_id.isdigit():
+        return JsonResponse({'error': 'Invalid hospital id'}, status=400)
+    
+    try:
+        start, end = (_parse_timestamp(request.GET.get(name, '')) for name in ('start', 'end'))
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be ISO 8601 timestamps'}, status=400)
+    end = end or timezone.now()
+    start = start or end - timedelta(days=7)
+    if start >= end:
+        return JsonResponse({'error': 'start must be before end'}, status=400)
+    if end - start > MAX_BED_HISTORY_SPAN:
+        return JsonResponse({'error': f'At most {MAX_BED_HISTORY_SPAN.days} days per request'}, status=400)
+    
+    try:
+        resolution = series_resolution(start, end, request.GET.get('resolution', '').strip() or None)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if city:
+        # Raw samples of different hospitals aren't aligned
+        resolution = max(resolution, BedHistory.HOURLY)
+    
+    series = bed_series(
+        start, end, hospital_id=int(hospital_id) if hospital_id else None, city=city or None,
+        resolution=resolution,
+    )
+    response = JsonResponse({
+        'hospital': int(hospital_id) if hospital_id else None,
+        'city': city or None,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'resolution': RESOLUTION_LABELS[resolution],
+        'series': series,
+    })
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+
 @require_login
 def ambulances(request):
     """Ambulance directory and booking"""
@@ -361,110 +560,154 @@ def ambulances(request):
         except (Hospital.DoesNotExist, ValueError):
             pass
     
-    # Get all providers with prefetch
-    providers_queryset = AmbulanceProvider.objects.prefetch_related('ambulances').all()
-    
-    # Get ambulances with active bookings (not completed or cancelled)
-    active_booking_ambulance_ids = Booking.objects.filter(
-        status__in=['pending', 'confirmed', 'in_progress']
-    ).exclude(ambulance__isnull=True).values_list('ambulance_id', flat=True)
-    
-    # Filter by city - check if city is in service_area_list (exact match)
+    # Filter by city - providers whose service area includes the city
     # If hospital is selected, use hospital's city
     if selected_hospital and not city:
         city = selected_hospital.city.strip()
     
-    providers_list = []
-    for provider in providers_queryset:
-        service_cities = [c.lower() for c in provider.get_service_area_list()]
-        # If city filter is specified, check if it's in the service area
-        if city:
-            if city.lower() in service_cities:
-                providers_list.append(provider)
-        else:
-            # No city filter, include all providers
-            providers_list.append(provider)
-    
-    # Filter by ambulance type if specified and filter out ambulances with active bookings
-    if ambulance_type:
-        filtered_providers = []
-        for provider in providers_list:
-            # Check if provider has at least one available ambulance of the specified type
-            # that doesn't have an active booking
-            available_ambulances = provider.ambulances.filter(
-                type=ambulance_type,
-                is_available=True
-            ).exclude(id__in=active_booking_ambulance_ids)
-            if available_ambulances.exists():
-                filtered_providers.append(provider)
-        providers_list = filtered_providers
-    else:
-        # Filter providers to only show those with available ambulances (no active bookings)
-        filtered_providers = []
-        for provider in providers_list:
-            available_ambulances = provider.ambulances.filter(
-                is_available=True
-            ).exclude(id__in=active_booking_ambulance_ids)
-            if available_ambulances.exists():
-                filtered_providers.append(provider)
-        providers_list = filtered_providers
-    
-    # Get all cities for filter
-    all_cities = set()
-    for provider in AmbulanceProvider.objects.all():
-        all_cities.update(provider.get_service_area_list())
-    cities = sorted(list(all_cities))
+    # Providers with at least one available ambulance (of the requested
+    # type) that has no active booking, loaded in a single annotated query
+    providers_list = list(directory_providers(ambulance_type, city))
     
     context = {
         'providers': providers_list,
-        'cities': cities,
+        'cities': service_cities(),
         'search_city': city,
         'search_type': ambulance_type,
         'total_results': len(providers_list),
         'username': request.user.email or request.user.username,
         'selected_hospital': selected_hospital,
-        'active_booking_ambulance_ids': list(active_booking_ambulance_ids)
+        'emergency_types': Booking.EMERGENCY_TYPE_CHOICES,
     }
     return render(request, 'userapp/ambulances.html', context)
 
 
+def _parse_hospital_ids(ids_param):
+    """Parse a comma-separated list of hospital ids, ignoring junk"""
+    return [int(x) for x in (ids_param or '').split(',') if x.strip().isdigit()]
+
+
+def _availability_versions(request):
+    """(id, version) for the hospitals a live-availability request covers"""
+    ids = _parse_hospital_ids(request.GET.get('ids', '').strip())
+    qs = Hospital.objects.all()
+    if ids:
+        qs = qs.filter(id__in=ids)
+    return list(qs.order_by('id').values_list('id', 'version'))
+
+
+def _encode_watermark(versions):
+    """Opaque token of the version counters a client has seen"""
+    raw = ','.join(f'{hid}:{version}' for hid, version in versions)
+    return base64.urlsafe_b64encode(zlib.compress(raw.encode())).decode()
+
+
+def _decode_watermark(value):
+    """{hospital id: version} from a watermark token, or None if it can't be read"""
+    if not value:
+        return None
+    try:
+        raw = zlib.decompress(base64.urlsafe_b64decode(value.encode())).decode()
+        return dict(tuple(map(int, pair.split(':'))) for pair in raw.split(',') if pair)
+    except (ValueError, TypeError, zlib.error):
+        return None
+
+
+def _live_availability_etag(request):
+    """ETag over the version counters of the requested hospitals"""
+    if not _parse_hospital_ids(request.GET.get('ids', '').strip()):
+        # Every hospital: one aggregate row rather than every version.
+        # Versions only grow, so any save raises the sum; the count and
+        # highest id change when hospitals are added or removed.
+        totals = Hospital.objects.aggregate(count=Count('id'), last_id=Max('id'), versions=Sum('version'))
+        raw = '{count}:{last_id}:{versions}'.format(**totals)
+    else:
+        versions = _availability_versions(request)
+        request._availability_versions = versions
+        raw = ','.join(f'{hid}:{version}' for hid, version in versions)
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'"{digest}"'
+
+
 @require_login
+@condition(etag_func=_live_availability_etag)
 def live_hospital_availability(request):
     """
     Lightweight polling endpoint for user dashboard to fetch latest bed availability.
     Returns only the fields needed to update the UI in near real-time.
+
+    Clients send back the ETag (If-None-Match) and/or the `watermark` from the
+    previous response as `since`; the server answers 304 when nothing changed,
+    or only the hospitals whose version differs from the watermark. Versions
+    rather than updated_at are compared, since updated_at is set before
+    commit and a slow transaction can commit an older timestamp late.
     """
-    ids_param = request.GET.get('ids', '').strip()
-    ids = []
-    if ids_param:
-        try:
-            ids = [int(x) for x in ids_param.split(',') if x.strip().isdigit()]
-        except Exception:
-            ids = []
+    versions = getattr(request, '_availability_versions', None)
+    if versions is None:
+        versions = _availability_versions(request)
 
-    qs = Hospital.objects.all()
-    if ids:
-        qs = qs.filter(id__in=ids)
+    seen = _decode_watermark(request.GET.get('since', '').strip())
+    changed_ids = [hid for hid, version in versions if seen is None or seen.get(hid) != version]
 
     payload = []
-    for h in qs:
-        icu_total = h.beds_icu_capacity or h.beds_icu
-        oxygen_total = h.beds_oxygen_capacity or h.beds_oxygen
-        ventilator_total = h.beds_ventilator_capacity or h.beds_ventilator
-        isolation_total = h.beds_isolation_capacity or h.beds_isolation
-
-        payload.append({
-            'id': str(h.id),
-            'beds': {
-                'icu': {'available': h.beds_icu, 'total': icu_total, 'status': _get_status(h.beds_icu, icu_total)},
-                'oxygen': {'available': h.beds_oxygen, 'total': oxygen_total, 'status': _get_status(h.beds_oxygen, oxygen_total)},
-                'ventilator': {'available': h.beds_ventilator, 'total': ventilator_total, 'status': _get_status(h.beds_ventilator, ventilator_total)},
-                'isolation': {'available': h.beds_isolation, 'total': isolation_total, 'status': _get_status(h.beds_isolation, isolation_total)},
-            },
-            'updated_at': h.updated_at.isoformat() if h.updated_at else None,
-        })
-
-    return JsonResponse({'hospitals': payload})
+    if changed_ids:
+        payload = [
+            availability_payload(h)
+            for h in Hospital.objects.select_related('search_index').filter(id__in=changed_ids)
+        ]
+
+    response = JsonResponse({
+        'hospitals': payload,
+        'watermark': _encode_watermark(versions),
+    })
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+async def live_availability_stream(request):
+    """
+    Server-Sent Events stream of bed availability changes.
+    Sends a snapshot of the requested hospitals, then one event per change
+    as hospitals update their beds. Requires an ASGI server; under WSGI the
+    client falls back to polling live_hospital_availability.
+    """
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return JsonResponse({'error': 'Please login to continue'}, status=401)
+
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Streaming requires an ASGI server', status=501)
+
+    ids = _parse_hospital_ids(request.GET.get('ids', ''))
+
+    # Subscribe before taking the snapshot so no change falls in between
+    subscription = availability_broadcaster.subscribe(ids)
+    snapshot = []
+    if ids:
+        snapshot = await sync_to_async(
+            lambda: [
+                availability_payload(h)
+                for h in Hospital.objects.select_related('search_index').filter(id__in=ids)
+            ]
+        )()
+
+    async def event_stream():
+        try:
+            yield 'retry: 5000\n\n'
+            for payload in snapshot:
+                yield format_event('availability', payload, event_id=payload['updated_at'])
+            while not subscription.closed:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+        finally:
+            availability_broadcaster.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @require_login
@@ -485,7 +728,10 @@ def book_ambulance(request):
         contact_person = request.POST.get('contact_person', '').strip()
         contact_phone = request.POST.get('contact_phone', '').strip()
         emergency_type = request.POST.get('emergency_type', '').strip()
+        if emergency_type not in dict(Booking.EMERGENCY_TYPE_CHOICES):
+            emergency_type = 'emergency'
         notes = request.POST.get('notes', '').strip()
+        pickup_lat, pickup_lng = parse_coordinates(request.POST.get('pickup_lat'), request.POST.get('pickup_lng'))
         
         # Validate required fields
         if not all([hospital_id, provider_id, pickup_location, pickup_date, pickup_time, patient_name, patient_phone]):
@@ -526,6 +772,8 @@ def book_ambulance(request):
                 contact_phone=contact_phone or patient_phone,
                 pickup_location=pickup_location,
                 drop_location=drop_location,
+                pickup_latitude=pickup_lat,
+                pickup_longitude=pickup_lng,
                 pickup_date=pickup_date,
                 pickup_time=pickup_time,
                 emergency_type=emergency_type,
@@ -533,15 +781,22 @@ def book_ambulance(request):
                 status='pending'
             )
             
-            messages.success(request, f'Ambulance booking request submitted successfully! Booking ID: #{booking.id}. Provider: {provider.name} will contact you at {patient_phone}.')
+            # The picked ambulance is held for this booking, unless it was taken meanwhile
+            if ambulance and not hold_requested_ambulance(booking):
+                messages.warning(request, f'Ambulance {ambulance.vehicle_number} is no longer available; the provider will assign another one.')
+            
+            # Providers that opted in confirm imminent bookings automatically
+            if provider.auto_dispatch and is_due(booking) and dispatch_booking(booking, pickup_lat, pickup_lng):
+                messages.success(request, f'Ambulance {booking.ambulance.vehicle_number} has been dispatched! Booking ID: #{booking.id}. Provider: {provider.name} will contact you at {patient_phone}.')
+            else:
+                messages.success(request, f'Ambulance booking request submitted successfully! Booking ID: #{booking.id}. Provider: {provider.name} will contact you at {patient_phone}.')
             
             # Log the booking
-            from core.models import ActivityLog
-            ActivityLog.objects.create(
-                user=request.user,
-                user_role='user',
-                action='book_ambulance',
-                details=f'Booked ambulance from {provider.name} to {hospital.name}. Pickup: {pickup_location} on {pickup_date} at {pickup_time}. Patient: {patient_name}'
+            log_activity(
+                request.user,
+                'user',
+                'book_ambulance',
+                f'Booked ambulance from {provider.name} to {hospital.name}. Pickup: {pickup_location} on {pickup_date} at {pickup_time}. Patient: {patient_name}'
             )
             
             return redirect(f'{reverse("userapp:ambulances")}?hospital_id={hospital_id}')